@@ -1,28 +1,139 @@
+import asyncio
 from fastapi import APIRouter, HTTPException
-from backend.models.schemas import AnalysisRequest, AnalysisResponse
-from backend.rag.clinical_chain import ClinicalChain
+from fastapi.concurrency import run_in_threadpool
+from backend.models.schemas import AnalysisRequest, AnalysisResponse, BatchAnalysisRequest, BatchAnalysisResponse
+from backend.rag.clinical_chain import empty_analysis
+from backend.cache.result_cache import get_cache, make_key, normalize_text
+from backend.config import settings
+from backend.registry import registry
+from backend.sessions.chat_sessions import get_session_store, report_context
+from backend.store.results_store import get_results_store
+from backend.store.documents import get_document_store
+from backend.security.redaction import redact_if_enabled
 
 router = APIRouter()
 
-# Lazy Loading for Medical Agent
-_medical_agent = None
-
 def get_medical_agent():
-    global _medical_agent
-    if _medical_agent:
-        return _medical_agent
+    return registry.require("medical_agent")
+
+def with_chat_session(result: dict) -> dict:
+    """
+    Copy of an analysis result with a fresh server-side chat session attached.
+    """
+    session = get_session_store().create(report_context(result))
+    return {**result, "session_id": session.session_id}
+
+def analysis_cache_key(agent, text: str) -> str:
+    return make_key(normalize_text(text), agent.prompt_version, settings.LLM_MODEL)
+
+async def request_text(request: AnalysisRequest) -> str:
+    """
+    The redacted report text to analyze: the stored document for `document_id`
+    (redacted when it was uploaded), else `text`. 404 if the document expired.
+    """
+    if request.document_id:
+        text = await run_in_threadpool(get_document_store().get, request.document_id)
+        if text is None:
+            raise HTTPException(status_code=404, detail="Document not found or expired; upload the report again.")
+        return text
+    return await run_in_threadpool(redact_if_enabled, request.text)
+
+def cacheable(result: dict) -> bool:
+    """
+    Empty results and ones with a fallback explanation may come from a transient
+    LLM failure; they are never pinned in the analysis cache.
+    """
+    return bool(result.get("entities")) and not result.get("degraded")
 
-    print("Initializing Medical Agent...")
-    _medical_agent = ClinicalChain()
-    return _medical_agent
+async def cached_analysis(agent, text: str) -> dict:
+    """
+    Full analysis of redacted report text, from the analysis cache when possible.
+    """
+    cache = get_cache("analysis")
+    key = analysis_cache_key(agent, text)
+    result = cache.get(key) if cache is not None else None
+    if result is None:
+        result = await agent.arun_analysis(text)
+        if cache is not None and cacheable(result):
+            cache.set(key, result)
+    return result
+
+async def record_results(request: AnalysisRequest, result: dict, text: str) -> None:
+    """
+    Stores the result rows for trend queries when the request names a patient.
+    A store failure is logged; it never fails the analysis.
+    """
+    store = get_results_store()
+    if store is None or not request.patient_id or not result.get("entities"):
+        return
+    report_date = request.report_date.isoformat() if request.report_date else None
+    try:
+        await run_in_threadpool(
+            store.add_report, request.patient_id, result["entities"], make_key(normalize_text(text)), report_date
+        )
+    except Exception as e:
+        print(f"Warning: could not store results for trends: {e}")
 
 @router.post("/analyze", response_model=AnalysisResponse, summary="Analyze extracted medical text")
 async def analyze_text(request: AnalysisRequest):
     try:
         agent = get_medical_agent()
-        # We no longer pass retriever
-        result = agent.run_analysis(request.text)
-        return result
+        text = await request_text(request)
+        result = await cached_analysis(agent, text)
+        await record_results(request, result, text)
+        return with_chat_session(result)
+    except HTTPException:
+        raise
     except Exception as e:
         # In a real system, log the error properly
         raise HTTPException(status_code=500, detail=f"Analysis Engine Error: {str(e)}")
+
+@router.post("/analyze/batch", response_model=BatchAnalysisResponse, summary="Analyze many report texts in packed LLM calls")
+async def analyze_batch(request: BatchAnalysisRequest):
+    if len(request.reports) > settings.BATCH_MAX_REPORTS:
+        raise HTTPException(status_code=413, detail=f"Batch too large: at most {settings.BATCH_MAX_REPORTS} reports per request.")
+    ids = [report.id or f"report-{idx}" for idx, report in enumerate(request.reports)]
+    if len(set(ids)) != len(ids):
+        raise HTTPException(status_code=400, detail="Report ids must be unique within a batch.")
+
+    try:
+        agent = get_medical_agent()
+        cache = get_cache("analysis")
+        outcomes = {}
+        keys = {}
+        pending = {}
+        texts = await run_in_threadpool(lambda: [redact_if_enabled(report.text) for report in request.reports])
+        for report_id, text in zip(ids, texts):
+            keys[report_id] = analysis_cache_key(agent, text)
+            cached = cache.get(keys[report_id]) if cache is not None else None
+            if cached is not None:
+                outcomes[report_id] = cached
+            else:
+                pending[report_id] = text
+
+        extracted = await agent.abatch_extract_entities(pending) if pending else {}
+
+        async def explain(report_id, entities):
+            if isinstance(entities, Exception):
+                return report_id, entities
+            if not entities:
+                return report_id, empty_analysis()
+            result = agent.build_analysis(entities, await agent.agenerate_explanation(entities))
+            if cache is not None and cacheable(result):
+                cache.set(keys[report_id], result)
+            return report_id, result
+
+        for report_id, outcome in await asyncio.gather(*(explain(rid, ents) for rid, ents in extracted.items())):
+            outcomes[report_id] = outcome
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Analysis Engine Error: {str(e)}")
+
+    results = []
+    for report_id in ids:
+        outcome = outcomes[report_id]
+        if isinstance(outcome, Exception):
+            results.append({"id": report_id, "status": "error", "error": f"Extraction failed: {outcome}"})
+        else:
+            results.append({"id": report_id, "status": "ok", "result": outcome})
+    failed = sum(1 for item in results if item["status"] == "error")
+    return {"results": results, "succeeded": len(results) - failed, "failed": failed}
@@ -1,20 +1,98 @@
-from fastapi import APIRouter, HTTPException
+import asyncio
+import weakref
+from fastapi import APIRouter, BackgroundTasks, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import List, Dict
+from typing import List, Dict, Optional
 from backend.api.analyze import get_medical_agent
+from backend.config import settings
+from backend.sessions.chat_sessions import get_session_store
+from backend.security.redaction import redact_if_enabled
+from backend.store.documents import get_document_store
 
 router = APIRouter()
 
 class ChatRequest(BaseModel):
-    context: str
-    history: List[Dict[str, str]] # [{"role": "user", "content": "..."}]
     message: str
+    # Preferred: the session_id returned by /analyze; the server keeps the context and history.
+    session_id: Optional[str] = None
+    # Stateless mode (no session_id): the client resends the history each turn, and the
+    # report as the document_id from /upload-report (or, failing that, the context text).
+    document_id: Optional[str] = None
+    context: str = ""
+    history: List[Dict[str, str]] = [] # [{"role": "user", "content": "..."}]
+
+# One lock per live session: a turn's append-and-save and a summary fold's commit never interleave.
+_session_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+def _session_lock(session_id: str) -> asyncio.Lock:
+    lock = _session_locks.get(session_id)
+    if lock is None:
+        lock = _session_locks[session_id] = asyncio.Lock()
+    return lock
+
+async def _fold_older_turns(session_id: str):
+    """
+    Incrementally folds turns that fell out of the verbatim window into the
+    rolling summary. Runs after the response is sent, off the request's critical path.
+    The fold is computed against the summarized_upto it started from and only
+    committed if that is still current, so overlapping folds never advance it twice.
+    """
+    store = get_session_store()
+    session = await run_in_threadpool(store.get, session_id)
+    if session is None:
+        return
+    upto = session.summarized_upto
+    older, _ = session.window(settings.CHAT_HISTORY_TOKENS)
+    if not older:
+        return
+    try:
+        summary = await get_medical_agent().asummarize_turns(session.summary, older)
+    except Exception as e:
+        print(f"Chat summary Warning: {e!r}")
+        return
+    async with _session_lock(session_id):
+        session = await run_in_threadpool(store.get, session_id)
+        if session is None or session.summarized_upto != upto:
+            # Another fold committed first; whatever it left over is folded after the next turn.
+            return
+        session.summary = summary
+        session.summarized_upto = upto + len(older)
+        await run_in_threadpool(store.save, session)
 
 @router.post("/chat", summary="Chat with the medical report context")
-async def chat_with_report(request: ChatRequest):
+async def chat_with_report(request: ChatRequest, background_tasks: BackgroundTasks):
     try:
         agent = get_medical_agent()
-        response = agent.chat(request.history, request.message, request.context)
-        return {"response": response}
+        message = redact_if_enabled(request.message)
+        if request.session_id is None:
+            if request.document_id:
+                context = await run_in_threadpool(get_document_store().get, request.document_id)
+                if context is None:
+                    raise HTTPException(status_code=404, detail="Document not found or expired.")
+            else:
+                context = redact_if_enabled(request.context)
+            response = await agent.achat(request.history, message, context)
+            return {"response": response}
+
+        store = get_session_store()
+        session = await run_in_threadpool(store.get, request.session_id)
+        if session is None:
+            raise HTTPException(status_code=404, detail="Chat session not found or expired.")
+        _, recent = session.window(settings.CHAT_HISTORY_TOKENS)
+        response = await agent.achat(recent, message, session.context, session.summary)
+        async with _session_lock(session.session_id):
+            # Re-read: a fold may have committed while the model was answering.
+            session = await run_in_threadpool(store.get, session.session_id) or session
+            session.turns.append({"role": "user", "content": message})
+            session.turns.append({"role": "assistant", "content": response})
+            await run_in_threadpool(store.save, session)
+        background_tasks.add_task(_fold_older_turns, session.session_id)
+        return {"response": response, "session_id": session.session_id}
+    except HTTPException:
+        raise
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Chat Error: the model did not respond in time.")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Chat Error: {str(e)}")
@@ -0,0 +1,59 @@
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from backend.models.schemas import AnalysisRequest, JobRequest, JobStatus
+from backend.api.analyze import cached_analysis, get_medical_agent, record_results, request_text, with_chat_session
+from backend.config import settings
+from backend.jobs.queue import QueueFull, get_job_queue
+
+router = APIRouter()
+
+async def run_job(payload: dict) -> dict:
+    """
+    Worker side of POST /jobs: the same pipeline as /analyze, on text that was
+    resolved and redacted at submission.
+    """
+    agent = get_medical_agent()
+    text = payload["text"]
+    result = await cached_analysis(agent, text)
+    request = AnalysisRequest(text=text, patient_id=payload.get("patient_id"), report_date=payload.get("report_date"))
+    await record_results(request, result, text)
+    return with_chat_session(result)
+
+def start_workers():
+    get_job_queue().start(run_job)
+
+@router.post("/jobs", response_model=JobStatus, status_code=202, summary="Queue an analysis job (429 with Retry-After when the queue is full)")
+async def submit_job(request: JobRequest):
+    text = await request_text(request)
+    payload = {
+        "text": text,
+        "patient_id": request.patient_id,
+        "report_date": request.report_date.isoformat() if request.report_date else None,
+    }
+    start_workers()
+    try:
+        return await run_in_threadpool(get_job_queue().submit, payload, request.priority, request.timeout_seconds)
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+@router.get("/jobs/stats", summary="Queue depth per lane and status, workers, average run time")
+def job_stats():
+    return get_job_queue().stats()
+
+@router.get("/jobs/{job_id}", response_model=JobStatus, summary="Job status and result; wait > 0 long-polls until the job finishes")
+async def get_job(job_id: str, wait: float = Query(0, ge=0, description="Seconds to wait for the job to finish")):
+    queue = get_job_queue()
+    if wait > 0:
+        job = await queue.wait(job_id, min(wait, settings.JOB_LONG_POLL_MAX_SECONDS))
+    else:
+        job = await run_in_threadpool(queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired.")
+    return job
+
+@router.delete("/jobs/{job_id}", response_model=JobStatus, summary="Cancel a queued or running job")
+async def cancel_job(job_id: str):
+    job = await run_in_threadpool(get_job_queue().cancel, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired.")
+    return job
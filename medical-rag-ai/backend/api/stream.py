@@ -1,8 +1,95 @@
-from fastapi import APIRouter
-from backend.models.schemas import HealthCheck
+import json
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+from fastapi.responses import StreamingResponse
+from backend.models.schemas import HealthCheck, AnalysisRequest
+from backend.cache.result_cache import cache_stats, get_cache
+from backend.api.analyze import cacheable, get_medical_agent, analysis_cache_key, record_results, request_text, with_chat_session
+from backend.rag.clinical_chain import empty_analysis
+from backend.registry import registry
+from backend.telemetry.metrics import CONTENT_TYPE, render_metrics
 
 router = APIRouter()
 
 @router.get("/health", response_model=HealthCheck)
 def health_check():
     return {"status": "ok"}
+
+@router.get("/ready", summary="Per-component readiness and init timings (503 until required components are up)")
+def readiness_check():
+    report = registry.readiness()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+@router.get("/metrics", summary="Prometheus metrics: request/stage latency, LLM tokens and calls, payload sizes")
+def metrics():
+    return PlainTextResponse(render_metrics(), media_type=CONTENT_TYPE)
+
+def _profiler(request: Request):
+    profiler = request.app.state.profiler
+    if profiler is None:
+        raise HTTPException(status_code=404, detail="Profiler disabled (set PROFILER_ENABLED=true).")
+    return profiler
+
+@router.get("/debug/profiles", summary="Slowest profiled requests (PROFILER_ENABLED)")
+def list_profiles(request: Request):
+    return {"profiles": _profiler(request).profiles()}
+
+@router.get("/debug/profiles/{profile_id}", summary="Collapsed stacks for one profiled request (flamegraph.pl / speedscope)")
+def get_profile(profile_id: int, request: Request):
+    collapsed = _profiler(request).collapsed(profile_id)
+    if collapsed is None:
+        raise HTTPException(status_code=404, detail="Profile not found.")
+    return PlainTextResponse(collapsed)
+
+@router.get("/cache/stats", summary="Hit/miss/eviction counters for the result caches")
+def get_cache_stats():
+    return cache_stats()
+
+def _event(name: str, **payload) -> str:
+    return json.dumps({"event": name, **payload}) + "\n"
+
+async def _analysis_events(request: AnalysisRequest, text: str):
+    """
+    NDJSON stage events: parsed, entities, explanation_token*,
+    medication_suggestions, follow_up_suggestions, done (or error).
+    `text` is the request's report text, already redacted.
+    """
+    try:
+        agent = get_medical_agent()
+        yield _event("parsed", chars=len(text))
+
+        cache = get_cache("analysis")
+        key = analysis_cache_key(agent, text)
+        result = cache.get(key) if cache is not None else None
+        if result is not None:
+            yield _event("entities", entities=result["entities"])
+            yield _event("explanation_token", text=result["explanation"])
+        else:
+            entities = await agent.aextract_entities(text)
+            yield _event("entities", entities=entities)
+            if not entities:
+                yield _event("done", result=empty_analysis())
+                return
+
+            explanation_data = {}
+            async for kind, payload in agent.astream_explanation(entities):
+                if kind == "token":
+                    yield _event("explanation_token", text=payload)
+                else:
+                    explanation_data = payload
+            result = agent.build_analysis(entities, explanation_data)
+            if cache is not None and cacheable(result):
+                cache.set(key, result)
+
+        yield _event("medication_suggestions", items=result["medication_suggestions"])
+        yield _event("follow_up_suggestions", items=result["follow_up_suggestions"])
+        await record_results(request, result, text)
+        yield _event("done", result=with_chat_session(result))
+    except Exception as e:
+        yield _event("error", detail=f"Analysis Engine Error: {str(e)}")
+
+@router.post("/analyze/stream", tags=["Analysis"], summary="Analyze extracted medical text, streaming NDJSON stage events")
+async def analyze_stream(request: AnalysisRequest):
+    # Resolved up front so an unknown document_id is a 404, not an error event.
+    text = await request_text(request)
+    return StreamingResponse(_analysis_events(request, text), media_type="application/x-ndjson")
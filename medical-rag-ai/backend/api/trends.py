@@ -0,0 +1,40 @@
+from datetime import date
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from backend.config import settings
+from backend.models.schemas import TrendResponse
+from backend.rag.flagging import canonical_analyte
+from backend.store.results_store import get_results_store
+
+router = APIRouter()
+
+def _require_store():
+    store = get_results_store()
+    if store is None:
+        raise HTTPException(status_code=503, detail="Results store is disabled.")
+    return store
+
+@router.get("/trends", response_model=TrendResponse, summary="Time series of one test for a patient")
+async def get_trend(
+    patient_id: str,
+    test: str,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    limit: Optional[int] = Query(None, ge=1, description="Maximum points (defaults to TRENDS_MAX_POINTS)"),
+):
+    store = _require_store()
+    points = await run_in_threadpool(
+        store.trend,
+        patient_id,
+        test,
+        start.isoformat() if start else None,
+        end.isoformat() if end else None,
+        min(limit or settings.TRENDS_MAX_POINTS, settings.TRENDS_MAX_POINTS),
+    )
+    return {"patient_id": patient_id, "test": canonical_analyte(test), "points": points}
+
+@router.get("/trends/tests", summary="Tests with stored results for a patient")
+async def get_trend_tests(patient_id: str):
+    store = _require_store()
+    return {"patient_id": patient_id, "tests": await run_in_threadpool(store.tests_for, patient_id)}
@@ -1,48 +1,256 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException
-from backend.ocr.pdf_parser import parse_pdf
-from backend.ocr.ocr_engine import OCREngine
-from PIL import Image
-import io
+from starlette.concurrency import run_in_threadpool
+from backend.ocr.pdf_parser import aiter_pdf_pages, PDFTooLargeError
+from backend.ocr.scanned_pdf import ocr_pdf_page
+from backend.config import settings
+from backend.ocr.ocr_engine import OCR_ERROR_TEXT
+from backend.registry import registry
+from backend.ocr.preprocess import preprocess_image, preprocess_stats
+from backend.ocr.ocr_cache import ocr_text_cache
+from backend.security.redaction import redact_if_enabled
+from backend.telemetry.timing import record_payload, stage
+from backend.telemetry.metrics import LLM_RETRIES
+from backend.api.analyze import cacheable, cached_analysis, get_medical_agent, with_chat_session
+from backend.store.documents import get_document_store
+from backend.cache.result_cache import get_cache, make_key
+from backend.models.schemas import AnalysisResponse
+from backend.rag.clinical_chain import empty_analysis
+from backend.rag.flagging import flag_entities
+from backend.rag.test_names import canonicalize_entities
+import asyncio
+import hashlib
+import os
+import tempfile
 
 router = APIRouter()
-# Instantiate the REAL engine. This will load models into memory on startup (or first call depending on import time).
-# We might want to lazy load this if startup is too slow, but for now we initialize it.
-# To avoid global startup cost blocking entire app if unused, we could use a singleton pattern or lru_cache,
-# but for simplicity we initialize it globaly or inside the endpoint.
-# Initializing globally is better for performance after first load.
-# Lazy Loading Wrapper
-_ocr_engine_instance = None
 
 def get_ocr_engine():
-    global _ocr_engine_instance
-    if _ocr_engine_instance is None:
-        try:
-             # Import here to avoid top-level dependency if possible, or just init here
-             _ocr_engine_instance = OCREngine()
-        except Exception as e:
-             print(f"Warning: OCR Engine failed to load: {e}")
-             return None
-    return _ocr_engine_instance
+    return registry.get("ocr_engine")
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+async def _spool_to_tempfile(file: UploadFile, max_bytes: int) -> str:
+    """
+    Copies an upload to a named temp file in chunks, without holding it in memory.
+    Raises PDFTooLargeError as soon as more than `max_bytes` have been received.
+    """
+    if file.size is not None and file.size > max_bytes:
+        raise PDFTooLargeError(f"PDF exceeds {max_bytes // (1024 * 1024)} MB upload limit.")
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise PDFTooLargeError(f"PDF exceeds {max_bytes // (1024 * 1024)} MB upload limit.")
+                out.write(chunk)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path
+
+async def _ocr_image(engine, prepared):
+    """
+    Redacted OCR text of a preprocessed image, from the OCR cache if the same
+    image was read before. Returns (text, cached).
+    """
+    text = ocr_text_cache.get(prepared.digest)
+    if text is not None:
+        return text, True
+    record_payload("ocr_image", len(prepared.data))
+    with stage("ocr"):
+        text = await engine.aprocess_image(prepared.blob())
+    with stage("redaction"):
+        text = redact_if_enabled(text)
+    if text != OCR_ERROR_TEXT:
+        ocr_text_cache.put(prepared.digest, text)
+    return text, False
 
 @router.post("/upload-report", summary="Upload PDF or Image and extract text")
-async def upload_report(file: UploadFile = File(...)):
+async def upload_report(file: UploadFile = File(...), include_text: bool = True):
+    """
+    Extracts the report text and stores it server-side; the returned document_id
+    stands in for the text in /analyze and /chat. Pass include_text=false to get
+    only the handle back.
+    """
+    extracted = await _extract_upload(file)
+    if extracted.get("text") and extracted["text"] != OCR_ERROR_TEXT:
+        extracted["document_id"] = await run_in_threadpool(get_document_store().put, extracted["text"])
+        extracted["chars"] = len(extracted["text"])
+        if not include_text:
+            del extracted["text"]
+    return extracted
+
+
+async def _extract_pdf_pages(path: str):
+    """
+    Redacted text of each page of a spooled PDF, in page order, and how many pages
+    were OCR'd. Each page is redacted (or, with no text layer, OCR'd and then
+    redacted) as soon as the parser yields it, while later pages are still being
+    extracted. A PDF that can't be parsed yields no pages.
+    """
+    slots = asyncio.Semaphore(settings.OCR_MAX_WORKERS)
+
+    async def finish(number, text, engine):
+        if not text.strip():
+            if engine is None:
+                return ""
+            with stage("ocr"):
+                text = await ocr_pdf_page(path, number, engine, slots)
+        if not text:
+            return ""
+        with stage("redaction"):
+            return await run_in_threadpool(redact_if_enabled, text)
+
+    tasks = []
+    engine = None
+    ocr_pages = 0
+    try:
+        with stage("pdf_parse"):
+            async for number, text in aiter_pdf_pages(path):
+                if not text.strip():
+                    # Scanned or mixed PDF: only pages without a text layer are OCR'd.
+                    engine = engine or get_ocr_engine()
+                    ocr_pages += engine is not None
+                tasks.append(asyncio.create_task(finish(number, text, engine)))
+        pages = await asyncio.gather(*tasks)
+    except PDFTooLargeError:
+        raise
+    except Exception as e:
+        print(f"Error parsing PDF: {e}")
+        for task in tasks:
+            task.cancel()
+        return [], 0
+    return pages, ocr_pages
+
+
+async def _extract_upload(file: UploadFile) -> dict:
     if file.content_type == "application/pdf":
-        content = await file.read()
-        text = parse_pdf(content)
+        try:
+            with stage("upload_read"):
+                path = await _spool_to_tempfile(file, settings.PDF_MAX_BYTES)
+            try:
+                record_payload("upload_pdf", os.path.getsize(path))
+                pages, ocr_pages = await _extract_pdf_pages(path)
+            finally:
+                os.unlink(path)
+        except PDFTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        # Pages are line-aligned, so joining after redaction matches redacting the whole text.
+        text = "\n".join(pages)
         if not text.strip():
-             return {"text": "", "note": "Scanned PDF detected. Please upload image or searchable PDF.", "extracted": False}
-        return {"text": text, "extracted": True}
+             return {"text": "", "note": "Scanned PDF detected but no text could be recognized. Please upload a clearer scan or image.", "extracted": False}
+        return {"text": text, "extracted": True, "ocr_pages": ocr_pages}
     
     elif file.content_type.startswith("image/"):
         engine = get_ocr_engine()
         if not engine:
              raise HTTPException(status_code=500, detail="OCR Engine not available/failed to load.")
         
-        content = await file.read()
-        image = Image.open(io.BytesIO(content)).convert("RGB")
-        text = engine.process_image(image)
-        print(f"DEBUG: Extracted OCR Text: {text[:500]}...") # Log first 500 chars
-        return {"text": text, "extracted": True}
+        with stage("upload_read"):
+            content = await file.read()
+        record_payload("upload_image", len(content))
+        # Upright, downscaled, grayscale JPEG: a fraction of the original payload.
+        with stage("image_preprocess"):
+            prepared = await run_in_threadpool(preprocess_image, content)
+        text, cached = await _ocr_image(engine, prepared)
+        return {"text": text, "extracted": True, "ocr_cached": cached, "image_stats": prepared.stats()}
     
     else:
         raise HTTPException(status_code=400, detail="Unsupported file type")
+
+@router.get("/ocr/stats", tags=["System"], summary="Image preprocessing and OCR cache counters")
+def ocr_stats():
+    return {"preprocess": preprocess_stats(), "cache": ocr_text_cache.stats()}
+
+
+@router.get("/documents/stats", tags=["System"], summary="Server-side document store counters")
+def document_stats():
+    return get_document_store().stats()
+
+
+@router.post("/analyze-report", tags=["Analysis"], response_model=AnalysisResponse, summary="Upload a PDF or image and analyze it in one request")
+async def analyze_report(file: UploadFile = File(...)):
+    """
+    /upload-report and /analyze in one round trip: the report text never leaves
+    the server. Images take the /analyze-image path.
+    """
+    if (file.content_type or "").startswith("image/"):
+        return await analyze_image(file)
+    extracted = await _extract_upload(file)
+    text = extracted.get("text")
+    if not text:
+        raise HTTPException(status_code=422, detail=extracted.get("note") or "No text could be extracted from the report.")
+    try:
+        agent = get_medical_agent()
+        document_id = await run_in_threadpool(get_document_store().put, text)
+        result = await cached_analysis(agent, text)
+        return with_chat_session({**result, "document_id": document_id})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Analysis Engine Error: {str(e)}")
+
+
+@router.post("/analyze-image", tags=["Analysis"], response_model=AnalysisResponse, summary="Analyze a report image in one request")
+async def analyze_image(file: UploadFile = File(...)):
+    """
+    Image upload straight to analysis. With FUSED_IMAGE_EXTRACTION_ENABLED the
+    vision model returns the lab entities directly, saving the OCR text round
+    trip; if its answer does not validate, the image goes through OCR text
+    extraction instead.
+    """
+    if not (file.content_type or "").startswith("image/"):
+        raise HTTPException(status_code=400, detail="Unsupported file type; /analyze-image takes an image.")
+    engine = get_ocr_engine()
+    if not engine:
+        raise HTTPException(status_code=500, detail="OCR Engine not available/failed to load.")
+    try:
+        agent = get_medical_agent()
+        with stage("upload_read"):
+            content = await file.read()
+        record_payload("upload_image", len(content))
+        with stage("image_preprocess"):
+            prepared = await run_in_threadpool(preprocess_image, content)
+
+        cache = get_cache("analysis")
+        key = make_key("image", hashlib.sha256(prepared.data).hexdigest(), agent.prompt_version, settings.LLM_MODEL)
+        result = cache.get(key) if cache is not None else None
+        if result is None:
+            result = await _analyze_prepared_image(agent, engine, prepared)
+            if cache is not None and cacheable(result):
+                cache.set(key, result)
+        return with_chat_session(result)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Analysis Engine Error: {str(e)}")
+
+
+async def _analyze_prepared_image(agent, engine, prepared) -> dict:
+    entities = None
+    if settings.FUSED_IMAGE_EXTRACTION_ENABLED:
+        record_payload("image_extraction", len(prepared.data))
+        with stage("image_extraction"):
+            entities = await engine.aextract_entities(prepared.blob())
+        if entities is None:
+            LLM_RETRIES.inc(operation="image_extraction")
+
+    if entities is not None:
+        extraction = "fused"
+        with stage("redaction"):
+            entities = [{k: redact_if_enabled(v) if isinstance(v, str) else v for k, v in e.items()} for e in entities]
+        with stage("flagging"):
+            entities = flag_entities(canonicalize_entities(entities))
+    else:
+        extraction = "ocr"
+        text, _ = await _ocr_image(engine, prepared)
+        if text == OCR_ERROR_TEXT:
+            raise HTTPException(status_code=502, detail="Could not read the image; please upload a clearer one.")
+        entities = await agent.aextract_entities(text)
+
+    if not entities:
+        return {**empty_analysis(), "extraction": extraction}
+    explanation_data = await agent.agenerate_explanation(entities)
+    return {**agent.build_analysis(entities, explanation_data), "extraction": extraction}
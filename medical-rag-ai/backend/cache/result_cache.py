@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from backend.config import settings
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """
+    Canonical form of report text for cache keys: whitespace runs collapsed, trimmed.
+    """
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def make_key(*parts: Any) -> str:
+    """
+    Content-addressed key: SHA-256 over the JSON encoding of all parts.
+    """
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Two-tier cache: an in-process LRU (size + TTL bounded) in front of a SQLite
+    table that survives restarts and is shared by every worker on the host.
+    Values must be JSON-serializable.
+    """
+
+    # Expired disk rows are purged once every this many writes.
+    PURGE_EVERY = 256
+
+    def __init__(self, namespace: str, max_entries: int, ttl_seconds: float, db_path: Optional[str] = None):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "sets": 0}
+
+        self._db = None
+        if db_path:
+            try:
+                directory = os.path.dirname(db_path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self._db = sqlite3.connect(db_path, timeout=5, check_same_thread=False)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute("PRAGMA synchronous=NORMAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS result_cache ("
+                    " namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+                    " expires_at REAL NOT NULL, PRIMARY KEY (namespace, key))"
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"Warning: result cache disk tier disabled ({db_path}): {e}")
+                self._db = None
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return value
+                del self._memory[key]
+                self._stats["expirations"] += 1
+
+            if self._db is not None:
+                try:
+                    row = self._db.execute(
+                        "SELECT value, expires_at FROM result_cache WHERE namespace = ? AND key = ?",
+                        (self.namespace, key),
+                    ).fetchone()
+                except sqlite3.Error as e:
+                    print(f"Warning: result cache read failed: {e}")
+                    row = None
+                if row is not None and row[1] > now:
+                    value = json.loads(row[0])
+                    self._remember(key, value, row[1])
+                    self._stats["disk_hits"] += 1
+                    return value
+
+            self._stats["misses"] += 1
+            return None
+
+    def set(self, key: str, value: Any) -> None:
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._remember(key, value, expires_at)
+            self._stats["sets"] += 1
+            if self._db is None:
+                return
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO result_cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                    (self.namespace, key, json.dumps(value), expires_at),
+                )
+                self._writes += 1
+                if self._writes % self.PURGE_EVERY == 0:
+                    self._db.execute("DELETE FROM result_cache WHERE expires_at <= ?", (time.time(),))
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"Warning: result cache write failed: {e}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM result_cache WHERE namespace = ?", (self.namespace,))
+                self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+            stats["max_entries"] = self.max_entries
+            lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+            stats["hit_rate"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 4) if lookups else 0.0
+            if self._db is not None:
+                try:
+                    stats["disk_entries"] = self._db.execute(
+                        "SELECT COUNT(*) FROM result_cache WHERE namespace = ?", (self.namespace,)
+                    ).fetchone()[0]
+                except sqlite3.Error:
+                    stats["disk_entries"] = None
+            return stats
+
+    def _remember(self, key: str, value: Any, expires_at: float) -> None:
+        # Caller holds self._lock.
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._stats["evictions"] += 1
+
+
+_caches: Dict[str, ResultCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(namespace: str) -> Optional[ResultCache]:
+    """
+    Returns the process-wide cache for `namespace`, or None if caching is disabled.
+    """
+    if not settings.CACHE_ENABLED:
+        return None
+    with _caches_lock:
+        cache = _caches.get(namespace)
+        if cache is None:
+            cache = ResultCache(
+                namespace,
+                max_entries=settings.CACHE_MAX_ENTRIES,
+                ttl_seconds=settings.CACHE_TTL_SECONDS,
+                db_path=settings.CACHE_DB_PATH or None,
+            )
+            _caches[namespace] = cache
+        return cache
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    with _caches_lock:
+        caches = list(_caches.values())
+    return {cache.namespace: cache.stats() for cache in caches}
@@ -17,6 +17,124 @@ class Settings:
     OCR_MODEL = "microsoft/trocr-large-printed" 
     LLM_MODEL = "gemini-2.5-flash" 
     
+    # Model backend: "gemini", or "fake" for the deterministic offline stand-in (load tests, CI)
+    LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini").lower()
+    FAKE_LLM_LATENCY_DIST = os.getenv("FAKE_LLM_LATENCY_DIST", "lognormal")  # fixed | uniform | lognormal | exponential
+    FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "800"))
+    FAKE_LLM_LATENCY_SPREAD = float(os.getenv("FAKE_LLM_LATENCY_SPREAD", "0.5"))
+    FAKE_LLM_ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+    FAKE_LLM_SEED = int(os.getenv("FAKE_LLM_SEED", "0"))
+    FAKE_LLM_QUOTA_RPM = float(os.getenv("FAKE_LLM_QUOTA_RPM", "0"))  # reject calls above this rate with 429s (0 = no quota)
+    
+    # Components built in the background at startup (medical_agent, ocr_engine, retriever); empty to disable
+    WARMUP_COMPONENTS = [name.strip() for name in os.getenv("WARMUP_COMPONENTS", "medical_agent,ocr_engine").split(",") if name.strip()]
+    
+    # Rule-based extraction fast path (skips the LLM for confident table rows)
+    FAST_EXTRACTION_ENABLED = os.getenv("FAST_EXTRACTION_ENABLED", "true").lower() == "true"
+    FAST_EXTRACTION_MIN_CONFIDENCE = float(os.getenv("FAST_EXTRACTION_MIN_CONFIDENCE", "0.7"))
+    # Strip repeated page headers/footers, boilerplate and whitespace from text sent to LLM extraction
+    PROMPT_COMPACTION_ENABLED = os.getenv("PROMPT_COMPACTION_ENABLED", "true").lower() == "true"
+    PROMPT_COMPACTION_MIN_REPEATS = int(os.getenv("PROMPT_COMPACTION_MIN_REPEATS", "2"))
+    
+    # Test-name canonicalization against the curated vocabulary (backend/knowledge/test_vocabulary.json):
+    # exact / OCR-folded / fuzzy (edit distance) matching, then optionally the nearest alias by EMBEDDING_MODEL
+    TEST_VOCABULARY_PATH = os.getenv("TEST_VOCABULARY_PATH", "")  # empty = bundled vocabulary
+    TEST_NAME_FUZZY_MAX_EDITS = int(os.getenv("TEST_NAME_FUZZY_MAX_EDITS", "2"))
+    TEST_NAME_EMBEDDING_FALLBACK = os.getenv("TEST_NAME_EMBEDDING_FALLBACK", "false").lower() == "true"
+    TEST_NAME_EMBEDDING_MIN_SIMILARITY = float(os.getenv("TEST_NAME_EMBEDDING_MIN_SIMILARITY", "0.85"))
+    TEST_NAME_EMBEDDING_CACHE = os.getenv("TEST_NAME_EMBEDDING_CACHE", "cache/test_vocabulary_vectors.npz")
+    
+    # Redact PHI (SSN, phone, email, address, DOB/MRN/name values) before any text reaches the LLM
+    PHI_REDACTION_ENABLED = os.getenv("PHI_REDACTION_ENABLED", "true").lower() == "true"
+    
+    # Explanations assembled from precomputed per-(test, flag) fragments (backend/knowledge); the LLM
+    # only explains tests the library lacks and writes a short synthesis when enough results are abnormal
+    EXPLANATION_FRAGMENTS_ENABLED = os.getenv("EXPLANATION_FRAGMENTS_ENABLED", "true").lower() == "true"
+    EXPLANATION_FRAGMENTS_VERSION = os.getenv("EXPLANATION_FRAGMENTS_VERSION", "v1")
+    EXPLANATION_SYNTHESIS_MIN_ABNORMAL = int(os.getenv("EXPLANATION_SYNTHESIS_MIN_ABNORMAL", "2"))  # 0 = never
+    
+    # Long reports are extracted as parallel section-aligned chunks of at most this many tokens
+    EXTRACTION_CHUNK_TOKENS = int(os.getenv("EXTRACTION_CHUNK_TOKENS", "1500"))
+    
+    # Remote model calls: max in flight per worker (ceiling of the adaptive limit), and per-call timeout
+    LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+    LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+    # Model gateway: requests/minute and burst per API key (0 = no limit), retries with jittered exponential backoff
+    LLM_RATE_LIMIT_RPM = float(os.getenv("LLM_RATE_LIMIT_RPM", "0"))
+    LLM_RATE_LIMIT_BURST = int(os.getenv("LLM_RATE_LIMIT_BURST", "10"))
+    LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+    LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "0.5"))
+    LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "20"))
+    
+    # PDF ingest limits and parallel page extraction
+    PDF_MAX_BYTES = int(os.getenv("PDF_MAX_BYTES", str(50 * 1024 * 1024)))
+    PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "1000"))
+    PDF_PARSE_WORKERS = int(os.getenv("PDF_PARSE_WORKERS", str(min(4, os.cpu_count() or 1))))
+    PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "24"))
+    
+    # OCR for scanned PDF pages
+    OCR_MAX_WORKERS = int(os.getenv("OCR_MAX_WORKERS", "4"))
+    PDF_OCR_DPI = int(os.getenv("PDF_OCR_DPI", "200"))
+    
+    # Image preprocessing before OCR
+    OCR_TARGET_DPI = int(os.getenv("OCR_TARGET_DPI", "150"))
+    OCR_JPEG_QUALITY = int(os.getenv("OCR_JPEG_QUALITY", "80"))
+    # /analyze-image: ask the vision model for entity JSON directly; OCR text is only the fallback
+    FUSED_IMAGE_EXTRACTION_ENABLED = os.getenv("FUSED_IMAGE_EXTRACTION_ENABLED", "true").lower() == "true"
+    
+    # Batch analysis
+    BATCH_MAX_REPORTS = int(os.getenv("BATCH_MAX_REPORTS", "200"))
+    BATCH_TOKEN_BUDGET = int(os.getenv("BATCH_TOKEN_BUDGET", "6000"))
+    BATCH_MAX_REPORTS_PER_PROMPT = int(os.getenv("BATCH_MAX_REPORTS_PER_PROMPT", "10"))
+    BATCH_MAX_PARALLEL = int(os.getenv("BATCH_MAX_PARALLEL", "4"))
+    
+    # Result cache (in-process LRU backed by a shared SQLite file)
+    CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() == "true"
+    CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "512"))
+    CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "86400"))
+    CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", "cache/results.sqlite3")
+    
+    # Chat retrieval over the FAISS knowledge base (VECTOR_DB_PATH)
+    RETRIEVAL_ENABLED = os.getenv("RETRIEVAL_ENABLED", "true").lower() == "true"
+    RETRIEVAL_TOP_K_KB = int(os.getenv("RETRIEVAL_TOP_K_KB", "3"))
+    RETRIEVAL_TOP_K_REPORT = int(os.getenv("RETRIEVAL_TOP_K_REPORT", "8"))
+    CHAT_CONTEXT_TOKENS = int(os.getenv("CHAT_CONTEXT_TOKENS", "1200"))
+    EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "4096"))
+    
+    # Server-side chat sessions
+    CHAT_SESSION_IDLE_SECONDS = float(os.getenv("CHAT_SESSION_IDLE_SECONDS", "3600"))
+    CHAT_SESSION_MAX = int(os.getenv("CHAT_SESSION_MAX", "10000"))
+    CHAT_SESSION_DB_PATH = os.getenv("CHAT_SESSION_DB_PATH", "cache/chat_sessions.sqlite3")
+    CHAT_HISTORY_TOKENS = int(os.getenv("CHAT_HISTORY_TOKENS", "1000"))
+    
+    # Server-side document store: extracted report text kept under a content-hash ID for /analyze and /chat
+    DOCUMENT_MAX = int(os.getenv("DOCUMENT_MAX", "2000"))
+    DOCUMENT_MAX_BYTES = int(os.getenv("DOCUMENT_MAX_MB", "64")) * 1024 * 1024
+    DOCUMENT_IDLE_SECONDS = float(os.getenv("DOCUMENT_IDLE_SECONDS", "86400"))
+    DOCUMENT_DB_PATH = os.getenv("DOCUMENT_DB_PATH", "cache/documents.sqlite3")
+    
+    # Async analysis jobs (/api/jobs): bounded queue persisted in SQLite, drained by a worker pool in each process
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+    JOB_QUEUE_MAX = int(os.getenv("JOB_QUEUE_MAX", "200"))
+    JOB_URGENT_RESERVE = int(os.getenv("JOB_URGENT_RESERVE", "20"))  # queue slots only urgent jobs may take
+    JOB_TIMEOUT_SECONDS = float(os.getenv("JOB_TIMEOUT_SECONDS", "300"))
+    JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "2"))  # runs per job, counting re-runs after a worker was lost mid-job
+    JOB_LONG_POLL_MAX_SECONDS = float(os.getenv("JOB_LONG_POLL_MAX_SECONDS", "30"))
+    JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", "86400"))
+    JOB_DB_PATH = os.getenv("JOB_DB_PATH", "cache/jobs.sqlite3")
+    
+    # Longitudinal results store (analyses submitted with a patient_id)
+    RESULTS_STORE_ENABLED = os.getenv("RESULTS_STORE_ENABLED", "true").lower() == "true"
+    RESULTS_DB_PATH = os.getenv("RESULTS_DB_PATH", "cache/results_store.sqlite3")
+    TRENDS_MAX_POINTS = int(os.getenv("TRENDS_MAX_POINTS", "1000"))
+    
+    # Opt-in sampling profiler: keeps flame data (collapsed stacks) for the slowest requests
+    PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "false").lower() == "true"
+    PROFILER_INTERVAL_MS = float(os.getenv("PROFILER_INTERVAL_MS", "5"))
+    PROFILER_MIN_SECONDS = float(os.getenv("PROFILER_MIN_SECONDS", "1.0"))
+    PROFILER_KEEP = int(os.getenv("PROFILER_KEEP", "10"))
+    PROFILER_DIR = os.getenv("PROFILER_DIR", "")
+    
     # Paths
     KNOWLEDGE_BASE_DIR = "knowledge_base"
 
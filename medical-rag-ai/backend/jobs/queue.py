@@ -0,0 +1,417 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from backend.config import settings
+from backend.telemetry.metrics import JOB_QUEUE_DEPTH, JOB_RUNNING, JOBS_FINISHED, JOBS_REJECTED
+from backend.telemetry.timing import collect_stages, record_stage
+
+# Priority lanes, highest first; the rank is what the queue orders on.
+PRIORITIES = {"urgent": 0, "normal": 1}
+TERMINAL = ("succeeded", "failed", "cancelled", "timeout")
+
+Runner = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+
+class QueueFull(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__(f"Job queue full; retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class JobQueue:
+    """
+    Bounded analysis job queue persisted in SQLite, drained by `workers`
+    asyncio workers per process. Jobs are claimed with an atomic UPDATE, so
+    several processes can share one database; queued jobs survive restarts,
+    and a job whose worker died mid-run is re-queued once its lease (start +
+    timeout) has passed, up to `max_attempts` runs.
+
+    Lanes: urgent jobs are claimed before normal ones, and the last
+    `urgent_reserve` of `max_queued` slots only take urgent jobs, so a backlog
+    of normal work never locks out urgent submissions.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        max_queued: int,
+        urgent_reserve: int,
+        timeout_seconds: float,
+        retention_seconds: float,
+        max_attempts: int,
+        db_path: Optional[str] = None,
+    ):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.urgent_reserve = min(urgent_reserve, max_queued)
+        self.timeout_seconds = timeout_seconds
+        self.retention_seconds = retention_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._db = self._connect(db_path)
+        self._runner: Optional[Runner] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        # job_id -> task, for jobs running in this process (cancellation)
+        self._running: Dict[str, asyncio.Task] = {}
+        # job_id -> futures of long-polls waiting on it in this process
+        self._waiters: Dict[str, List[asyncio.Future]] = {}
+        # Moving average of run time, for Retry-After estimates.
+        self._avg_run_seconds = 5.0
+        self._update_gauges()
+
+    @staticmethod
+    def _connect(db_path: Optional[str]) -> sqlite3.Connection:
+        if db_path:
+            try:
+                directory = os.path.dirname(db_path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                db = sqlite3.connect(db_path, timeout=5, check_same_thread=False)
+                db.execute("PRAGMA journal_mode=WAL")
+            except sqlite3.Error as e:
+                print(f"Warning: job persistence disabled ({db_path}): {e}")
+                db = sqlite3.connect(":memory:", check_same_thread=False)
+        else:
+            db = sqlite3.connect(":memory:", check_same_thread=False)
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT, job_id TEXT UNIQUE NOT NULL, priority INTEGER NOT NULL,"
+            " status TEXT NOT NULL, payload TEXT NOT NULL, timeout REAL NOT NULL, attempts INTEGER NOT NULL DEFAULT 0,"
+            " cancel_requested INTEGER NOT NULL DEFAULT 0, created_at REAL NOT NULL, started_at REAL,"
+            " lease_until REAL, finished_at REAL, stages TEXT, result TEXT, error TEXT)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS idx_jobs_queue ON jobs (status, priority, seq)")
+        db.commit()
+        return db
+
+    # -- submission and status (any thread) --
+
+    def submit(self, payload: Dict[str, Any], priority: str = "normal", timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Enqueues a job and returns its status. Raises QueueFull (with a
+        Retry-After estimate) when the job's lane has no free slot.
+        """
+        rank = PRIORITIES[priority]
+        limit = self.max_queued if rank == 0 else self.max_queued - self.urgent_reserve
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            depth = self._db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            if depth >= limit:
+                JOBS_REJECTED.inc(priority=priority)
+                raise QueueFull(self._retry_after(depth))
+            self._db.execute(
+                "INSERT INTO jobs (job_id, priority, status, payload, timeout, created_at) VALUES (?, ?, 'queued', ?, ?, ?)",
+                (job_id, rank, json.dumps(payload), timeout or self.timeout_seconds, now),
+            )
+            self._db.commit()
+        self._update_gauges()
+        self._notify_workers()
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT seq, job_id, priority, status, created_at, started_at, finished_at, stages, result, error"
+                " FROM jobs WHERE job_id = ?",
+                (job_id,),
+            ).fetchone()
+            if row is None:
+                return None
+            seq, job_id, rank, status, created_at, started_at, finished_at, stages, result, error = row
+            position = None
+            if status == "queued":
+                position = self._db.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND (priority < ? OR (priority = ? AND seq < ?))",
+                    (rank, rank, seq),
+                ).fetchone()[0]
+        return {
+            "job_id": job_id,
+            "status": status,
+            "priority": _priority_name(rank),
+            "position": position,
+            "created_at": created_at,
+            "started_at": started_at,
+            "finished_at": finished_at,
+            "stages": json.loads(stages) if stages else {},
+            "result": json.loads(result) if result else None,
+            "error": error,
+        }
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """
+        Long-poll: the job's status once it finishes or after `timeout` seconds,
+        whichever comes first. Jobs run by another process are seen by re-reading
+        the database every second.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job["status"] in TERMINAL or remaining <= 0:
+                return job
+            future = asyncio.get_running_loop().create_future()
+            self._waiters.setdefault(job_id, []).append(future)
+            try:
+                await asyncio.wait_for(future, min(remaining, 1.0))
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                waiters = self._waiters.get(job_id, [])
+                if future in waiters:
+                    waiters.remove(future)
+                if not waiters:
+                    self._waiters.pop(job_id, None)
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Cancels a queued job at once. A running job is flagged and stopped by
+        its worker (here, or in whichever process claimed it).
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE job_id = ? AND status = 'queued'", (now, job_id)
+            )
+            self._db.execute("UPDATE jobs SET cancel_requested = 1 WHERE job_id = ? AND status = 'running'", (job_id,))
+            self._db.commit()
+        task = self._running.get(job_id)
+        if task is not None and self._loop is not None:
+            self._loop.call_soon_threadsafe(task.cancel)
+        self._update_gauges()
+        self._wake_waiters(job_id)
+        return self.get(job_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._db.execute("SELECT status, priority, COUNT(*) FROM jobs GROUP BY status, priority").fetchall()
+        counts: Dict[str, Dict[str, int]] = {}
+        for status, rank, count in rows:
+            counts.setdefault(status, {})[_priority_name(rank)] = count
+        return {
+            "workers": self.workers,
+            "max_queued": self.max_queued,
+            "urgent_reserve": self.urgent_reserve,
+            "running_here": len(self._running),
+            "avg_run_seconds": round(self._avg_run_seconds, 3),
+            "jobs": counts,
+        }
+
+    # -- workers (event loop) --
+
+    def start(self, runner: Runner) -> None:
+        """
+        Starts the worker pool on the running event loop (no-op if already running there).
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._tasks:
+            return
+        self._runner = runner
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+        self._tasks = [loop.create_task(self._worker(n)) for n in range(self.workers)]
+        print(f"Job queue: {self.workers} workers started")
+
+    async def stop(self) -> None:
+        """
+        Stops the workers. Jobs they were running go back to the queue.
+        """
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._loop = None
+
+    def _notify_workers(self) -> None:
+        if self._loop is not None and self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def _worker(self, number: int) -> None:
+        while True:
+            self._wakeup.clear()
+            job = await asyncio.to_thread(self._claim)
+            if job is None:
+                try:
+                    # Re-checks the database every second for jobs submitted by other processes.
+                    await asyncio.wait_for(self._wakeup.wait(), 1.0)
+                except asyncio.TimeoutError:
+                    await asyncio.to_thread(self._sweep)
+                continue
+            await self._run(job)
+
+    def _claim(self) -> Optional[Tuple[str, Dict[str, Any], float, float]]:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "UPDATE jobs SET status = 'running', started_at = ?, lease_until = ? + timeout, attempts = attempts + 1"
+                " WHERE seq = (SELECT seq FROM jobs WHERE status = 'queued' ORDER BY priority, seq LIMIT 1)"
+                " RETURNING job_id, payload, timeout, created_at",
+                (now, now),
+            ).fetchone()
+            self._db.commit()
+        if row is None:
+            return None
+        self._update_gauges()
+        return row[0], json.loads(row[1]), row[2], now - row[3]
+
+    async def _run(self, job: Tuple[str, Dict[str, Any], float, float]) -> None:
+        job_id, payload, timeout, queued_seconds = job
+        stages: List[Tuple[str, float]] = []
+        record_stage("job_queue_wait", queued_seconds)
+        stages.append(("queue_wait", queued_seconds))
+
+        async def execute():
+            with collect_stages(stages):
+                return await self._runner(payload)
+
+        task = asyncio.ensure_future(execute())
+        self._running[job_id] = task
+        self._update_gauges()
+        started = time.perf_counter()
+        status, result, error = "succeeded", None, None
+        try:
+            deadline = started + timeout
+            while not task.done():
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    status, error = "timeout", f"Job exceeded its {timeout:g}s timeout"
+                    task.cancel()
+                    break
+                # Polls the cancel flag too, for cancellations sent to another process.
+                await asyncio.wait([task], timeout=min(remaining, 1.0))
+                if not task.done() and await asyncio.to_thread(self._cancel_requested, job_id):
+                    task.cancel()
+            try:
+                result = await task
+            except asyncio.CancelledError:
+                if status != "timeout":
+                    status, error = "cancelled", "Cancelled"
+            except Exception as e:
+                status, error = "failed", f"Analysis Engine Error: {e}"
+        except asyncio.CancelledError:
+            # Worker shut down mid-job: hand the job back for the next worker or process.
+            task.cancel()
+            self._running.pop(job_id, None)
+            await asyncio.to_thread(self._requeue, job_id)
+            raise
+        finally:
+            self._running.pop(job_id, None)
+
+        run_seconds = time.perf_counter() - started
+        self._avg_run_seconds += 0.2 * (run_seconds - self._avg_run_seconds)
+        stages.append(("run", run_seconds))
+        stages.append(("total", queued_seconds + run_seconds))
+        totals: Dict[str, float] = {}
+        for name, seconds in stages:
+            totals[name] = round(totals.get(name, 0.0) + seconds, 4)
+        JOBS_FINISHED.inc(status=status)
+        await asyncio.to_thread(self._finish, job_id, status, totals, result, error)
+        self._wake_waiters(job_id)
+
+    def _cancel_requested(self, job_id: str) -> bool:
+        with self._lock:
+            row = self._db.execute("SELECT cancel_requested FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def _finish(self, job_id: str, status: str, stages: Dict[str, float], result: Optional[Dict], error: Optional[str]) -> None:
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, stages = ?, result = ?, error = ?, payload = '{}'"
+                " WHERE job_id = ?",
+                (status, time.time(), json.dumps(stages), json.dumps(result) if result is not None else None, error, job_id),
+            )
+            self._db.commit()
+        self._update_gauges()
+
+    def _requeue(self, job_id: str) -> None:
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = 'queued', started_at = NULL, lease_until = NULL WHERE job_id = ? AND status = 'running'",
+                (job_id,),
+            )
+            self._db.commit()
+        self._update_gauges()
+
+    def _sweep(self) -> None:
+        """
+        Re-queues running jobs whose lease expired (their worker died), fails
+        those out of attempts, and deletes finished jobs past retention.
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = 'failed', finished_at = ?, error = 'Worker lost; out of attempts', payload = '{}'"
+                " WHERE status = 'running' AND lease_until < ? AND attempts >= ?",
+                (now, now - 5, self.max_attempts),
+            )
+            requeued = self._db.execute(
+                "UPDATE jobs SET status = 'queued', started_at = NULL, lease_until = NULL"
+                " WHERE status = 'running' AND lease_until < ?",
+                (now - 5,),
+            ).rowcount
+            self._db.execute(
+                "DELETE FROM jobs WHERE status IN ('succeeded', 'failed', 'cancelled', 'timeout') AND finished_at < ?",
+                (now - self.retention_seconds,),
+            )
+            self._db.commit()
+        if requeued:
+            print(f"Job queue: re-queued {requeued} jobs whose worker was lost")
+        self._update_gauges()
+
+    def _wake_waiters(self, job_id: str) -> None:
+        if self._loop is None:
+            return
+
+        def wake():
+            for future in self._waiters.get(job_id, []):
+                if not future.done():
+                    future.set_result(None)
+
+        self._loop.call_soon_threadsafe(wake)
+
+    def _retry_after(self, depth: int) -> int:
+        # Time for the workers to drain the current backlog, at the recent run time.
+        return max(1, min(300, round(depth * self._avg_run_seconds / max(1, self.workers))))
+
+    def _update_gauges(self) -> None:
+        with self._lock:
+            rows = self._db.execute("SELECT priority, COUNT(*) FROM jobs WHERE status = 'queued' GROUP BY priority").fetchall()
+        depths = dict(rows)
+        for name, rank in PRIORITIES.items():
+            JOB_QUEUE_DEPTH.set(depths.get(rank, 0), priority=name)
+        JOB_RUNNING.set(len(self._running))
+
+
+def _priority_name(rank: int) -> str:
+    for name, value in PRIORITIES.items():
+        if value == rank:
+            return name
+    return str(rank)
+
+
+_queue: Optional[JobQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue(
+                workers=settings.JOB_WORKERS,
+                max_queued=settings.JOB_QUEUE_MAX,
+                urgent_reserve=settings.JOB_URGENT_RESERVE,
+                timeout_seconds=settings.JOB_TIMEOUT_SECONDS,
+                retention_seconds=settings.JOB_RETENTION_SECONDS,
+                max_attempts=settings.JOB_MAX_ATTEMPTS,
+                db_path=settings.JOB_DB_PATH or None,
+            )
+        return _queue
@@ -0,0 +1,284 @@
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from typing import Dict, List
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import PrivateAttr
+
+from backend.config import settings
+from backend.llm.gateway import TokenBucket
+from backend.rag.lab_parser import parse_line
+from backend.rag.tokens import count_tokens
+
+# Deterministic, offline stand-ins for the Gemini chat and vision models
+# (LLM_BACKEND=fake). Replies are schema-valid for the repo's prompts and are
+# derived from the prompt text, so the same input always gets the same answer.
+
+_REPORT_BLOCK = re.compile(r"^=== REPORT (.+?) ===$\n(.*?)^=== END REPORT \1 ===$", re.MULTILINE | re.DOTALL)
+_FRAGMENT = re.compile(r'lab test "(.+?)" when the result is flagged "(.+?)"')
+_SECTION = {
+    "text": re.compile(r"\nText:\n(.*?)\n\nIMPORTANT:", re.DOTALL),
+    "entities": re.compile(r"\nEntities:\n(.*?)\n\nInstructions:", re.DOTALL),
+}
+
+# name, unit, low, high: a typical chemistry/CBC panel for synthetic reports.
+PANEL = [
+    ("Hemoglobin", "g/dL", 13.5, 17.5),
+    ("WBC", "10^3/uL", 4.0, 11.0),
+    ("Platelets", "10^3/uL", 150, 450),
+    ("Glucose, Fasting", "mg/dL", 70, 99),
+    ("HbA1c", "%", 4.0, 5.6),
+    ("Creatinine", "mg/dL", 0.59, 1.35),
+    ("BUN", "mg/dL", 6, 24),
+    ("Sodium", "mmol/L", 135, 145),
+    ("Potassium", "mmol/L", 3.5, 5.0),
+    ("Total Cholesterol", "mg/dL", 125, 200),
+    ("Triglycerides", "mg/dL", 40, 150),
+    ("TSH", "mIU/L", 0.4, 4.0),
+    ("ALT", "U/L", 7, 56),
+    ("AST", "U/L", 10, 40),
+]
+
+_MEDICATIONS = {
+    "Glucose, Fasting": "Often treated with metformin alongside diet changes.",
+    "HbA1c": "Commonly prescribed: metformin or other glucose-lowering therapy.",
+    "Total Cholesterol": "Commonly prescribed: statins such as atorvastatin.",
+    "Triglycerides": "Often treated with lifestyle changes; fibrates in some cases.",
+    "Hemoglobin": "Often treated with iron supplementation if iron deficient.",
+    "TSH": "Commonly prescribed: levothyroxine for an underactive thyroid.",
+}
+
+
+class FakeLLMError(RuntimeError):
+    """Simulated provider failure (FAKE_LLM_ERROR_RATE)."""
+
+    code = 503
+
+
+class FakeRateLimitError(FakeLLMError):
+    """Simulated quota rejection (FAKE_LLM_QUOTA_RPM)."""
+
+    code = 429
+
+
+def sample_latency(rng: random.Random, distribution: str, median_ms: float, spread: float) -> float:
+    """
+    One latency draw in seconds. `spread` is the relative half-width for
+    "uniform" and the log-space sigma for "lognormal"; "exponential" uses
+    `median_ms` as its mean and "fixed" ignores `spread`.
+    """
+    median = median_ms / 1000
+    if distribution == "uniform":
+        return max(0.0, rng.uniform(median * (1 - spread), median * (1 + spread)))
+    if distribution == "lognormal":
+        return rng.lognormvariate(0.0, spread) * median if median > 0 else 0.0
+    if distribution == "exponential":
+        return rng.expovariate(1 / median) if median > 0 else 0.0
+    return median
+
+
+def synthetic_report(seed: int, tests: int = 10, header: bool = True) -> str:
+    """
+    Deterministic lab report text: an optional patient header (with PHI-like
+    fields for the redactor) and `tests` result rows, some out of range.
+    """
+    rng = random.Random(seed)
+    lines = []
+    if header:
+        lines += [
+            f"Patient Name: Test Patient{seed % 1000}    Age: {20 + seed % 60}",
+            f"MRN: SYN{seed:07d}   Collected: 2024-{1 + seed % 12:02d}-{1 + seed % 28:02d}",
+            "",
+            "LABORATORY REPORT",
+        ]
+    for name, unit, low, high in rng.sample(PANEL, min(tests, len(PANEL))):
+        width = high - low
+        value = rng.uniform(low - 0.3 * width, high + 0.3 * width)
+        flag = "H" if value > high else "L" if value < low else ""
+        digits = 1 if high < 100 else 0
+        lines.append(f"{name}  {value:.{digits}f}  {unit}  {low:g}-{high:g}  {flag}".rstrip())
+    return "\n".join(lines)
+
+
+def extract_rows(text: str) -> List[Dict]:
+    entities = []
+    for line in text.splitlines():
+        entity = parse_line(line)
+        if entity is not None:
+            entity.pop("confidence", None)
+            entities.append(entity)
+    return entities
+
+
+def explain(entities: List[Dict]) -> Dict:
+    abnormal = [e for e in entities if e.get("flag") in ("High", "Low", "Abnormal")]
+    # About as long per test as a real model's answer, so token and latency comparisons are fair.
+    sentences = [
+        f"{e.get('test_name')} is a routine blood test that helps your doctor check how that part of your body "
+        f"is working, by comparing your result with the reference range printed on the report. Your result is "
+        f"{e.get('value')} {e.get('unit') or ''}".strip()
+        + (f", which is {str(e['flag']).lower()}." if e.get("flag") else ".")
+        for e in entities
+    ]
+    medications = [_MEDICATIONS[e["test_name"]] for e in abnormal if e.get("test_name") in _MEDICATIONS]
+    follow_up = ["Retest abnormal values in 3 months."] if abnormal else ["Routine check-up in 12 months."]
+    return {
+        "explanation": " ".join(sentences) + " This is not a diagnosis; discuss the results with your doctor.",
+        "medication_suggestions": medications,
+        "follow_up_suggestions": follow_up,
+    }
+
+
+def reply(prompt: str) -> str:
+    """
+    The stand-in's answer to one prompt, recognized by the repo's prompt templates.
+    """
+    match = _FRAGMENT.search(prompt)
+    if match:
+        test, flag = match.groups()
+        return json.dumps({
+            "explanation": f"{test} is a routine lab test. A {flag.lower()} result is common and worth discussing with your doctor.",
+            "medication_suggestions": [] if flag == "Normal" else [f"Often treated by addressing the cause of a {flag.lower()} {test}."],
+            "follow_up_suggestions": [] if flag == "Normal" else ["Retest in 3 months."],
+        })
+    if "out-of-range results:" in prompt:
+        return "These results may be related and together suggest reviewing your overall metabolic health with your doctor."
+    if "=== REPORT " in prompt:
+        return json.dumps({report_id: extract_rows(body) for report_id, body in _REPORT_BLOCK.findall(prompt)})
+    match = _SECTION["entities"].search(prompt)
+    if match:
+        try:
+            entities = json.loads(match.group(1))
+        except ValueError:
+            entities = []
+        return json.dumps(explain(entities if isinstance(entities, list) else []))
+    match = _SECTION["text"].search(prompt)
+    if match:
+        return json.dumps(extract_rows(match.group(1)))
+    if "running summary" in prompt:
+        return "The patient asked about their lab results; the assistant explained the abnormal values."
+    return "Based on your report, the flagged values are worth discussing with your doctor. I am an AI assistant, not a physician."
+
+
+class _Sampler:
+    def __init__(self, seed: int):
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._quota = None
+
+    def draw(self):
+        """
+        (latency, error) for one call; error is None, or the exception to raise
+        after the latency, as the provider would.
+        """
+        with self._lock:
+            latency = sample_latency(
+                self._rng,
+                settings.FAKE_LLM_LATENCY_DIST,
+                settings.FAKE_LLM_LATENCY_MS,
+                settings.FAKE_LLM_LATENCY_SPREAD,
+            )
+            failed = self._rng.random() < settings.FAKE_LLM_ERROR_RATE
+            quota = self._quota_bucket()
+        if quota is not None and not quota.try_acquire():
+            # Quota rejections come back quickly, without the generation latency.
+            return latency / 20, FakeRateLimitError("simulated quota exceeded (429)")
+        return latency, FakeLLMError("simulated provider error (503)") if failed else None
+
+    def _quota_bucket(self):
+        rpm = settings.FAKE_LLM_QUOTA_RPM
+        if rpm <= 0:
+            return None
+        if self._quota is None or self._quota.rate != rpm / 60:
+            self._quota = TokenBucket(rpm / 60, rpm / 60)
+        return self._quota
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model stand-in with configurable latency and error rate (FAKE_LLM_*).
+    """
+
+    seed: int = 0
+    _sampler: _Sampler = PrivateAttr()
+
+    def __init__(self, **data):
+        super().__init__(**data)
+        self._sampler = _Sampler(self.seed)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        latency, error = self._sampler.draw()
+        time.sleep(latency)
+        return self._result(messages, error)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        latency, error = self._sampler.draw()
+        await asyncio.sleep(latency)
+        return self._result(messages, error)
+
+    def _result(self, messages, error) -> ChatResult:
+        if error is not None:
+            raise error
+        prompt = "\n".join(str(m.content) for m in messages)
+        content = reply(prompt)
+        message = AIMessage(
+            content=content,
+            usage_metadata={
+                "input_tokens": count_tokens(prompt),
+                "output_tokens": count_tokens(content),
+                "total_tokens": count_tokens(prompt) + count_tokens(content),
+            },
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+class _FakeVisionResponse:
+    def __init__(self, text: str):
+        self.text = text
+        self.usage_metadata = None
+
+
+class FakeVisionModel:
+    """
+    Stand-in for genai.GenerativeModel OCR calls: returns a synthetic report
+    seeded by the image bytes (or its entity rows, for the image extraction
+    prompt), after a sampled latency.
+    """
+
+    def __init__(self, seed: int = 0):
+        self._sampler = _Sampler(seed)
+
+    @staticmethod
+    def _text(parts) -> str:
+        prompt, image = parts[0], parts[-1]
+        data = image.get("data", b"") if isinstance(image, dict) else image.tobytes()
+        report = synthetic_report(zlib.crc32(data))
+        if "JSON" in prompt:
+            # Image-to-entities prompt: answer with the rows instead of the text.
+            return json.dumps(extract_rows(report))
+        return report
+
+    def generate_content(self, parts):
+        latency, error = self._sampler.draw()
+        time.sleep(latency)
+        if error is not None:
+            raise error
+        return _FakeVisionResponse(self._text(parts))
+
+    async def generate_content_async(self, parts):
+        latency, error = self._sampler.draw()
+        await asyncio.sleep(latency)
+        if error is not None:
+            raise error
+        return _FakeVisionResponse(self._text(parts))
@@ -0,0 +1,279 @@
+import asyncio
+import collections
+import random
+import threading
+import time
+import weakref
+from typing import AsyncIterable, AsyncIterator, Awaitable, Callable, Dict, Optional, TypeVar
+
+from backend.config import settings
+from backend.telemetry.metrics import LLM_COALESCED, LLM_CONCURRENCY_LIMIT, LLM_RETRIES, LLM_THROTTLED
+
+# Every remote model call (chat chains and OCR) goes through here: identical
+# in-flight requests are coalesced, calls are paced by a token bucket per API
+# key, concurrency adapts to throttling (AIMD), and throttled or transient
+# failures are retried with jittered exponential backoff.
+
+T = TypeVar("T")
+
+THROTTLED = "throttled"
+TRANSIENT = "transient"
+
+_THROTTLE_NAMES = ("RateLimit", "ResourceExhausted", "TooManyRequests")
+_TRANSIENT_NAMES = ("ServiceUnavailable", "InternalServerError", "ServerError", "BadGateway", "ConnectionError", "ConnectError")
+_TRANSIENT_CODES = {500, 502, 503, 504}
+
+
+def classify_error(error: BaseException) -> Optional[str]:
+    """
+    THROTTLED for quota/rate-limit rejections, TRANSIENT for server-side and
+    connection failures, None for errors a retry won't fix (bad request, auth,
+    unparseable output) and for timeouts, which already used the full budget.
+    Looks through the exception's cause chain, since clients wrap provider errors.
+    """
+    seen = 0
+    while error is not None and seen < 5:
+        code = getattr(error, "code", None)
+        name = type(error).__name__
+        if code == 429 or any(marker in name for marker in _THROTTLE_NAMES):
+            return THROTTLED
+        if code in _TRANSIENT_CODES or any(marker in name for marker in _TRANSIENT_NAMES):
+            return TRANSIENT
+        error = error.__cause__
+        seen += 1
+    return None
+
+
+def backoff_delay(attempt: int) -> float:
+    """
+    Full-jitter exponential backoff for retry number `attempt` (1-based).
+    """
+    ceiling = min(settings.LLM_BACKOFF_MAX_SECONDS, settings.LLM_BACKOFF_BASE_SECONDS * 2 ** (attempt - 1))
+    return random.uniform(0, ceiling)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` tokens/second, up to `capacity` banked.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self) -> float:
+        """
+        Takes a token, going into debt if none is left. Returns how long the
+        caller must wait before using it (0 if one was available); callers
+        queue up in reservation order.
+        """
+        with self._lock:
+            self._refill()
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+_buckets: Dict[tuple, TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def get_bucket() -> Optional[TokenBucket]:
+    """
+    The token bucket for the configured API key, shared by every event loop
+    and thread in the process; None if rate limiting is off.
+    """
+    if settings.LLM_RATE_LIMIT_RPM <= 0:
+        return None
+    key = (settings.LLM_BACKEND, settings.GOOGLE_API_KEY, settings.LLM_RATE_LIMIT_RPM, settings.LLM_RATE_LIMIT_BURST)
+    with _buckets_lock:
+        bucket = _buckets.get(key)
+        if bucket is None:
+            bucket = _buckets[key] = TokenBucket(settings.LLM_RATE_LIMIT_RPM / 60, settings.LLM_RATE_LIMIT_BURST)
+        return bucket
+
+
+class AdaptiveLimit:
+    """
+    AIMD concurrency cap for one event loop: grows by about one slot per
+    `limit` successful calls, halves on throttling, and stays within
+    [1, maximum]. Not thread-safe; use from its own loop only.
+    """
+
+    def __init__(self, maximum: int):
+        self.maximum = max(1, maximum)
+        self.limit = float(self.maximum)
+        self.in_flight = 0
+        self._waiters: collections.deque = collections.deque()
+
+    async def acquire(self) -> None:
+        while self.in_flight >= int(self.limit):
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    self._wake()  # pass the wake-up on to the next waiter
+                else:
+                    self._waiters.remove(waiter)
+                raise
+        self.in_flight += 1
+
+    def release(self, outcome: Optional[str]) -> None:
+        self.in_flight -= 1
+        if outcome == THROTTLED:
+            self.limit = max(1.0, self.limit / 2)
+        elif outcome == "ok":
+            self.limit = min(float(self.maximum), self.limit + 1 / self.limit)
+        LLM_CONCURRENCY_LIMIT.set(int(self.limit))
+        self._wake()
+
+    def _wake(self) -> None:
+        free = int(self.limit) - self.in_flight
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+
+class _LoopState:
+    def __init__(self):
+        self.limit = AdaptiveLimit(settings.LLM_MAX_CONCURRENCY)
+        self.in_flight: Dict[str, asyncio.Task] = {}
+
+
+# Per event loop: asyncio primitives are bound to the loop they are first used on
+# (tests and scripts may run several loops in one process).
+_states: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopState]" = weakref.WeakKeyDictionary()
+
+
+def _state() -> _LoopState:
+    loop = asyncio.get_running_loop()
+    state = _states.get(loop)
+    if state is None:
+        state = _states[loop] = _LoopState()
+    return state
+
+
+async def _pace() -> None:
+    bucket = get_bucket()
+    if bucket is not None:
+        wait = bucket.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+def _retry_or_raise(error: Exception, operation: str, attempt: int, started: bool = False) -> str:
+    # Returns the outcome for the concurrency limit; re-raises if the call should not be retried.
+    outcome = classify_error(error)
+    if outcome == THROTTLED:
+        LLM_THROTTLED.inc(operation=operation)
+    if outcome is None or started or attempt >= settings.LLM_MAX_RETRIES:
+        raise error
+    return outcome
+
+
+async def _call_with_retries(factory: Callable[[], Awaitable[T]], operation: str, timeout: Optional[float]) -> T:
+    state = _state()
+    attempt = 0
+    while True:
+        await _pace()
+        await state.limit.acquire()
+        outcome = None
+        try:
+            result = await asyncio.wait_for(factory(), timeout or settings.LLM_TIMEOUT_SECONDS)
+            outcome = "ok"
+            return result
+        except Exception as e:
+            outcome = _retry_or_raise(e, operation, attempt)
+        finally:
+            state.limit.release(outcome)
+        attempt += 1
+        LLM_RETRIES.inc(operation=operation)
+        await asyncio.sleep(backoff_delay(attempt))
+
+
+async def call(factory: Callable[[], Awaitable[T]], operation: str, key: Optional[str] = None, timeout: Optional[float] = None) -> T:
+    """
+    Runs a remote model call through the gateway. `factory` starts one attempt
+    (it is called again for each retry). Callers passing the same `key` while a
+    call is in flight share its result instead of making their own; use a key
+    only for deterministic requests. Raises asyncio.TimeoutError if an attempt
+    takes longer than `timeout` (default settings.LLM_TIMEOUT_SECONDS).
+    """
+    if key is None:
+        return await _call_with_retries(factory, operation, timeout)
+
+    state = _state()
+    task = state.in_flight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_call_with_retries(factory, operation, timeout))
+        state.in_flight[key] = task
+
+        def forget(done):
+            if state.in_flight.get(key) is done:
+                del state.in_flight[key]
+            if not done.cancelled():
+                done.exception()  # retrieved here so an unawaited failure isn't logged
+
+        task.add_done_callback(forget)
+    else:
+        LLM_COALESCED.inc(operation=operation)
+    # Shielded: one caller giving up must not cancel the call for the others.
+    return await asyncio.shield(task)
+
+
+async def stream(factory: Callable[[], AsyncIterable[T]], operation: str, timeout: Optional[float] = None) -> AsyncIterator[T]:
+    """
+    Streaming counterpart of `call`: holds one concurrency slot for the whole
+    stream and enforces `timeout` as a deadline on each attempt as a whole.
+    Failures before the first item are retried; later ones are raised.
+    """
+    state = _state()
+    loop = asyncio.get_running_loop()
+    attempt = 0
+    while True:
+        await _pace()
+        await state.limit.acquire()
+        outcome = None
+        started = False
+        deadline = loop.time() + (timeout or settings.LLM_TIMEOUT_SECONDS)
+        try:
+            iterator = factory().__aiter__()
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+                try:
+                    item = await asyncio.wait_for(iterator.__anext__(), remaining)
+                except StopAsyncIteration:
+                    break
+                started = True
+                yield item
+            outcome = "ok"
+            return
+        except Exception as e:
+            outcome = _retry_or_raise(e, operation, attempt, started)
+        finally:
+            state.limit.release(outcome)
+        attempt += 1
+        LLM_RETRIES.inc(operation=operation)
+        await asyncio.sleep(backoff_delay(attempt))
+
@@ -0,0 +1,52 @@
+import functools
+
+from backend.config import settings
+
+
+def create_chat_model():
+    """
+    Chat model for ClinicalChain: Gemini, or the offline stand-in when LLM_BACKEND=fake.
+    One client per backend/model/key is shared process-wide, so its connections are reused.
+    """
+    return _chat_model(settings.LLM_BACKEND, settings.LLM_MODEL, settings.GOOGLE_API_KEY)
+
+
+def create_vision_model():
+    """
+    Vision model for OCR, or None if Gemini is selected but not configured. Shared like create_chat_model.
+    """
+    return _vision_model(settings.LLM_BACKEND, settings.LLM_MODEL, settings.GOOGLE_API_KEY)
+
+
+@functools.lru_cache(maxsize=None)
+def _chat_model(backend: str, model: str, api_key):
+    if backend == "fake":
+        from backend.llm.fake import FakeChatModel
+        return FakeChatModel(seed=settings.FAKE_LLM_SEED)
+
+    # Deferred: langchain and the Gemini client are slow to import.
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    if not api_key:
+        print("WARNING: GOOGLE_API_KEY not found. Medical Agent will fail.")
+    return ChatGoogleGenerativeAI(
+        model=model,
+        temperature=0,
+        google_api_key=api_key,
+        # Single attempt: retries and backoff are the gateway's job (backend/llm/gateway.py).
+        max_retries=1,
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _vision_model(backend: str, model: str, api_key):
+    if backend == "fake":
+        from backend.llm.fake import FakeVisionModel
+        return FakeVisionModel(seed=settings.FAKE_LLM_SEED)
+
+    if not api_key:
+        print("ERROR: GOOGLE_API_KEY missing for OCR.")
+        return None
+    # Deferred: google.generativeai is slow to import and only needed once OCR is used.
+    import google.generativeai as genai
+    genai.configure(api_key=api_key)
+    return genai.GenerativeModel(model)
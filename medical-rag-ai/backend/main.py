@@ -1,16 +1,47 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from backend.config import settings
-from backend.api import upload, analyze, stream, chat
+from backend.registry import registry
+from backend.telemetry.profiler import SamplingProfiler
+from backend.telemetry.timing import TimingMiddleware
+from backend.api import upload, analyze, stream, chat, trends, jobs
+from backend.jobs.queue import get_job_queue
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in the background: the server accepts traffic immediately and
+    # /api/ready reports when the models are usable.
+    warm_up = asyncio.create_task(registry.warm_up(settings.WARMUP_COMPONENTS))
+    # Job workers pick up where the last run left off: persisted jobs are still queued.
+    jobs.start_workers()
+    yield
+    warm_up.cancel()
+    await get_job_queue().stop()
 
 app = FastAPI(
     title=settings.APP_NAME,
     version=settings.API_VERSION,
-    description="AI Medical Report Analyzer (Clinical RAG)"
+    description="AI Medical Report Analyzer (Clinical RAG)",
+    lifespan=lifespan,
 )
 
+profiler = None
+if settings.PROFILER_ENABLED:
+    profiler = SamplingProfiler(
+        interval=settings.PROFILER_INTERVAL_MS / 1000,
+        keep=settings.PROFILER_KEEP,
+        min_seconds=settings.PROFILER_MIN_SECONDS,
+        directory=settings.PROFILER_DIR or None,
+    )
+app.add_middleware(TimingMiddleware, profiler=profiler)
+app.state.profiler = profiler
+
 app.include_router(upload.router, prefix="/api", tags=["Upload"])
 app.include_router(analyze.router, prefix="/api", tags=["Analysis"])
 app.include_router(chat.router, prefix="/api", tags=["Chat"])
+app.include_router(trends.router, prefix="/api", tags=["Trends"])
+app.include_router(jobs.router, prefix="/api", tags=["Jobs"])
 app.include_router(stream.router, prefix="/api", tags=["System"])
 
 @app.get("/")
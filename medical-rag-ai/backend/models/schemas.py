@@ -1,5 +1,6 @@
-from pydantic import BaseModel, Field
-from typing import List, Optional
+from pydantic import BaseModel, Field, model_validator
+from typing import Dict, List, Literal, Optional
+from datetime import date
 
 class LabEntity(BaseModel):
     test_name: str = Field(..., description="Name of the lab test")
@@ -7,9 +8,20 @@ class LabEntity(BaseModel):
     unit: Optional[str] = Field(None, description="Unit of measurement")
     reference_range: Optional[str] = Field(None, description="Standard reference range")
     flag: Optional[str] = Field(None, description="High, Low, or Normal flag")
+    confidence: Optional[float] = Field(None, description="Rule-based extraction confidence (None if extracted by the LLM)")
+    canonical_id: Optional[str] = Field(None, description="Canonical test ID from the test vocabulary (None if unrecognized)")
 
 class AnalysisRequest(BaseModel):
-    text: str = Field(..., description="Extracted text from the report to analyze")
+    text: Optional[str] = Field(None, description="Extracted text from the report to analyze")
+    document_id: Optional[str] = Field(None, description="Handle returned by /upload-report, instead of resending the text")
+    patient_id: Optional[str] = Field(None, description="If set, the results are stored for trend queries under this key")
+    report_date: Optional[date] = Field(None, description="Collection date of the report (defaults to today)")
+
+    @model_validator(mode="after")
+    def _text_or_document(self):
+        if self.text is None and not self.document_id:
+            raise ValueError("Either text or document_id is required")
+        return self
 
 class AnalysisResponse(BaseModel):
     entities: List[LabEntity]
@@ -18,6 +30,55 @@ class AnalysisResponse(BaseModel):
     medication_suggestions: List[str] = Field(default_factory=list, description="List of suggested medications or lifestyle changes")
     follow_up_suggestions: List[str]
     disclaimer: str
+    session_id: Optional[str] = Field(None, description="Chat session for follow-up questions on this report")
+    document_id: Optional[str] = Field(None, description="Server-side handle of the report text (/analyze-report)")
+    extraction: Optional[str] = Field(None, description="For /analyze-image: \"fused\" (entities read straight from the image) or \"ocr\" (via OCR text)")
+    degraded: bool = Field(False, description="True if part of the analysis fell back after a model error; such results are not cached")
+
+class JobRequest(AnalysisRequest):
+    priority: Literal["urgent", "normal"] = Field("normal", description="Urgent jobs run first and may use the reserved queue slots")
+    timeout_seconds: Optional[float] = Field(None, gt=0, description="Run-time limit for this job (defaults to JOB_TIMEOUT_SECONDS)")
+
+class JobStatus(BaseModel):
+    job_id: str
+    status: str = Field(..., description="queued, running, succeeded, failed, cancelled or timeout")
+    priority: str
+    position: Optional[int] = Field(None, description="Queued jobs ahead of this one (while queued)")
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    stages: Dict[str, float] = Field(default_factory=dict, description="Seconds per stage: queue_wait, pipeline stages, run, total")
+    result: Optional[AnalysisResponse] = None
+    error: Optional[str] = None
+
+class BatchReport(BaseModel):
+    id: Optional[str] = Field(None, description="Caller-supplied report id (defaults to the report's position)")
+    text: str = Field(..., description="Extracted text from the report to analyze")
+
+class BatchAnalysisRequest(BaseModel):
+    reports: List[BatchReport]
+
+class BatchItemResult(BaseModel):
+    id: str
+    status: str = Field(..., description="ok or error")
+    result: Optional[AnalysisResponse] = None
+    error: Optional[str] = None
+
+class BatchAnalysisResponse(BaseModel):
+    results: List[BatchItemResult]
+    succeeded: int
+    failed: int
+
+class TrendPoint(BaseModel):
+    date: str
+    value: Optional[float] = Field(None, description="Numeric result (None for qualitative results)")
+    unit: Optional[str] = None
+    flag: Optional[str] = None
+
+class TrendResponse(BaseModel):
+    patient_id: str
+    test: str = Field(..., description="Canonical test name")
+    points: List[TrendPoint]
 
 class HealthCheck(BaseModel):
     status: str
@@ -0,0 +1,48 @@
+import threading
+from typing import Any, Dict, Optional
+from backend.cache.result_cache import get_cache, make_key
+from backend.config import settings
+
+
+class OCRTextCache:
+    """
+    OCR text keyed by the SHA-256 of the preprocessed image bytes, in the shared
+    "ocr" result cache. Only byte-identical images hit: report pages that merely
+    look alike (same layout, different values) must never share text.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0}
+
+    def get(self, digest: str) -> Optional[str]:
+        cache = get_cache("ocr")
+        if cache is None:
+            return None
+        text = cache.get(self._key(digest))
+        self._count("hits" if text is not None else "misses")
+        return text
+
+    def put(self, digest: str, text: str) -> None:
+        cache = get_cache("ocr")
+        if cache is None:
+            return
+        cache.set(self._key(digest), text)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    @staticmethod
+    def _key(digest: str) -> str:
+        return make_key("ocr", digest, settings.LLM_MODEL)
+
+
+ocr_text_cache = OCRTextCache()
@@ -1,29 +1,110 @@
-import google.generativeai as genai
-from PIL import Image
-import io
+import asyncio
+import hashlib
+from typing import List, Optional
+
+from pydantic import ValidationError
+
 from backend.config import settings
+from backend.cache.result_cache import make_key
+from backend.llm import gateway
+from backend.llm.models import create_vision_model
+from backend.models.schemas import LabEntity
+from backend.rag.clinical_chain import load_prompt
+from backend.telemetry.metrics import LLM_CALLS, LLM_TOKENS
+
+OCR_ERROR_TEXT = "Error extracting text from image."
+
+OCR_PROMPT = "Extract all text from this medical lab report image exactly as it appears. Maintain the structure as much as possible."
 
 class OCREngine:
     def __init__(self):
-        print("Initializing Gemini Vision for OCR...")
-        if not settings.GOOGLE_API_KEY:
-             print("ERROR: GOOGLE_API_KEY missing for OCR.")
-             return
-        genai.configure(api_key=settings.GOOGLE_API_KEY)
-        self.model = genai.GenerativeModel(settings.LLM_MODEL)
-        print("Gemini Vision OCR Ready.")
-
-    def process_image(self, image: Image.Image) -> str:
+        print(f"Initializing {settings.LLM_BACKEND} vision model for OCR...")
+        self.model = create_vision_model()
+        if self.model is not None:
+            print("Vision OCR Ready.")
+
+    def process_image(self, image) -> str:
+        """
+        aprocess_image for synchronous callers (not from a running event loop).
+        """
+        return asyncio.run(self.aprocess_image(image))
+
+    async def aprocess_image(self, image) -> str:
+        """
+        Uses Gemini Vision to extract text from an image (screenshot/photo), through
+        the model gateway (rate limit, retries, coalescing).
+        `image` is a PIL image or an inline-data blob ({"mime_type": ..., "data": ...}).
+        """
+        try:
+            response = await gateway.call(
+                lambda: self.model.generate_content_async([OCR_PROMPT, image]), "ocr", key=_image_key("ocr", image)
+            )
+            _record_usage(response, "ocr")
+            return response.text
+        except Exception as e:
+            LLM_CALLS.inc(operation="ocr", outcome="error")
+            print(f"ERROR: Gemini OCR failed: {e!r}")
+            return OCR_ERROR_TEXT
+
+    async def aextract_entities(self, image) -> Optional[List[dict]]:
         """
-        Uses Gemini Vision to extract text from an image (screenshot/photo).
+        Asks the vision model for LabEntity JSON straight from the image, skipping
+        the OCR text round trip. Returns None if the call fails or the answer does
+        not validate; callers then fall back to OCR text extraction.
         """
-        prompt = "Extract all text from this medical lab report image exactly as it appears. Maintain the structure as much as possible."
-        
         try:
-            response = self.model.generate_content([prompt, image])
-            text = response.text
-            print(f"DEBUG: Gemini OCR Extracted {len(text)} characters.")
-            return text
+            response = await gateway.call(
+                lambda: self.model.generate_content_async([load_prompt("image_entity_extraction"), image]),
+                "image_extraction",
+                key=_image_key("image_extraction", image),
+            )
+            _record_usage(response, "image_extraction")
         except Exception as e:
-            print(f"ERROR: Gemini OCR failed: {e}")
-            return "Error extracting text from image."
+            LLM_CALLS.inc(operation="image_extraction", outcome="error")
+            print(f"Warning: image entity extraction failed: {e!r}")
+            return None
+        return parse_image_entities(response.text)
+
+
+def parse_image_entities(text: str) -> Optional[List[dict]]:
+    """
+    The vision model's answer to the image extraction prompt as LabEntity dicts,
+    or None if it is not a non-empty JSON list of valid entities.
+    """
+    # Deferred: langchain is slow to import.
+    from langchain_core.utils.json import parse_json_markdown
+    try:
+        rows = parse_json_markdown(text)
+    except ValueError:
+        return None
+    if isinstance(rows, dict):
+        rows = [rows]
+    if not isinstance(rows, list) or not rows:
+        return None
+    entities = []
+    for row in rows:
+        if not isinstance(row, dict):
+            return None
+        # Models often emit numeric values; LabEntity keeps them as strings.
+        row = {k: str(v) if isinstance(v, (int, float)) and not isinstance(v, bool) else v for k, v in row.items()}
+        try:
+            entity = LabEntity.model_validate(row)
+        except ValidationError:
+            return None
+        entities.append(entity.model_dump(exclude={"confidence"}))
+    return entities
+
+
+def _image_key(operation: str, image):
+    # Identical uploads sent concurrently share one call; PIL images are not coalesced.
+    if isinstance(image, dict):
+        return make_key(operation, hashlib.sha256(image["data"]).hexdigest(), settings.LLM_MODEL)
+    return None
+
+
+def _record_usage(response, operation: str) -> None:
+    LLM_CALLS.inc(operation=operation, outcome="ok")
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None:
+        LLM_TOKENS.observe(getattr(usage, "prompt_token_count", 0) or 0, operation=operation, kind="prompt")
+        LLM_TOKENS.observe(getattr(usage, "candidates_token_count", 0) or 0, operation=operation, kind="completion")
@@ -1,20 +1,128 @@
 import pypdf
-import io
+import asyncio
+import mmap
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import AsyncIterator, Iterator, List, Optional, Tuple
+from backend.config import settings
 
-def parse_pdf(file_bytes: bytes) -> str:
+
+class PDFTooLargeError(ValueError):
+    """
+    Raised when a PDF exceeds the configured size or page limits.
     """
-    Extract text from a PDF file.
-    Does NOT handle scanned PDFs via OCR in this simple function (that would require converting pages to images).
-    For scanned PDFs, the client should convert to images or we use headers.
-    
-    For MVP, we extract text if digital, else return empty string (triggering OCR fallback in logic).
+
+
+def render_page_image(path: str, page_number: int, dpi: Optional[int] = None):
     """
+    Rasterizes one page for OCR. Uses pypdfium2 when installed; otherwise falls
+    back to the largest image embedded in the page, which for scanned documents
+    is the scan itself. Returns None if the page has nothing to render.
+    """
+    dpi = dpi or settings.PDF_OCR_DPI
     try:
-        reader = pypdf.PdfReader(io.BytesIO(file_bytes))
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text() or ""
-        return text
-    except Exception as e:
-        print(f"Error parsing PDF: {e}")
-        return ""
+        import pypdfium2
+    except ImportError:
+        pypdfium2 = None
+
+    if pypdfium2 is not None:
+        document = pypdfium2.PdfDocument(path)
+        try:
+            return document[page_number].render(scale=dpi / 72).to_pil().convert("RGB")
+        finally:
+            document.close()
+
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        page = pypdf.PdfReader(mapped).pages[page_number]
+        images = [embedded.image for embedded in page.images if embedded.image is not None]
+        if not images:
+            return None
+        return max(images, key=lambda image: image.width * image.height).convert("RGB")
+
+
+def iter_pdf_pages(path: str, workers: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+    """
+    Yields (page_number, text) in page order as soon as each page is extracted,
+    so downstream stages can start before the whole document is parsed.
+    Raises PDFTooLargeError before extracting anything if the document has more
+    than settings.PDF_MAX_PAGES pages.
+    """
+    if workers is None:
+        workers = settings.PDF_PARSE_WORKERS
+
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        reader = pypdf.PdfReader(mapped)
+        page_count = len(reader.pages)
+        if page_count > settings.PDF_MAX_PAGES:
+            raise PDFTooLargeError(f"PDF has {page_count} pages (limit {settings.PDF_MAX_PAGES}).")
+
+        if workers <= 1 or page_count < settings.PDF_PARALLEL_MIN_PAGES:
+            for number, page in enumerate(reader.pages):
+                yield number, page.extract_text() or ""
+            return
+
+    # Each worker re-opens (and maps) the file itself, so only the path crosses
+    # the process boundary; executor.map hands results back in submission order.
+    chunk = max(1, -(-page_count // (workers * 4)))
+    starts = list(range(0, page_count, chunk))
+    stops = [min(start + chunk, page_count) for start in starts]
+    for start, texts in zip(starts, _get_pool(workers).map(_extract_page_range, repeat(path), starts, stops)):
+        for offset, text in enumerate(texts):
+            yield start + offset, text
+
+
+async def aiter_pdf_pages(path: str, workers: Optional[int] = None) -> AsyncIterator[Tuple[int, str]]:
+    """
+    Async view of iter_pdf_pages: extraction runs in a worker thread and each page
+    is handed to the caller as soon as it is extracted, so the caller can redact
+    or OCR early pages while later ones are still being parsed. Extraction errors
+    (including PDFTooLargeError) are raised from the iteration.
+    """
+    loop = asyncio.get_running_loop()
+    pages: asyncio.Queue = asyncio.Queue()
+    stop = threading.Event()
+    done = object()
+
+    def produce():
+        end = done
+        try:
+            for page in iter_pdf_pages(path, workers):
+                if stop.is_set():
+                    break
+                loop.call_soon_threadsafe(pages.put_nowait, page)
+        except Exception as e:
+            end = e
+        loop.call_soon_threadsafe(pages.put_nowait, end)
+
+    producer = loop.run_in_executor(None, produce)
+    try:
+        while (item := await pages.get()) is not done:
+            if isinstance(item, Exception):
+                raise item
+            yield item
+        await producer
+    finally:
+        # The consumer gave up early: let the extraction thread stop at the next page.
+        stop.set()
+
+
+def _extract_page_range(path: str, start: int, stop: int) -> List[str]:
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        reader = pypdf.PdfReader(mapped)
+        return [reader.pages[number].extract_text() or "" for number in range(start, stop)]
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawned, not forked: the pool starts lazily inside a threaded server, and a
+            # forked child could inherit a lock some other thread held at that moment.
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
@@ -0,0 +1,20 @@
+import asyncio
+from backend.ocr.ocr_engine import OCR_ERROR_TEXT
+from backend.ocr.pdf_parser import render_page_image
+
+
+async def ocr_pdf_page(path: str, number: int, engine, slots: asyncio.Semaphore) -> str:
+    """
+    Rasterizes and OCRs one page, holding one of `slots` while it does; empty if it fails.
+    """
+    async with slots:
+        try:
+            image = await asyncio.to_thread(render_page_image, path, number)
+            if image is None:
+                return ""
+            text = await engine.aprocess_image(image)
+        except Exception as e:
+            # One undecodable scan (CCITT/JBIG2 without pypdfium2) must not cost the other pages.
+            print(f"Warning: OCR of PDF page {number} failed: {e!r}")
+            return ""
+        return "" if text == OCR_ERROR_TEXT else text
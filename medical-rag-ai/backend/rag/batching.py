@@ -0,0 +1,34 @@
+from typing import Dict, List
+
+from backend.rag.tokens import count_tokens
+
+
+def render_reports(group: Dict[str, str]) -> str:
+    """
+    Lays out several reports in one prompt, each fenced by its id.
+    """
+    blocks = []
+    for report_id, text in group.items():
+        blocks.append(f"=== REPORT {report_id} ===\n{text.strip()}\n=== END REPORT {report_id} ===")
+    return "\n\n".join(blocks)
+
+
+def pack_reports(reports: Dict[str, str], token_budget: int, max_reports: int) -> List[Dict[str, str]]:
+    """
+    Greedily packs reports (in order) into groups whose rendered size stays under
+    `token_budget` tokens and `max_reports` reports. A report that alone exceeds
+    the budget gets a group of its own.
+    """
+    groups: List[Dict[str, str]] = []
+    current: Dict[str, str] = {}
+    current_tokens = 0
+    for report_id, text in reports.items():
+        tokens = count_tokens(render_reports({report_id: text}))
+        if current and (current_tokens + tokens > token_budget or len(current) >= max_reports):
+            groups.append(current)
+            current, current_tokens = {}, 0
+        current[report_id] = text
+        current_tokens += tokens
+    if current:
+        groups.append(current)
+    return groups
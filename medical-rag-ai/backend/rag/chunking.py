@@ -0,0 +1,108 @@
+import re
+from typing import Dict, List
+
+from backend.rag.tokens import count_tokens
+
+# Words that mark a panel/section heading on lab reports.
+_SECTION_WORDS = re.compile(
+    r"\b(panel|profile|count|function|chemistry|hematology|haematology|biochemistry|"
+    r"urinalysis|urine|lipid|thyroid|liver|kidney|renal|electrolytes|hormones?|vitamins?|"
+    r"serology|immunology|diabetes|iron studies|coagulation)\b",
+    re.IGNORECASE,
+)
+_PAGE_MARKER = re.compile(r"^\s*page\s+\d+(\s*(of|/)\s*\d+)?\s*$", re.IGNORECASE)
+_DIGIT = re.compile(r"\d")
+
+
+def is_section_boundary(line: str) -> bool:
+    """
+    True for page breaks and panel headings ("LIPID PROFILE", "Complete Blood Count:").
+    Headings carry no numbers, which keeps result rows like "WBC 12.1" out.
+    """
+    stripped = line.strip()
+    if "\f" in line or _PAGE_MARKER.match(stripped):
+        return True
+    if not stripped or len(stripped) > 60 or _DIGIT.search(stripped):
+        return False
+    letters = [c for c in stripped if c.isalpha()]
+    if len(letters) < 4:
+        return False
+    return stripped.isupper() or stripped.endswith(":") or bool(_SECTION_WORDS.search(stripped))
+
+
+def split_sections(text: str) -> List[str]:
+    sections: List[List[str]] = [[]]
+    for line in text.splitlines():
+        if is_section_boundary(line) and any(l.strip() for l in sections[-1]):
+            sections.append([])
+        sections[-1].append(line)
+    return ["\n".join(lines) for lines in sections if any(l.strip() for l in lines)]
+
+
+def chunk_report(text: str, token_budget: int) -> List[str]:
+    """
+    Splits report text on section boundaries into chunks of at most `token_budget`
+    tokens (tiktoken). Sections are packed together while they fit; a section too
+    large on its own is split by lines, repeating its heading on each piece.
+    """
+    if count_tokens(text) <= token_budget:
+        return [text]
+
+    chunks: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+    for section in split_sections(text):
+        for piece in _split_oversized(section, token_budget):
+            tokens = count_tokens(piece)
+            if current and current_tokens + tokens > token_budget:
+                chunks.append("\n".join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += tokens
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def _split_oversized(section: str, token_budget: int) -> List[str]:
+    if count_tokens(section) <= token_budget:
+        return [section]
+    lines = section.splitlines()
+    heading = lines[0] if is_section_boundary(lines[0]) else ""
+    heading_tokens = count_tokens(heading) if heading else 0
+    pieces: List[str] = []
+    current: List[str] = [heading] if heading else []
+    current_tokens = heading_tokens
+    for line in lines[1:] if heading else lines:
+        tokens = count_tokens(line) + 1
+        if current_tokens + tokens > token_budget and len(current) > (1 if heading else 0):
+            pieces.append("\n".join(current))
+            current = [heading] if heading else []
+            current_tokens = heading_tokens
+        current.append(line)
+        current_tokens += tokens
+    if len(current) > (1 if heading else 0):
+        pieces.append("\n".join(current))
+    return pieces
+
+
+def dedupe_entities(chunk_results: List[List[Dict]]) -> List[Dict]:
+    """
+    Merges per-chunk entity lists in chunk order, dropping repeats of the same
+    test and value (e.g. results echoed in page headers).
+    """
+    merged = []
+    seen = set()
+    for entities in chunk_results:
+        for entity in entities:
+            if not isinstance(entity, dict):
+                continue
+            key = (
+                str(entity.get("test_name") or "").strip().lower(),
+                str(entity.get("value") or "").strip().lower(),
+            )
+            if key in seen:
+                continue
+            seen.add(key)
+            merged.append(entity)
+    return merged
@@ -1,70 +1,479 @@
+import asyncio
+import hashlib
 import json
+import functools
 import os
-from langchain_core.prompts import PromptTemplate
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.output_parsers import JsonOutputParser
+import time
 from backend.config import settings
+from backend.rag.lab_parser import parse_lab_text
+from backend.rag.batching import pack_reports, render_reports
+from backend.rag.chunking import chunk_report, dedupe_entities
+from backend.rag.compaction import COMPACTION_VERSION, compact_report, is_boilerplate
+from backend.rag.retrieval import build_chat_context
+from backend.rag.flagging import FLAGGING_VERSION, flag_entities
+from backend.rag.test_names import canonicalize_entities, vocabulary_version
+from backend.rag import fragments
+from backend.cache.result_cache import get_cache, make_key
+from backend.llm import gateway
+from backend.llm.models import create_chat_model
+from backend.telemetry.metrics import COMPACTION_TOKENS, LLM_RETRIES
+from backend.telemetry.timing import record_payload, record_stage, stage
+
+PROMPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "prompts")
+
+
+@functools.lru_cache(maxsize=None)
+def load_prompt(name: str) -> str:
+    """
+    Prompt template text from backend/prompts, independent of the working directory.
+    """
+    with open(os.path.join(PROMPTS_DIR, f"{name}.txt"), "r") as f:
+        return f.read()
+
+
+def explanation_fallback():
+    # "degraded": a placeholder for a failed call, never cached.
+    return {
+        "explanation": "Could not generate detailed explanation due to an error.",
+        "medication_suggestions": [],
+        "follow_up_suggestions": [],
+        "degraded": True
+    }
+
+
+def empty_analysis():
+    return {
+        "entities": [],
+        "summary": "No measurable data found.",
+        "explanation": "The AI could not identify standard lab tests in this document.",
+        "medication_suggestions": [],
+        "follow_up_suggestions": [],
+        "disclaimer": ""
+    }
+
+
+ENTITY_FIELDS = ("test_name", "value", "unit", "reference_range", "flag")
+
+
+def canonical_entities(entities):
+    """
+    Order- and formatting-independent form of an entity list, used for cache keys.
+    """
+    canonical = []
+    for entity in entities:
+        # "Hb" and "Hemoglobin" are the same result: the canonical ID stands in for the printed name.
+        fields = [entity.get("canonical_id") or entity.get("test_name")] + [entity.get(field) for field in ENTITY_FIELDS[1:]]
+        canonical.append(tuple(str(value or "").strip().lower() for value in fields))
+    return sorted(canonical)
+
 
 class ClinicalChain:
     def __init__(self):
-        # We enforce using a Real LLM (Gemini)
-        api_key = settings.GOOGLE_API_KEY
-        if not api_key:
-            print("WARNING: GOOGLE_API_KEY not found. Medical Agent will fail.")
-        
-        self.llm = ChatGoogleGenerativeAI(
-            model=settings.LLM_MODEL,
-            temperature=0,
-            google_api_key=api_key
-        )
+        # Deferred: langchain is slow to import.
+        from langchain_core.prompts import PromptTemplate
+        from langchain_core.output_parsers import JsonOutputParser, StrOutputParser
+        from backend.telemetry.llm import LLMUsageCallback
+
+        # Gemini, or the offline stand-in (LLM_BACKEND=fake)
+        self.llm = create_chat_model()
+        self.json_parser = JsonOutputParser()
+        self.str_parser = StrOutputParser()
+        self.usage_callback = LLMUsageCallback()
         
         # Load Prompts
-        with open("backend/prompts/entity_extraction.txt", "r") as f:
-            self.entity_prompt = PromptTemplate.from_template(f.read())
-        
-        with open("backend/prompts/explanation.txt", "r") as f:
-            self.explain_prompt = PromptTemplate.from_template(f.read())
+        entity_template = load_prompt("entity_extraction")
+        self.entity_prompt = PromptTemplate.from_template(entity_template)
+        explain_template = load_prompt("explanation")
+        self.explain_prompt = PromptTemplate.from_template(explain_template)
+        self.summary_prompt = PromptTemplate.from_template(load_prompt("chat_summary"))
+        batch_template = load_prompt("batch_entity_extraction")
+        self.batch_entity_prompt = PromptTemplate.from_template(batch_template)
+        synthesis_template = load_prompt("explanation_synthesis")
+        self.synthesis_prompt = PromptTemplate.from_template(synthesis_template)
+
+        # Cached results are invalidated whenever a prompt template, the flagging rules, the test
+        # vocabulary, the compaction rules or the fragment library changes.
+        templates = entity_template + explain_template + batch_template + synthesis_template
+        templates += f"flagging:{FLAGGING_VERSION}:vocabulary:{vocabulary_version(settings.TEST_VOCABULARY_PATH or None)}"
+        if settings.PROMPT_COMPACTION_ENABLED:
+            templates += f"compaction:{COMPACTION_VERSION}:{settings.PROMPT_COMPACTION_MIN_REPEATS}"
+        if settings.EXPLANATION_FRAGMENTS_ENABLED:
+            templates += f"fragments:{settings.EXPLANATION_FRAGMENTS_VERSION}:{settings.EXPLANATION_SYNTHESIS_MIN_ABNORMAL}"
+        self.prompt_version = hashlib.sha256(templates.encode("utf-8")).hexdigest()[:12]
+
+    def _chain(self, prompt, parser, operation: str):
+        """
+        prompt | llm | parser, tagged with `operation` for token/call metrics.
+        """
+        return (prompt | self.llm | parser).with_config(self._llm_config(operation))
+
+    def _llm_config(self, operation: str):
+        return {"tags": [f"op:{operation}"], "callbacks": [self.usage_callback]}
+
+    async def _ainvoke(self, chain, inputs: dict, operation: str):
+        """
+        chain.ainvoke(inputs) through the model gateway; concurrent identical
+        requests (same prompt inputs, prompts and model) share one call.
+        """
+        key = make_key(operation, inputs, self.prompt_version, settings.LLM_MODEL)
+        return await gateway.call(lambda: chain.ainvoke(inputs), operation, key=key)
 
     def extract_entities(self, text: str):
+        """
+        Extracts LabEntity objects from text, for synchronous callers (not from a running event loop).
+        """
+        return asyncio.run(self.aextract_entities(text))
+
+    async def aextract_entities(self, text: str):
+        """
+        Extracts LabEntity objects from text.
+        Confident table rows are parsed locally; the LLM only sees the rest.
+        """
+        entities, llm_text = self._fast_extract(text)
+        if llm_text is not None:
+            with stage("llm_extraction"):
+                entities = self._merge_entities(entities, await self._allm_extract_entities(llm_text))
+        # Test names are mapped to canonical IDs, and flags computed locally from value and range, not taken from the LLM.
+        with stage("flagging"):
+            return flag_entities(canonicalize_entities(entities))
+
+    def _fast_extract(self, text: str):
+        """
+        Runs the rule-based parser. Returns (entities, llm_text), where llm_text is
+        the text still to be sent to the LLM, or None if the parser covered everything.
+        """
+        record_payload("extraction", len(text.encode("utf-8")))
+        if not settings.FAST_EXTRACTION_ENABLED:
+            return [], self._compact(text)
+
+        with stage("fast_extract"):
+            entities, uncertain_lines = parse_lab_text(text, settings.FAST_EXTRACTION_MIN_CONFIDENCE)
+        if not entities:
+            # Not a recognizable table layout; let the LLM read the whole document.
+            return [], self._compact(text)
+        # Letterhead and footer lines the parser can't read are not worth an LLM call.
+        uncertain_lines = [line for line in uncertain_lines if not is_boilerplate(line)]
+        if uncertain_lines:
+            return entities, "\n".join(uncertain_lines)
+        return entities, None
+
+    @staticmethod
+    def _compact(text: str) -> str:
+        """
+        The document as the extraction prompt gets it: without page headers and
+        footers, boilerplate and whitespace runs (PROMPT_COMPACTION_ENABLED).
+        """
+        if not settings.PROMPT_COMPACTION_ENABLED:
+            return text
+        with stage("compaction"):
+            compacted, stats = compact_report(text, settings.PROMPT_COMPACTION_MIN_REPEATS)
+        COMPACTION_TOKENS.observe(stats["tokens_before"], kind="before")
+        COMPACTION_TOKENS.observe(stats["tokens_after"], kind="after")
+        return compacted
+
+    @staticmethod
+    def _merge_entities(entities, llm_entities):
+        seen = {e["test_name"].lower() for e in entities}
+        for entity in llm_entities:
+            if str(entity.get("test_name", "")).lower() not in seen:
+                entities.append(entity)
+        return entities
+
+    async def _allm_extract_entities(self, text: str):
         """
         Uses LLM to extract LabEntity objects from text.
+        Long reports are split on section boundaries and the chunks extracted
+        concurrently; a failed chunk only loses its own entities.
         """
-        chain = self.entity_prompt | self.llm | JsonOutputParser()
-        try:
-            result = chain.invoke({"text": text})
+        chunks = chunk_report(text, settings.EXTRACTION_CHUNK_TOKENS)
+        results = await asyncio.gather(
+            *(self._allm_extract_entities_or_raise(chunk) for chunk in chunks),
+            return_exceptions=True,
+        )
+        return self._merge_chunk_results(results)
+
+    @staticmethod
+    def _merge_chunk_results(results):
+        chunk_entities = []
+        for idx, result in enumerate(results):
+            if isinstance(result, Exception):
+                print(f"Entity Extraction Warning (chunk {idx + 1}/{len(results)}): {result!r}")
+                continue
             # Ensure it's a list
             if isinstance(result, dict):
                 result = [result]
-            return result
+            if isinstance(result, list):
+                chunk_entities.append(result)
+        return dedupe_entities(chunk_entities)
+
+    async def _allm_extract_entities_or_raise(self, text: str):
+        chain = self._chain(self.entity_prompt, self.json_parser, "extraction")
+        result = await self._ainvoke(chain, {"text": text}, "extraction")
+        if isinstance(result, dict):
+            result = [result]
+        if not isinstance(result, list):
+            raise ValueError(f"Expected a JSON list of entities, got {type(result).__name__}")
+        return result
+
+    async def abatch_extract_entities(self, reports):
+        """
+        Extracts entities for many reports at once.
+        `reports` maps report id -> text. Reports the rule-based parser cannot fully
+        cover are packed into shared LLM prompts up to settings.BATCH_TOKEN_BUDGET.
+        Returns report id -> entity list, or the Exception that report failed with.
+        """
+        results = {}
+        pending = {}
+        for report_id, text in reports.items():
+            entities, llm_text = self._fast_extract(text)
+            if llm_text is None:
+                results[report_id] = flag_entities(canonicalize_entities(entities))
+            else:
+                pending[report_id] = (entities, llm_text)
+
+        groups = pack_reports(
+            {report_id: llm_text for report_id, (_, llm_text) in pending.items()},
+            token_budget=settings.BATCH_TOKEN_BUDGET,
+            max_reports=settings.BATCH_MAX_REPORTS_PER_PROMPT,
+        )
+        # Keep one batch from taking every global LLM slot.
+        parallel = asyncio.Semaphore(settings.BATCH_MAX_PARALLEL)
+
+        async def run_group(group):
+            async with parallel:
+                return await self._aextract_group(group)
+
+        for found in await asyncio.gather(*(run_group(group) for group in groups)):
+            for report_id, value in found.items():
+                if isinstance(value, Exception):
+                    results[report_id] = value
+                else:
+                    results[report_id] = flag_entities(canonicalize_entities(self._merge_entities(pending[report_id][0], value)))
+        return results
+
+    async def _aextract_group(self, group):
+        if len(group) == 1:
+            return await self._aextract_singles(group)
+
+        chain = self._chain(self.batch_entity_prompt, self.json_parser, "batch_extraction")
+        try:
+            response = await self._ainvoke(chain, {"reports": render_reports(group)}, "batch_extraction")
+            if not isinstance(response, dict):
+                raise ValueError(f"Expected a JSON object keyed by report id, got {type(response).__name__}")
         except Exception as e:
-            print(f"Entity Extraction Warning: {e}")
-            return []
+            print(f"Batch Extraction Warning ({len(group)} reports): {e!r}")
+            LLM_RETRIES.inc(len(group), operation="batch_extraction")
+            return await self._aextract_singles(group)
+
+        found = {}
+        missing = {}
+        for report_id, text in group.items():
+            value = response.get(report_id)
+            if isinstance(value, dict):
+                value = [value]
+            if isinstance(value, list):
+                found[report_id] = value
+            else:
+                missing[report_id] = text
+        if missing:
+            LLM_RETRIES.inc(len(missing), operation="batch_extraction")
+            found.update(await self._aextract_singles(missing))
+        return found
+
+    async def _aextract_singles(self, group):
+        async def one(text):
+            try:
+                return await self._allm_extract_entities_or_raise(text)
+            except Exception as e:
+                return e
+
+        values = await asyncio.gather(*(one(text) for text in group.values()))
+        return dict(zip(group.keys(), values))
 
     def generate_explanation(self, entities):
+        """
+        generate_explanation for synchronous callers (not from a running event loop).
+        """
+        return asyncio.run(self.agenerate_explanation(entities))
+
+    async def agenerate_explanation(self, entities):
         """
         Uses LLM to explain results and suggest medications.
+        Cached on the canonical entity list.
         """
-        chain = self.explain_prompt | self.llm | JsonOutputParser()
+        cache, key, cached = self._explanation_cache_lookup(entities)
+        if cached is not None:
+            return cached
+
+        plan = self._fragment_plan(entities)
+        chain = self._chain(self.explain_prompt, self.json_parser, "explanation")
         try:
-            response = chain.invoke({"entities": json.dumps(entities)})
+            with stage("explanation"):
+                if plan is not None:
+                    response = await self._aexplain_from_fragments(*plan)
+                else:
+                    response = await self._ainvoke(chain, {"entities": json.dumps(entities)}, "explanation")
+            if cache is not None and isinstance(response, dict) and not response.get("degraded"):
+                cache.set(key, response)
             return response
         except Exception as e:
-            print(f"Explanation Error: {e}")
-            return {
-                "explanation": "Could not generate detailed explanation due to an error.",
-                "medication_suggestions": [],
-                "follow_up_suggestions": []
-            }
+            print(f"Explanation Error: {e!r}")
+            return explanation_fallback()
 
-    def chat(self, chat_history: list, user_input: str, context: str):
+    async def astream_explanation(self, entities):
+        """
+        Streams the explanation as it is generated.
+        Yields ("token", text_delta) pairs for the explanation text, then a single
+        ("result", explanation_data) pair with the complete parsed response.
+        """
+        cache, key, cached = self._explanation_cache_lookup(entities)
+        if cached is not None:
+            yield "token", cached.get("explanation", "")
+            yield "result", cached
+            return
+
+        plan = self._fragment_plan(entities)
+        if plan is not None:
+            # Mostly assembled locally: nothing worth streaming token by token.
+            try:
+                with stage("explanation"):
+                    response = await self._aexplain_from_fragments(*plan)
+            except Exception as e:
+                print(f"Explanation Error: {e!r}")
+                response = explanation_fallback()
+            else:
+                if cache is not None and not response.get("degraded"):
+                    cache.set(key, response)
+            yield "token", response["explanation"]
+            yield "result", response
+            return
+
+        chain = self._chain(self.explain_prompt, self.json_parser, "explanation")
+        response = None
+        sent = 0
+        started = time.perf_counter()
+        try:
+            # JsonOutputParser emits progressively more complete partial objects.
+            stream = gateway.stream(lambda: chain.astream({"entities": json.dumps(entities)}), "explanation")
+            async for partial in stream:
+                if not isinstance(partial, dict):
+                    continue
+                response = partial
+                explanation = partial.get("explanation")
+                if isinstance(explanation, str) and len(explanation) > sent:
+                    yield "token", explanation[sent:]
+                    sent = len(explanation)
+        except Exception as e:
+            print(f"Explanation Error: {e!r}")
+            response = None
+
+        record_stage("explanation", time.perf_counter() - started)
+        if response is None:
+            response = explanation_fallback()
+            if not sent:
+                yield "token", response["explanation"]
+        elif cache is not None:
+            cache.set(key, response)
+        yield "result", response
+
+    def _fragment_plan(self, entities):
+        """
+        (known, unknown, to_synthesize) when the fragment library covers at least
+        one entity, else None. `known` pairs entities with their fragments;
+        `unknown` still needs the explanation prompt; `to_synthesize` lists the
+        abnormal results for the cross-test synthesis (empty to skip it).
+        """
+        library = fragments.get_library()
+        if not library:
+            return None
+        known, unknown = fragments.split_entities(entities, library)
+        if not known:
+            return None
+        flagged = fragments.abnormal(entities)
+        minimum = settings.EXPLANATION_SYNTHESIS_MIN_ABNORMAL
+        return known, unknown, flagged if 0 < minimum <= len(flagged) else []
+
+    async def _aexplain_from_fragments(self, known, unknown, to_synthesize):
+        """
+        Library fragments for the known results; the LLM explains only the unknown
+        ones and writes the synthesis, concurrently. If either call fails the
+        explanation is assembled without it.
+        """
+        async def explain_unknown():
+            if not unknown:
+                return None
+            chain = self._chain(self.explain_prompt, self.json_parser, "explanation")
+            return await self._ainvoke(chain, {"entities": json.dumps(unknown)}, "explanation")
+
+        async def synthesize():
+            if not to_synthesize:
+                return None
+            chain = self._chain(self.synthesis_prompt, self.str_parser, "explanation_synthesis")
+            return await self._ainvoke(chain, {"findings": fragments.findings_text(to_synthesize)}, "explanation_synthesis")
+
+        unknown_data, synthesis = await asyncio.gather(explain_unknown(), synthesize(), return_exceptions=True)
+        failed = False
+        for name, value in (("unknown tests", unknown_data), ("synthesis", synthesis)):
+            if isinstance(value, Exception):
+                print(f"Explanation Warning ({name}): {value!r}")
+                failed = True
+        response = fragments.assemble(
+            known,
+            unknown,
+            unknown_data if isinstance(unknown_data, dict) else None,
+            synthesis.strip() if isinstance(synthesis, str) else None,
+        )
+        if failed:
+            response["degraded"] = True
+        return response
+
+    def _explanation_cache_lookup(self, entities):
+        cache = get_cache("explanation")
+        key = make_key(canonical_entities(entities), self.prompt_version, settings.LLM_MODEL)
+        cached = cache.get(key) if cache is not None else None
+        return cache, key, cached
+
+    def chat(self, chat_history: list, user_input: str, context: str, summary: str = ""):
+        """
+        achat for synchronous callers (not from a running event loop).
+        """
+        return asyncio.run(self.achat(chat_history, user_input, context, summary))
+
+    async def achat(self, chat_history: list, user_input: str, context: str, summary: str = ""):
         """
         Conversational chat with the report context.
+        Only the report lines and knowledge-base passages relevant to the
+        question are put in the prompt (bounded by CHAT_CONTEXT_TOKENS).
+        `summary` stands in for conversation turns older than `chat_history`.
+        Raises asyncio.TimeoutError if the model does not answer in time.
+        """
+        # Embedding and index search are CPU-bound; keep them off the event loop.
+        with stage("chat_context"):
+            context = await asyncio.to_thread(build_chat_context, user_input, context, settings.CHAT_CONTEXT_TOKENS)
+        with stage("chat_llm"):
+            messages = self._chat_messages(chat_history, user_input, context, summary)
+            response = await gateway.call(lambda: self.llm.ainvoke(messages, config=self._llm_config("chat")), "chat")
+        return response.content
+
+    async def asummarize_turns(self, summary: str, turns: list) -> str:
+        """
+        Folds `turns` into the rolling conversation `summary` and returns the new summary.
         """
+        transcript = "\n".join(
+            f"{'Patient' if turn['role'] == 'user' else 'Assistant'}: {turn['content']}" for turn in turns
+        )
+        chain = self._chain(self.summary_prompt, self.str_parser, "chat_summary")
+        inputs = {"summary": summary or "(none)", "turns": transcript}
+        return (await gateway.call(lambda: chain.ainvoke(inputs), "chat_summary")).strip()
+
+    def _chat_messages(self, chat_history: list, user_input: str, context: str, summary: str = ""):
         system_msg = f"""You are a helpful medical assistant. 
         Context from Patient's Lab Report:
         {context}
         
         Answer the user's question based on this report. Be helpful, empathetic, but clear that you are an AI."""
+        if summary:
+            system_msg += f"\n\nSummary of the earlier conversation:\n{summary}"
         
         messages = [("system", system_msg)]
         for msg in chat_history:
@@ -72,32 +481,33 @@ class ClinicalChain:
             messages.append((role, msg['content']))
         
         messages.append(("human", user_input))
-        
-        response = self.llm.invoke(messages)
-        return response.content
+        return messages
 
     def run_analysis(self, text: str):
-        # 1. Extraction
-        entities = self.extract_entities(text)
-        
+        """
+        arun_analysis for synchronous callers (not from a running event loop).
+        """
+        return asyncio.run(self.arun_analysis(text))
+
+    async def arun_analysis(self, text: str):
+        """
+        Extraction, then explanation and medications; never blocks the event loop on the LLM.
+        """
+        entities = await self.aextract_entities(text)
         if not entities:
-            return {
-                "entities": [],
-                "summary": "No measurable data found.",
-                "explanation": "The AI could not identify standard lab tests in this document.",
-                "medication_suggestions": [],
-                "follow_up_suggestions": [],
-                "disclaimer": ""
-            }
-
-        # 2. Explanation & Medications
-        explanation_data = self.generate_explanation(entities)
-        
+            return empty_analysis()
+
+        explanation_data = await self.agenerate_explanation(entities)
+        return self.build_analysis(entities, explanation_data)
+
+    @staticmethod
+    def build_analysis(entities, explanation_data):
         return {
             "entities": entities,
             "summary": f"Analyzed {len(entities)} tests.",
             "explanation": explanation_data.get("explanation", ""),
             "medication_suggestions": explanation_data.get("medication_suggestions", []),
             "follow_up_suggestions": explanation_data.get("follow_up_suggestions", ["Consult a doctor."]),
-            "disclaimer": "DISCLAIMER: AI-generated suggestions. Consult a physician before taking any medication."
+            "disclaimer": "DISCLAIMER: AI-generated suggestions. Consult a physician before taking any medication.",
+            "degraded": bool(explanation_data.get("degraded")),
         }
@@ -0,0 +1,163 @@
+import re
+from collections import Counter
+from typing import Dict, List, Tuple
+
+from backend.rag.chunking import is_section_boundary
+from backend.rag.lab_parser import KNOWN_TESTS, KNOWN_UNITS, NOISE_FLOOR, is_prose, parse_line
+from backend.rag.tokens import count_tokens
+
+# Bumped whenever the rules change, so cached extractions of compacted text are invalidated.
+COMPACTION_VERSION = "2"
+
+# Lines this close to a page break are where letterheads and footers repeat.
+PAGE_EDGE_LINES = 3
+
+_SPACES = re.compile(r"[ \t ]+")
+_DIGIT = re.compile(r"\d")
+_WORD = re.compile(r"\S+")
+_PAGE_MARKER = re.compile(r"^(page\s*\d+(\s*(of|/)\s*\d+)?|\d+\s*(of|/)\s*\d+|-\s*\d+\s*-)$", re.IGNORECASE)
+_QUALITATIVE = re.compile(
+    r"\b(positive|negative|reactive|non-reactive|detected|not detected|absent|present|nil|trace)\b", re.IGNORECASE
+)
+_VALUE_START = re.compile(
+    r"^([<>]=?\s?)?\d|^(positive|negative|reactive|non-reactive|detected|not detected|absent|present|nil|trace)\b", re.IGNORECASE
+)
+_TOKEN = re.compile(r"[a-z0-9µμ%/^*.\-]+")
+
+# Lines that never carry results: letterhead contact details, patient and
+# sample demographics, signature blocks and legal / interpretive boilerplate.
+_BOILERPLATE = re.compile(
+    r"\[REDACTED_(PHONE|EMAIL|ADDRESS)\]|www\.|https?://|@"
+    r"|\b(tel|phone|fax|mobile|e-?mail|helpline|toll[- ]free|customer care)\b"
+    r"|^(patient|pt\.?|name|age|sex|gender|dob|mrn|uhid|ref(erred)?\.?\s*(by|dr)|physician|doctor|"
+    r"collected|collection|received|reported|registered|printed|sample\s*(id|no|type)|specimen|accession|"
+    r"barcode|lab\s*(no|id)|report\s*(date|status|id)|visit|client|location|branch)\b[^:]{0,20}:"
+    r"|\b(electronically (signed|verified)|verified by|approved by|authori[sz]ed (by|signatory)|signature|"
+    r"pathologist|biochemist|technologist|m\.?b\.?b\.?s|m\.?d\.?\s*\(|dr\.\s)"
+    r"|\b(end of report|this report|not valid for|medico[- ]?legal|confidential|disclaimer|"
+    r"clinical(ly)? correlat|correlate clinically|results? relates? only|for (professional|informational) use|"
+    r"accredited|accreditation|nabl|iso\s*\d{4}|clia|all rights reserved|terms (and|&) conditions|"
+    r"generated (on|by)|please consult|kindly consult)",
+    re.IGNORECASE,
+)
+
+# Words of test names and units; plus urinalysis / serology terms the panel vocabulary lacks.
+_RESULT_TOKENS = (
+    set(KNOWN_UNITS)
+    | {word for test in KNOWN_TESTS for word in test.split() if len(word) > 2}
+    | {"colour", "color", "appearance", "clarity", "gravity", "ph", "ketones", "nitrite", "leukocytes",
+       "epithelial", "casts", "crystals", "bacteria", "pus", "antigen", "antibody", "culture"}
+)
+
+
+def _normalize(line: str) -> str:
+    return _SPACES.sub(" ", line).strip()
+
+
+def _is_result_row(line: str) -> bool:
+    entity = parse_line(line)
+    return entity is not None and entity["confidence"] >= NOISE_FLOOR
+
+
+def is_boilerplate(line: str) -> bool:
+    """
+    Page markers, letterhead, demographics, signatures, legal text and prose: never a result.
+    """
+    line = _normalize(line)
+    return bool(_PAGE_MARKER.match(line) or _BOILERPLATE.search(line) or is_prose(line))
+
+
+def _mentions_lab_terms(line: str) -> bool:
+    return any(token in _RESULT_TOKENS for token in _TOKEN.findall(line.lower()))
+
+
+def _classify(line: str) -> str:
+    """
+    "result", "heading", "maybe" (might carry a result in an unusual layout),
+    "label" (kept only if the next line holds its value) or "drop".
+    """
+    if _PAGE_MARKER.match(line):
+        return "drop"
+    if _is_result_row(line):
+        return "result"
+    if _BOILERPLATE.search(line) or is_prose(line):
+        return "drop"
+    if is_section_boundary(line):
+        return "heading"
+    if _DIGIT.search(line) or _QUALITATIVE.search(line) or _mentions_lab_terms(line):
+        return "maybe"
+    return "label" if len(_WORD.findall(line)) <= 6 else "drop"
+
+
+def _pages(text: str) -> List[List[str]]:
+    # Non-empty, whitespace-collapsed lines per page; pages end at a form feed or a page marker.
+    pages: List[List[str]] = [[]]
+    for raw in text.replace("\f", "\n\f\n").splitlines():
+        line = _normalize(raw)
+        if raw == "\f" or _PAGE_MARKER.match(line):
+            pages.append([])
+        elif line:
+            pages[-1].append(line)
+    return [page for page in pages if page]
+
+
+def compact_report(text: str, min_repeats: int = 2) -> Tuple[str, Dict[str, int]]:
+    """
+    Shrinks report text for the extraction prompt without losing result rows.
+    Whitespace runs and blank lines collapse; page headers and footers (lines
+    repeated `min_repeats` or more times that sit in a block of repeated lines
+    or within PAGE_EDGE_LINES of a page break) are dropped, except result rows
+    and headings, which keep their first occurrence; letterhead, demographics,
+    signatures, legal text and prose go; of the rest, only lines with a digit,
+    a qualitative result or a lab test/unit word stay, plus short labels whose
+    value is on the next line (test name and result split by OCR or layout),
+    and those values, however often the same value recurs.
+    Returns (compacted text, stats with token counts before and after).
+    """
+    pages = _pages(text)
+    lines = [line for page in pages for line in page]
+    edge = [i < PAGE_EDGE_LINES or i >= len(page) - PAGE_EDGE_LINES for page in pages for i in range(len(page))]
+    kinds = [_classify(line) for line in lines]
+    for idx, kind in enumerate(kinds):
+        # A name line ("Glucose") whose value ("Negative", "250") is alone on the next line.
+        if kind in ("label", "maybe", "heading") and not _VALUE_START.match(lines[idx]):
+            following = idx + 1 < len(lines) and kinds[idx + 1] == "maybe" and _VALUE_START.match(lines[idx + 1])
+            if following:
+                kinds[idx] = kinds[idx + 1] = "pair"
+            elif kind == "label":
+                kinds[idx] = "drop"
+    counts = Counter(lines)
+    repeated = [counts[line] >= min_repeats and kind != "pair" for line, kind in zip(lines, kinds)]
+
+    kept: List[str] = []
+    seen = set()
+    dropped = Counter()
+    for idx, (line, kind) in enumerate(zip(lines, kinds)):
+        if kind == "drop":
+            dropped["boilerplate"] += 1
+            continue
+        if repeated[idx]:
+            if kind == "maybe":
+                in_block = (idx > 0 and repeated[idx - 1]) or (idx + 1 < len(lines) and repeated[idx + 1])
+                if in_block or edge[idx]:
+                    dropped["repeated"] += 1
+                    continue
+            elif line in seen:
+                dropped["repeated"] += 1
+                continue
+            seen.add(line)
+        kept.append(line)
+
+    compacted = "\n".join(kept)
+    if not compacted and lines:
+        # Nothing looked like lab content; let the model see the (whitespace-collapsed) text rather than nothing.
+        compacted = "\n".join(lines)
+    stats = {
+        "tokens_before": count_tokens(text),
+        "tokens_after": count_tokens(compacted),
+        "lines_before": len(lines),
+        "lines_after": len(kept),
+        "repeated_dropped": dropped["repeated"],
+        "boilerplate_dropped": dropped["boilerplate"],
+    }
+    return compacted, stats
@@ -0,0 +1,208 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from backend.rag.test_names import canonical_test_id
+
+NAN = float("nan")
+# Bumped whenever parsing or DEFAULT_RANGES change: cached analyses carry the flags.
+FLAGGING_VERSION = "2"
+
+_NUMBER = r"-?(?:\d+(?:,\d{3})*(?:\.\d+)?|\.\d+)"
+_VALUE = re.compile(r"^\s*(?P<op><=|>=|<|>|≤|≥)?\s*(?P<num>" + _NUMBER + r")")
+_RANGE_BETWEEN = re.compile(r"(?P<lo>" + _NUMBER + r")\s*(?:-|–|—|to)\s*(?P<hi>" + _NUMBER + r")\s*(?P<unit>[^\d\s].*)?$", re.IGNORECASE)
+_RANGE_BOUND = re.compile(r"^\s*(?P<op><=|>=|<|>|≤|≥|up to|below|above|less than|greater than)\s*(?P<num>" + _NUMBER + r")\s*(?P<unit>[^\d\s].*)?$", re.IGNORECASE)
+# A second range or bound after the first ("70-99 fasting; 100-125 impaired"), or a
+# sex/age qualifier ("M: 13.5-17.5 F: 12.0-15.5"): which part applies is unknown.
+_ANOTHER_RANGE = re.compile(r"(?:" + _NUMBER + r")\s*(?:-|–|—|to)\s*(?:" + _NUMBER + r")|(?:<|>|≤|≥)\s*(?:" + _NUMBER + r")", re.IGNORECASE)
+_QUALIFIER = re.compile(
+    r"\b(?:m|f|male|female|men|women|adults?|child(?:ren)?|infants?|newborns?|neonates?|pregnan\w*|"
+    r"elderly|age[ds]?|y|yrs?|years?|months?|weeks?|days?)\b",
+    re.IGNORECASE,
+)
+
+_UPPER_OPS = {"<": False, "<=": True, "≤": True, "up to": True, "below": False, "less than": False}
+_LOWER_OPS = {">": False, ">=": True, "≥": True, "above": False, "greater than": False}
+
+_FLAG_ALIASES = {
+    "h": "High", "hh": "High", "high": "High", "↑": "High",
+    "l": "Low", "ll": "Low", "low": "Low", "↓": "Low",
+    "n": "Normal", "normal": "Normal",
+}
+
+# Analyte -> (canonical unit, adult reference low, high). Used only when the
+# report prints no range for the row.
+DEFAULT_RANGES: Dict[str, Tuple[str, float, float]] = {
+    "hemoglobin": ("g/dl", 12.0, 17.5),
+    "wbc": ("10^3/ul", 4.0, 11.0),
+    "platelets": ("10^3/ul", 150.0, 450.0),
+    "glucose": ("mg/dl", 70.0, 99.0),
+    "postprandial glucose": ("mg/dl", NAN, 140.0),
+    "total cholesterol": ("mg/dl", NAN, 200.0),
+    "ldl cholesterol": ("mg/dl", NAN, 100.0),
+    "hdl cholesterol": ("mg/dl", 40.0, NAN),
+    "triglycerides": ("mg/dl", NAN, 150.0),
+    "creatinine": ("mg/dl", 0.59, 1.35),
+    "bun": ("mg/dl", 6.0, 24.0),
+    "sodium": ("mmol/l", 135.0, 145.0),
+    "potassium": ("mmol/l", 3.5, 5.0),
+    "tsh": ("miu/l", 0.4, 4.0),
+    "hba1c": ("%", 4.0, 5.6),
+}
+
+# (analyte or "*", from unit, to unit) -> multiplier. "*" rows apply to any analyte.
+_CONVERSIONS: Dict[Tuple[str, str, str], float] = {
+    ("*", "g/l", "g/dl"): 0.1,
+    ("*", "mg/l", "mg/dl"): 0.1,
+    ("*", "meq/l", "mmol/l"): 1.0,
+    ("*", "uiu/ml", "miu/l"): 1.0,
+    ("*", "k/ul", "10^3/ul"): 1.0,
+    ("*", "x10^3/ul", "10^3/ul"): 1.0,
+    ("*", "10^9/l", "10^3/ul"): 1.0,
+    ("*", "x10^9/l", "10^3/ul"): 1.0,
+    ("*", "/ul", "10^3/ul"): 0.001,
+    ("*", "cells/ul", "10^3/ul"): 0.001,
+    ("glucose", "mmol/l", "mg/dl"): 18.016,
+    ("postprandial glucose", "mmol/l", "mg/dl"): 18.016,
+    ("total cholesterol", "mmol/l", "mg/dl"): 38.67,
+    ("ldl cholesterol", "mmol/l", "mg/dl"): 38.67,
+    ("hdl cholesterol", "mmol/l", "mg/dl"): 38.67,
+    ("triglycerides", "mmol/l", "mg/dl"): 88.57,
+    ("creatinine", "umol/l", "mg/dl"): 1 / 88.42,
+    ("bun", "mmol/l", "mg/dl"): 2.801,
+}
+
+
+def _unit_key(unit: Optional[str]) -> str:
+    return (unit or "").strip().lower().replace(" ", "").replace("µ", "u").replace("μ", "u").replace("*", "^")
+
+
+def _build_factors() -> Dict[Tuple[str, str, str], float]:
+    factors = {}
+    for (analyte, src, dst), factor in _CONVERSIONS.items():
+        factors[(analyte, src, dst)] = factor
+        factors[(analyte, dst, src)] = 1 / factor
+    return factors
+
+
+_FACTORS = _build_factors()
+
+
+def canonical_analyte(test_name: Optional[str]) -> str:
+    """
+    Canonical test ID (the DEFAULT_RANGES / trends key) for a printed test name.
+    """
+    return canonical_test_id(test_name)
+
+
+def conversion_factor(analyte: str, from_unit: Optional[str], to_unit: Optional[str]) -> Optional[float]:
+    """
+    Multiplier taking a value in `from_unit` to `to_unit` (None if not convertible).
+    """
+    src, dst = _unit_key(from_unit), _unit_key(to_unit)
+    if src == dst:
+        return 1.0
+    return _FACTORS.get((analyte, src, dst)) or _FACTORS.get(("*", src, dst))
+
+
+def parse_value(value) -> float:
+    """
+    Numeric part of a result ("11.2", "<5", "1,200"); NaN for qualitative results.
+    """
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _VALUE.match(str(value or ""))
+    return float(match.group("num").replace(",", "")) if match else NAN
+
+
+def parse_range(reference_range) -> Optional[Tuple[float, float, bool, bool, Optional[str]]]:
+    """
+    Parses "13.5-17.5", "<200", ">= 60", "-2 to 2", "3.9 - 5.5 mmol/L" into
+    (low, high, low_inclusive, high_inclusive, unit). Open ends are NaN; a
+    missing range is all NaN. None when a range is printed but ambiguous:
+    several ranges, or ones qualified by sex or age.
+    """
+    text = str(reference_range or "").strip().strip("()[]")
+    if _QUALIFIER.search(text):
+        return None
+    match = _RANGE_BETWEEN.search(text)
+    if match:
+        unit = (match.group("unit") or "").strip() or None
+        if any(c.isdigit() for c in text[:match.start()]) or (unit and _ANOTHER_RANGE.search(unit)):
+            return None
+        return float(match.group("lo").replace(",", "")), float(match.group("hi").replace(",", "")), True, True, unit
+    match = _RANGE_BOUND.match(text)
+    if match:
+        op = match.group("op").lower()
+        number = float(match.group("num").replace(",", ""))
+        unit = (match.group("unit") or "").strip() or None
+        if unit and _ANOTHER_RANGE.search(unit):
+            return None
+        if op in _UPPER_OPS:
+            return NAN, number, True, _UPPER_OPS[op], unit
+        return number, NAN, _LOWER_OPS[op], True, unit
+    return NAN, NAN, True, True, None
+
+
+def flag_entities(entities: List[Dict]) -> List[Dict]:
+    """
+    Sets High/Low/Normal on every entity whose value and reference range are numeric.
+    Strings are parsed per entity; the comparisons run over the whole batch as
+    NumPy arrays. Entities that cannot be evaluated, including those with an
+    ambiguous printed range, keep their existing flag (normalized, e.g. "H" -> "High").
+    """
+    count = len(entities)
+    if not count:
+        return entities
+    values = np.full(count, NAN)
+    lows = np.full(count, NAN)
+    highs = np.full(count, NAN)
+    low_inclusive = np.ones(count, dtype=bool)
+    high_inclusive = np.ones(count, dtype=bool)
+
+    for idx, entity in enumerate(entities):
+        value = parse_value(entity.get("value"))
+        unit = entity.get("unit")
+        parsed = parse_range(entity.get("reference_range"))
+        if parsed is None:
+            continue
+        low, high, low_inc, high_inc, range_unit = parsed
+        analyte = entity.get("canonical_id") or canonical_analyte(entity.get("test_name"))
+
+        if np.isnan(low) and np.isnan(high):
+            default = DEFAULT_RANGES.get(analyte)
+            if default is None:
+                continue
+            range_unit, low, high = default
+            # Compare in the default range's unit; skip if the value can't be converted.
+            factor = conversion_factor(analyte, unit, range_unit) if unit else None
+            if factor is None:
+                continue
+            value *= factor
+        elif range_unit and unit:
+            factor = conversion_factor(analyte, range_unit, unit)
+            if factor is not None:
+                low, high = low * factor, high * factor
+
+        values[idx] = value
+        lows[idx] = low
+        highs[idx] = high
+        low_inclusive[idx] = low_inc
+        high_inclusive[idx] = high_inc
+
+    with np.errstate(invalid="ignore"):
+        below = np.where(low_inclusive, values < lows, values <= lows)
+        above = np.where(high_inclusive, values > highs, values >= highs)
+    evaluable = ~np.isnan(values) & ~(np.isnan(lows) & np.isnan(highs))
+    flags = np.where(above, "High", np.where(below, "Low", "Normal"))
+
+    flagged = []
+    for idx, entity in enumerate(entities):
+        entity = dict(entity)
+        if evaluable[idx]:
+            entity["flag"] = str(flags[idx])
+        elif entity.get("flag"):
+            entity["flag"] = _FLAG_ALIASES.get(str(entity["flag"]).strip().lower(), entity["flag"])
+        flagged.append(entity)
+    return flagged
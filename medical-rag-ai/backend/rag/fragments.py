@@ -0,0 +1,168 @@
+"""
+Explanation fragments: reusable per-(canonical test, flag) explanation text,
+follow-ups and treatment notes, precomputed offline and assembled locally at
+request time. Libraries are versioned JSON files in backend/knowledge.
+
+Build or extend a library in bulk with the configured model backend:
+
+    python -m backend.rag.fragments --version v2 --base v1 --tests "vitamin d" ferritin
+"""
+import argparse
+import asyncio
+import functools
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+from backend.config import settings
+from backend.rag.flagging import DEFAULT_RANGES, canonical_analyte
+
+FRAGMENTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "knowledge")
+FLAGS = ("High", "Low", "Normal")
+ABNORMAL_FLAGS = ("High", "Low", "Abnormal")
+CLOSING = "This is general information, not a diagnosis; please discuss these results with your doctor."
+
+
+def library_path(version: str) -> str:
+    return os.path.join(FRAGMENTS_DIR, f"explanation_fragments.{version}.json")
+
+
+@functools.lru_cache(maxsize=None)
+def load_library(version: str) -> Dict[Tuple[str, str], Dict]:
+    """
+    (canonical test, flag) -> fragment for one library version; empty if the file is missing.
+    """
+    try:
+        with open(library_path(version), "r") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        print(f"Warning: explanation fragment library {version!r} not found; explanations use the LLM only.")
+        return {}
+    return {(fragment["test"], fragment["flag"]): fragment for fragment in data["fragments"]}
+
+
+def get_library() -> Optional[Dict[Tuple[str, str], Dict]]:
+    if not settings.EXPLANATION_FRAGMENTS_ENABLED:
+        return None
+    return load_library(settings.EXPLANATION_FRAGMENTS_VERSION)
+
+
+def fragment_key(entity: Dict) -> Tuple[str, str]:
+    return entity.get("canonical_id") or canonical_analyte(entity.get("test_name")), str(entity.get("flag") or "")
+
+
+def split_entities(entities: List[Dict], library: Dict) -> Tuple[List[Tuple[Dict, Dict]], List[Dict]]:
+    """
+    ([(entity, fragment)] for entities the library covers, [entities it doesn't]).
+    """
+    known, unknown = [], []
+    for entity in entities:
+        fragment = library.get(fragment_key(entity))
+        if fragment is None:
+            unknown.append(entity)
+        else:
+            known.append((entity, fragment))
+    return known, unknown
+
+
+def abnormal(entities: List[Dict]) -> List[Dict]:
+    return [e for e in entities if e.get("flag") in ABNORMAL_FLAGS]
+
+
+def _result(entity: Dict) -> str:
+    value = f"{entity.get('value')} {entity.get('unit') or ''}".strip()
+    return f"{entity.get('test_name')} ({value}, {entity.get('flag')})" if entity.get("flag") else f"{entity.get('test_name')} ({value})"
+
+
+def findings_text(entities: List[Dict]) -> str:
+    return "\n".join(f"- {_result(entity)}" for entity in entities)
+
+
+def _unique(items):
+    seen = set()
+    return [item for item in items if not (item in seen or seen.add(item))]
+
+
+def assemble(known, unknown, unknown_explanation: Optional[Dict] = None, synthesis: Optional[str] = None) -> Dict:
+    """
+    The explanation response (same keys as the explanation prompt's) built from
+    library fragments, plus the LLM's text for tests the library doesn't cover
+    and an optional cross-test synthesis.
+    """
+    paragraphs = [synthesis] if synthesis else []
+    paragraphs += [f"{_result(entity)}: {fragment['explanation']}" for entity, fragment in known]
+    medications = [m for _, fragment in known for m in fragment.get("medication_suggestions", [])]
+    follow_ups = [f for _, fragment in known for f in fragment.get("follow_up_suggestions", [])]
+    if unknown_explanation:
+        paragraphs.append(unknown_explanation.get("explanation", ""))
+        medications += unknown_explanation.get("medication_suggestions", [])
+        follow_ups += unknown_explanation.get("follow_up_suggestions", [])
+    elif unknown:
+        paragraphs.append("Also ask your doctor about: " + ", ".join(_result(entity) for entity in unknown) + ".")
+    paragraphs.append(CLOSING)
+    return {
+        "explanation": "\n\n".join(p for p in paragraphs if p),
+        "medication_suggestions": _unique(medications),
+        "follow_up_suggestions": _unique(follow_ups),
+    }
+
+
+async def build_library(version: str, tests: List[str], base: Optional[str] = None) -> int:
+    """
+    Writes library `version`: the fragments of `base` (if given) plus one LLM-written
+    fragment per missing (test, flag) pair of `tests`. Returns the number generated.
+    """
+    # Deferred: langchain is slow to import.
+    from langchain_core.output_parsers import JsonOutputParser
+    from langchain_core.prompts import PromptTemplate
+    from backend.llm import gateway
+    from backend.llm.models import create_chat_model
+    from backend.rag.clinical_chain import load_prompt
+
+    fragments = dict(load_library(base)) if base else {}
+    chain = PromptTemplate.from_template(load_prompt("explanation_fragment")) | create_chat_model() | JsonOutputParser()
+    missing = [(test, flag) for test in tests for flag in FLAGS if (test, flag) not in fragments]
+    created = []
+
+    async def generate(test, flag):
+        try:
+            data = await gateway.call(lambda: chain.ainvoke({"test": test, "flag": flag}), "explanation_fragment")
+        except Exception as e:
+            print(f"Warning: no fragment for {test}/{flag}: {e!r}")
+            return
+        if isinstance(data, dict) and isinstance(data.get("explanation"), str):
+            fragments[(test, flag)] = {
+                "test": test,
+                "flag": flag,
+                "explanation": data["explanation"],
+                "medication_suggestions": list(data.get("medication_suggestions") or []),
+                "follow_up_suggestions": list(data.get("follow_up_suggestions") or []),
+            }
+            created.append((test, flag))
+
+    await asyncio.gather(*(generate(test, flag) for test, flag in missing))
+    payload = {
+        "version": version,
+        "source": f"{settings.LLM_BACKEND}:{settings.LLM_MODEL}" + (f" on {base}" if base else ""),
+        "fragments": [fragments[key] for key in sorted(fragments)],
+    }
+    with open(library_path(version), "w") as f:
+        json.dump(payload, f, indent=1, ensure_ascii=False)
+    load_library.cache_clear()
+    return len(created)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--version", required=True, help="library version to write")
+    parser.add_argument("--base", help="existing version to copy and extend")
+    parser.add_argument("--tests", nargs="*", default=[], help="extra test names (canonicalized); the flagging panel is always included")
+    args = parser.parse_args()
+
+    tests = sorted(set(DEFAULT_RANGES) | {canonical_analyte(t) for t in args.tests})
+    generated = asyncio.run(build_library(args.version, tests, args.base))
+    print(f"Wrote {library_path(args.version)}: {generated} new fragments")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+import re
+from typing import Dict, List, Tuple
+
+# One row of a tabular lab report:
+#   name  value  [flag]  [unit]  [range]  [flag]
+# Columns may be separated by tabs, runs of spaces (table layouts) or a single
+# space (pypdf text output collapses column padding).
+_FLAG = r"(?:HH|LL|H|L|High|Low|Normal|Abnormal|Critical|N|A)"
+
+_ROW_PATTERN = re.compile(
+    r"""^\s*[-*•]?\s*
+    (?P<name>[A-Za-z0-9(][A-Za-z0-9 ,()/%.'+\-]*?)\s*:?\s+
+    (?P<value>(?:[<>]=?\s?)?\d+(?:,\d{3})*(?:\.\d+)?|Positive|Negative|Reactive|Non-Reactive|Detected|Not\ Detected)
+    (?:\s+(?P<flag_pre>""" + _FLAG + r"""|\*)(?=\s|$))?
+    (?:\s+(?!""" + _FLAG + r"""(?:\s|$))(?P<unit>(?:x?10[\^*]\d+\s?/\s?)?[A-Za-zµμ%/][A-Za-z0-9µμ%/^.*]*(?:/[A-Za-z0-9.]+)?))?
+    (?:\s+[(\[]?(?:ref(?:erence)?\.?(?:\s*(?:range|interval))?\s*[:\-]?\s*)?(?P<range>[<>]=?\s?\d+(?:\.\d+)?|\d+(?:\.\d+)?\s?[-–]\s?\d+(?:\.\d+)?)[)\]]?)?
+    (?:\s+(?P<flag>""" + _FLAG + r"""|\*))?
+    \s*$""",
+    re.VERBOSE | re.IGNORECASE,
+)
+
+# Rows scoring below this are a name-like word and a number with a unit that
+# is no known unit, not uncertain results worth sending to the LLM.
+NOISE_FLOOR = 0.3
+
+# Lines that fit the row pattern but never hold a result: page markers
+# ("Page 2 of 3") and report / patient metadata ("Patient ID 558213").
+_PAGE_MARKER = re.compile(r"^\s*(page\s*\d+(\s*(of|/)\s*\d+)?|\d+\s*(of|/)\s*\d+|-\s*\d+\s*-)\s*$", re.IGNORECASE)
+_METADATA = re.compile(
+    r"^\s*(patient|name|age|sex|gender|dob|date of birth|mrn|uhid|phone|tel|mobile|fax|ref(erred)?\.?\s*(by|dr)|"
+    r"sample|specimen|accession|barcode|lab|report|visit|bill|invoice|order|collected|received|reported|"
+    r"registered|printed|date|time)(\s+(id|no\.?|number|name|type|date))?\s*(:|#|(?=\d))",
+    re.IGNORECASE,
+)
+_HAS_DIGIT = re.compile(r"\d")
+_QUALITATIVE = re.compile(r"\b(positive|negative|reactive|non-reactive|detected|not detected)\b", re.IGNORECASE)
+_VALUE_FIRST = re.compile(r"^\s*([<>]=?\s?\d|\d|(positive|negative|reactive|non-reactive|detected|not detected)\b)", re.IGNORECASE)
+
+_HAS_LETTER = re.compile(r"[A-Za-z]")
+_WHITESPACE = re.compile(r"\s+")
+
+_FLAG_NAMES = {
+    "h": "High",
+    "hh": "High",
+    "high": "High",
+    "l": "Low",
+    "ll": "Low",
+    "low": "Low",
+    "n": "Normal",
+    "normal": "Normal",
+    "a": "Abnormal",
+    "abnormal": "Abnormal",
+    "*": "Abnormal",
+    "critical": "Critical",
+}
+
+# Units printed on standard CBC / CMP / lipid / thyroid panels (lowercased).
+KNOWN_UNITS = {
+    "%", "g/dl", "g/l", "mg/dl", "mg/l", "mmol/l", "umol/l", "µmol/l", "μmol/l",
+    "meq/l", "u/l", "iu/l", "miu/l", "uiu/ml", "µiu/ml", "μiu/ml", "miu/ml",
+    "ng/dl", "ng/ml", "pg/ml", "pmol/l", "nmol/l", "fl", "pg", "mm/hr", "sec",
+    "cells/ul", "cells/mcl", "/ul", "/hpf", "ml/min/1.73m2", "ratio", "k/ul",
+    "m/ul", "mil/ul", "thou/ul", "x10^3/ul", "x10^6/ul", "10^3/ul", "10^6/ul",
+    "x10^9/l", "x10^12/l", "10^9/l", "10^12/l", "10*3/ul", "10*6/ul", "lakhs/cumm",
+    "/cumm", "cumm", "mcg/dl", "ug/dl", "µg/dl", "mg/g", "g/24h",
+}
+
+# Analytes found on standard CBC / CMP / lipid / thyroid panels (lowercased).
+KNOWN_TESTS = {
+    # CBC
+    "hemoglobin", "haemoglobin", "hb", "hgb", "hematocrit", "hct", "pcv",
+    "rbc", "rbc count", "red blood cell count", "wbc", "wbc count",
+    "white blood cell count", "total leucocyte count", "tlc", "platelets",
+    "platelet count", "plt", "mcv", "mch", "mchc", "rdw", "rdw-cv", "mpv",
+    "neutrophils", "lymphocytes", "monocytes", "eosinophils", "basophils",
+    "absolute neutrophil count", "esr",
+    # CMP
+    "glucose", "fasting glucose", "glucose, fasting", "fasting blood sugar",
+    "bun", "blood urea nitrogen", "urea", "creatinine", "egfr", "sodium",
+    "potassium", "chloride", "co2", "bicarbonate", "carbon dioxide", "calcium",
+    "total protein", "protein, total", "albumin", "globulin", "a/g ratio",
+    "bilirubin", "total bilirubin", "bilirubin, total", "direct bilirubin",
+    "alkaline phosphatase", "alp", "ast", "sgot", "alt", "sgpt", "ggt",
+    "uric acid", "hba1c", "hemoglobin a1c",
+    # Lipid
+    "total cholesterol", "cholesterol", "cholesterol, total", "triglycerides",
+    "hdl", "hdl cholesterol", "ldl", "ldl cholesterol", "vldl",
+    "vldl cholesterol", "non-hdl cholesterol", "chol/hdl ratio",
+    # Thyroid
+    "tsh", "t3", "t4", "free t3", "free t4", "ft3", "ft4", "t3, total",
+    "t4, total", "total t3", "total t4",
+    # Common add-ons
+    "vitamin d", "25-oh vitamin d", "vitamin b12", "ferritin", "iron", "tibc",
+}
+
+
+def _normalize_name(name: str) -> str:
+    return _WHITESPACE.sub(" ", name).strip(" :-").lower()
+
+
+def _is_metadata(line: str) -> bool:
+    return bool(_PAGE_MARKER.match(line) or _METADATA.match(line))
+
+
+def is_prose(line: str) -> bool:
+    """
+    Sentences (disclaimers, interpretive notes): ten or more words, few of them numbers.
+    """
+    words = line.split()
+    if len(words) < 10:
+        return False
+    return sum(1 for word in words if _HAS_DIGIT.search(word)) / len(words) < 0.25
+
+
+def _score(name: str, unit: str, reference_range: str, flag: str) -> float:
+    score = 0.4
+    if unit:
+        score += 0.2 if unit.lower().replace(" ", "") in KNOWN_UNITS or "/" in unit else -0.2
+    if reference_range:
+        score += 0.2
+    if _normalize_name(name) in KNOWN_TESTS:
+        score += 0.2
+    if flag:
+        score += 0.1
+    return round(max(0.0, min(score, 1.0)), 2)
+
+
+def parse_line(line: str):
+    """
+    Parses a single report line into a LabEntity dict with a confidence score.
+    Returns None if the line does not look like a result row.
+    """
+    if _is_metadata(line):
+        return None
+    match = _ROW_PATTERN.match(line)
+    if not match:
+        return None
+
+    name = _WHITESPACE.sub(" ", match.group("name")).strip(" :-")
+    if not _HAS_LETTER.search(name):
+        return None
+
+    value = match.group("value").replace(" ", "")
+    unit = match.group("unit") or ""
+    reference_range = (match.group("range") or "").replace(" ", "").replace("–", "-")
+    raw_flag = match.group("flag") or match.group("flag_pre") or ""
+    flag = _FLAG_NAMES.get(raw_flag.lower(), "")
+
+    return {
+        "test_name": name,
+        "value": value,
+        "unit": unit or None,
+        "reference_range": reference_range or None,
+        "flag": flag or None,
+        "confidence": _score(name, unit, reference_range, flag),
+    }
+
+
+def parse_lab_text(text: str, min_confidence: float = 0.7) -> Tuple[List[Dict], List[str]]:
+    """
+    Rule-based extraction of lab rows from report text.
+    Returns (entities, low_confidence_lines): entities at or above `min_confidence`,
+    plus the raw lines that looked like rows but scored below it, and lines the
+    row pattern can't read that still carry a number or a qualitative result
+    (layouts it doesn't know must reach the LLM, not be dropped).
+    """
+    entities = []
+    uncertain = []
+    previous = ""
+    for line in text.splitlines():
+        if not line.strip() or _is_metadata(line):
+            continue
+        entity = parse_line(line)
+        if entity is None:
+            if (_HAS_DIGIT.search(line) or _QUALITATIVE.search(line)) and not is_prose(line):
+                # A bare value is only readable with the name printed on the line above it.
+                if _VALUE_FIRST.match(line) and previous and (not uncertain or uncertain[-1] != previous):
+                    uncertain.append(previous)
+                uncertain.append(line.strip())
+        elif entity["confidence"] >= min_confidence:
+            entities.append(entity)
+        elif entity["confidence"] >= NOISE_FLOOR:
+            uncertain.append(line.strip())
+        previous = line.strip()
+    return entities, uncertain
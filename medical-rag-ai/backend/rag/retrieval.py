@@ -0,0 +1,316 @@
+import hashlib
+import json
+import os
+import pickle
+import re
+import sys
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from backend.config import settings
+from backend.rag.tokens import count_tokens, truncate_to_tokens
+
+INDEX_FILE = "index.faiss"
+DOCSTORE_FILE = "index.pkl"
+MANIFEST_FILE = "manifest.json"
+KB_EXTENSIONS = (".md", ".txt")
+PASSAGE_CHARS = 1000
+
+_SEGMENT_SPLIT = re.compile(r"(?<=[.!?;])\s+|,\s+(?=[A-Z])")
+
+
+class _LRU:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: np.ndarray) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+
+class KnowledgeRetriever:
+    """
+    Retrieval over the shipped FAISS knowledge base and the current report.
+    The index is memory-mapped on first use (the LangChain FAISS layout:
+    index.faiss + index.pkl), and query/report-line embeddings are cached.
+    """
+
+    def __init__(self, index_path: Optional[str] = None, embeddings=None):
+        self.index_path = index_path or settings.VECTOR_DB_PATH
+        self._embeddings = embeddings
+        self._index = None
+        self._docstore = None
+        self._id_map: Dict[int, str] = {}
+        self._load_lock = threading.Lock()
+        self._vectors = _LRU(settings.EMBEDDING_CACHE_SIZE)
+
+    @property
+    def embeddings(self):
+        if self._embeddings is None:
+            # Deferred: pulls in sentence-transformers/torch.
+            from langchain_huggingface import HuggingFaceEmbeddings
+            self._embeddings = HuggingFaceEmbeddings(model_name=settings.EMBEDDING_MODEL)
+        return self._embeddings
+
+    def _ensure_loaded(self) -> None:
+        if self._index is not None:
+            return
+        with self._load_lock:
+            if self._index is not None:
+                return
+            import faiss
+            index_file = os.path.join(self.index_path, INDEX_FILE)
+            try:
+                index = faiss.read_index(index_file, faiss.IO_FLAG_MMAP)
+            except RuntimeError:
+                # Not every index type supports mmap; fall back to a regular read.
+                index = faiss.read_index(index_file)
+            with open(os.path.join(self.index_path, DOCSTORE_FILE), "rb") as f:
+                self._docstore, self._id_map = pickle.load(f)
+            self._index = index
+            print(f"Knowledge base loaded: {index.ntotal} passages from {self.index_path}")
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        Embeds texts, serving repeats from the in-process cache.
+        """
+        vectors: List[Optional[np.ndarray]] = [self._vectors.get(text) for text in texts]
+        missing = [idx for idx, vector in enumerate(vectors) if vector is None]
+        if missing:
+            fresh = self.embeddings.embed_documents([texts[idx] for idx in missing])
+            for idx, vector in zip(missing, fresh):
+                vectors[idx] = np.asarray(vector, dtype="float32")
+                self._vectors.put(texts[idx], vectors[idx])
+        if not vectors:
+            return np.zeros((0, 0), dtype="float32")
+        return np.vstack(vectors)
+
+    def search_knowledge(self, query: str, k: int) -> List[str]:
+        self._ensure_loaded()
+        if k <= 0 or self._index.ntotal == 0:
+            return []
+        _, ids = self._index.search(self.embed([query]), min(k, self._index.ntotal))
+        passages = []
+        for idx in ids[0]:
+            if idx < 0:
+                continue
+            doc = self._docstore.search(self._id_map[int(idx)])
+            if doc is not None and not isinstance(doc, str):
+                passages.append(doc.page_content)
+        return passages
+
+    def search_report(self, query: str, report: str, k: int) -> List[str]:
+        segments = report_segments(report)
+        if len(segments) <= k:
+            return segments
+        vectors = self.embed(segments)
+        query_vector = self.embed([query])[0]
+        norms = np.linalg.norm(vectors, axis=1) * (np.linalg.norm(query_vector) or 1.0)
+        scores = vectors @ query_vector / np.where(norms == 0, 1.0, norms)
+        top = sorted(np.argsort(-scores)[:k])  # keep report order for readability
+        return [segments[idx] for idx in top]
+
+    def build_context(self, question: str, report: str, token_budget: int) -> str:
+        """
+        Chat context bounded to `token_budget` tokens: the report lines and
+        knowledge-base passages most relevant to `question`.
+        """
+        findings = self.search_report(question, report, settings.RETRIEVAL_TOP_K_REPORT)
+        passages = self.search_knowledge(question, settings.RETRIEVAL_TOP_K_KB)
+
+        # Report findings take priority; reference material gets what is left.
+        parts = []
+        remaining = token_budget
+        for header, items in (("Relevant findings from the report:", findings), ("Reference material:", passages)):
+            lines = []
+            for item in items:
+                if remaining <= 0:
+                    break
+                item = truncate_to_tokens(item.strip(), remaining)
+                lines.append(f"- {item}")
+                remaining -= count_tokens(item) + 2
+            if lines:
+                parts.append(header + "\n" + "\n".join(lines))
+        return "\n\n".join(parts)
+
+
+def report_segments(report: str) -> List[str]:
+    """
+    Splits chat context into retrievable units: lines, with long lines
+    (explanations, comma-joined findings) split further into sentences/items.
+    """
+    segments = []
+    for line in report.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if len(line) <= 200:
+            segments.append(line)
+        else:
+            segments.extend(part.strip() for part in _SEGMENT_SPLIT.split(line) if part.strip())
+    return segments
+
+
+_retriever: Optional[KnowledgeRetriever] = None
+_retriever_failed = False
+_retriever_lock = threading.Lock()
+
+
+def get_retriever() -> Optional[KnowledgeRetriever]:
+    """
+    Process-wide retriever, or None if retrieval is disabled or the index is missing.
+    """
+    global _retriever
+    if not settings.RETRIEVAL_ENABLED or _retriever_failed:
+        return None
+    with _retriever_lock:
+        if _retriever is None:
+            if not os.path.exists(os.path.join(settings.VECTOR_DB_PATH, INDEX_FILE)):
+                return None
+            _retriever = KnowledgeRetriever()
+        return _retriever
+
+
+def disable_retriever(reason: Exception) -> None:
+    """
+    Called when the retriever cannot load (missing faiss/embedding deps); chat
+    falls back to a truncated report context for the rest of the process.
+    """
+    global _retriever_failed
+    print(f"Warning: knowledge retrieval disabled: {reason!r}")
+    _retriever_failed = True
+
+
+def build_chat_context(question: str, report: str, token_budget: int) -> str:
+    retriever = get_retriever()
+    if retriever is not None:
+        try:
+            return retriever.build_context(question, report, token_budget)
+        except Exception as e:
+            disable_retriever(e)
+    return truncate_to_tokens(report, token_budget)
+
+
+# --- Offline index build --------------------------------------------------
+
+def split_passages(text: str, max_chars: int = PASSAGE_CHARS) -> List[str]:
+    passages: List[str] = []
+    current = ""
+    for block in re.split(r"\n\s*\n", text):
+        block = block.strip()
+        if not block:
+            continue
+        if current and len(current) + len(block) + 2 > max_chars:
+            passages.append(current)
+            current = ""
+        current = f"{current}\n\n{block}" if current else block
+    if current:
+        passages.append(current)
+    return passages
+
+
+def build_index(kb_dir: Optional[str] = None, index_path: Optional[str] = None, embeddings=None) -> Tuple[int, int]:
+    """
+    Incrementally (re)builds the FAISS index from the files in `kb_dir`.
+    Only new or changed files are embedded; vectors for unchanged files are
+    reused from the existing index and deleted files are dropped. Passages not
+    tracked by the manifest (e.g. the originally shipped index) are kept.
+    Returns (passages_embedded, total_passages).
+    """
+    import faiss
+    from langchain_core.documents import Document
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+
+    kb_dir = kb_dir or settings.KNOWLEDGE_BASE_DIR
+    index_path = index_path or settings.VECTOR_DB_PATH
+    retriever = KnowledgeRetriever(index_path, embeddings)
+    manifest_path = os.path.join(index_path, MANIFEST_FILE)
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+    # Existing passages: doc id -> (Document, vector)
+    existing: Dict[str, Tuple[object, np.ndarray]] = {}
+    if os.path.exists(os.path.join(index_path, INDEX_FILE)):
+        old_index = faiss.read_index(os.path.join(index_path, INDEX_FILE))
+        with open(os.path.join(index_path, DOCSTORE_FILE), "rb") as f:
+            old_docstore, old_id_map = pickle.load(f)
+        vectors = old_index.reconstruct_n(0, old_index.ntotal)
+        for position, doc_id in old_id_map.items():
+            existing[doc_id] = (old_docstore.search(doc_id), vectors[position])
+
+    files = {}
+    for root, _, names in os.walk(kb_dir):
+        for name in sorted(names):
+            if name.endswith(KB_EXTENSIONS):
+                path = os.path.join(root, name)
+                with open(path, "r", encoding="utf-8") as f:
+                    files[os.path.relpath(path, kb_dir)] = f.read()
+
+    new_manifest = {}
+    to_embed: List[Tuple[str, object]] = []
+    for source, text in files.items():
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        previous = manifest.get(source)
+        if previous and previous["sha256"] == digest and all(doc_id in existing for doc_id in previous["ids"]):
+            new_manifest[source] = previous
+            continue
+        ids = []
+        for passage in split_passages(text):
+            doc_id = str(uuid.uuid4())
+            ids.append(doc_id)
+            to_embed.append((doc_id, Document(page_content=passage, metadata={"source": source})))
+        new_manifest[source] = {"sha256": digest, "ids": ids}
+
+    # Drop passages from files that changed or disappeared.
+    for source, entry in manifest.items():
+        if new_manifest.get(source) is not entry:
+            for doc_id in entry["ids"]:
+                existing.pop(doc_id, None)
+
+    if to_embed:
+        fresh = retriever.embeddings.embed_documents([doc.page_content for _, doc in to_embed])
+        for (doc_id, doc), vector in zip(to_embed, fresh):
+            existing[doc_id] = (doc, np.asarray(vector, dtype="float32"))
+
+    if not existing:
+        raise ValueError(f"No passages to index (looked in {kb_dir}).")
+    doc_ids = list(existing)
+    matrix = np.vstack([existing[doc_id][1] for doc_id in doc_ids]).astype("float32")
+    index = faiss.IndexFlatL2(matrix.shape[1])
+    index.add(matrix)
+
+    os.makedirs(index_path, exist_ok=True)
+    faiss.write_index(index, os.path.join(index_path, INDEX_FILE))
+    docstore = InMemoryDocstore({doc_id: existing[doc_id][0] for doc_id in doc_ids})
+    with open(os.path.join(index_path, DOCSTORE_FILE), "wb") as f:
+        pickle.dump((docstore, dict(enumerate(doc_ids))), f)
+    with open(manifest_path, "w") as f:
+        json.dump(new_manifest, f, indent=2)
+    return len(to_embed), len(doc_ids)
+
+
+if __name__ == "__main__":
+    # python -m backend.rag.retrieval build [KB_DIR] [INDEX_PATH]
+    if len(sys.argv) < 2 or sys.argv[1] != "build":
+        print("usage: python -m backend.rag.retrieval build [KB_DIR] [INDEX_PATH]")
+        sys.exit(2)
+    embedded, total = build_index(*sys.argv[2:4])
+    print(f"Embedded {embedded} new passages; index now holds {total}.")
@@ -0,0 +1,394 @@
+"""
+Test-name canonicalization: maps however a lab printed a test ("Hb", "HGB",
+"Haemoglobin", "Hemoglobin (Hb)", OCR's "Hemog1obin") to one canonical ID from
+a curated vocabulary (backend/knowledge/test_vocabulary.json).
+
+Lookup tiers, cheapest first: exact alias, alias without parentheticals or a
+blood specimen prefix ("Serum ..."), alias with OCR look-alike characters folded
+(0/o, 1/l, 5/s), trigram-filtered edit-distance match that keeps the name's
+words (each at most misspelled, none added, dropped or exchanged for another
+vocabulary word), and optionally the nearest alias by EMBEDDING_MODEL similarity.
+"""
+import functools
+import hashlib
+import json
+import os
+import re
+import threading
+from dataclasses import dataclass
+from itertools import chain
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from backend.config import settings
+
+VOCABULARY_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "knowledge", "test_vocabulary.json")
+
+_PARENTHETICAL = re.compile(r"\s*[(\[].*?[)\]]\s*")
+_NON_ALNUM = re.compile(r"[^0-9a-zµμ]+")
+_DIGITS = re.compile(r"\d+")
+_SPECIMEN = re.compile(r"^(serum|plasma|blood|whole blood|s\.|sr\.|p\.)\s*", re.IGNORECASE)
+# Other specimens make a different test: "Protein (Urine)" is not serum "Protein",
+# so parentheticals naming one are kept.
+_OTHER_SPECIMEN = re.compile(
+    r"\b(?:urine|urinary|csf|cerebrospinal|fluid|synovial|pleural|ascitic|peritoneal|stool|fecal|faecal|sputum|semen)\b",
+    re.IGNORECASE,
+)
+_OCR_FOLD = str.maketrans({"0": "o", "1": "l", "5": "s", "µ": "u", "μ": "u"})
+
+
+@dataclass(frozen=True)
+class TestMatch:
+    test_id: str
+    name: str
+    loinc: Optional[str]
+    method: str  # exact | normalized (parentheticals or specimen prefix removed) | folded | fuzzy | embedding
+    score: float  # 1.0 for exact/normalized/folded; 1 - edits/length for fuzzy; cosine similarity for embedding
+
+
+def squash(name: str) -> str:
+    """
+    Case-, spacing- and punctuation-free key: "Glucose, Fasting" -> "glucosefasting".
+    """
+    return _NON_ALNUM.sub("", name.lower())
+
+
+def normalize_name(name: Optional[str]) -> str:
+    """
+    Readable fallback key for names the vocabulary doesn't know (lowercase,
+    parentheticals removed unless they name a specimen), as the results store
+    has always grouped them.
+    """
+    return re.sub(r"\s+", " ", _PARENTHETICAL.sub(_drop_parenthetical, name or "")).strip().lower()
+
+
+def _drop_parenthetical(match: "re.Match") -> str:
+    return match.group(0) if _OTHER_SPECIMEN.search(match.group(0)) else " "
+
+
+def _fold(key: str) -> str:
+    return key.translate(_OCR_FOLD)
+
+
+def _tokens(name: str) -> Tuple[str, ...]:
+    return tuple(_fold(token) for token in _NON_ALNUM.split(name.lower()) if token)
+
+
+def _trigrams(key: str) -> List[str]:
+    padded = f"#{key}#"
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+def max_edits(length: int) -> int:
+    # Short names (HDL/LDL, T3/T4, K/Na) are one edit apart from each other; never fuzzy-match them.
+    if length <= 4:
+        return 0
+    if length <= 7:
+        return min(1, settings.TEST_NAME_FUZZY_MAX_EDITS)
+    return settings.TEST_NAME_FUZZY_MAX_EDITS
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """
+    Optimal string alignment distance (edits plus adjacent transpositions),
+    or limit + 1 as soon as it must exceed `limit`. Only the diagonal band
+    |i - j| <= limit is computed; cells outside it can't be within the limit.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    over = limit + 1
+    previous2: List[int] = []
+    previous = [j if j <= limit else over for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        current = [i if i <= limit else over] + [over] * len(b)
+        low, high = max(1, i - limit), min(len(b), i + limit)
+        for j in range(low, high + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                value = min(value, previous2[j - 2] + 1)
+            current[j] = min(value, over)
+        if min(current[low - 1:high + 1]) > limit:
+            return over
+        previous2, previous = previous, current
+    return previous[-1] if previous[-1] <= limit else over
+
+
+def _misspelled(token: str, word: str) -> bool:
+    # "indirect" is within two edits of "direct", but a whole affix is a different word.
+    if abs(len(token) - len(word)) > 1 and (word in token or token in word):
+        return False
+    limit = max_edits(max(len(token), len(word)))
+    return edit_distance(token, word, limit) <= limit
+
+
+class TestNameIndex:
+    """
+    In-memory index over a vocabulary of {"id", "name", "loinc", "aliases"}
+    entries. Exact and folded tiers are dict lookups; the fuzzy tier scores
+    candidates sharing trigrams with the name and verifies the best few with a
+    bounded edit distance. A name is only matched fuzzily if its words are the
+    alias's words and a single test is closest, so qualified tests ("Glucose PP")
+    and ambiguous misspellings stay unmatched rather than guessed.
+    """
+
+    FUZZY_CANDIDATES = 16
+
+    def __init__(self, tests: Sequence[Dict]):
+        self.tests: Dict[str, Dict] = {}
+        self._exact: Dict[str, str] = {}
+        self._folded: Dict[str, Optional[str]] = {}
+        self._aliases: List[Tuple[str, str]] = []  # (alias as printed, test id), for the embedding tier
+        self._key_tokens: Dict[str, Tuple[str, ...]] = {}
+        for test in tests:
+            test_id = test["id"]
+            self.tests[test_id] = {"id": test_id, "name": test.get("name", test_id), "loinc": test.get("loinc")}
+            for alias in [test_id, test.get("name", test_id)] + list(test.get("aliases", [])):
+                key = squash(alias)
+                if not key:
+                    continue
+                self._exact.setdefault(key, test_id)
+                folded = _fold(key)
+                if self._folded.get(folded, test_id) != test_id:
+                    self._folded[folded] = None  # two tests fold to the same key: ambiguous
+                else:
+                    self._folded[folded] = test_id
+                self._key_tokens.setdefault(folded, _tokens(alias))
+                self._aliases.append((alias, test_id))
+
+        self._keys = [key for key, test_id in self._folded.items() if test_id is not None]
+        # Every word of the vocabulary ("direct", "total", "free"): a name word that is one of
+        # these is a qualifier the lab printed on purpose, never a misspelling of another word.
+        self._words = frozenset(chain.from_iterable(self._key_tokens.values()))
+        self._key_digits = [_DIGITS.findall(key) for key in self._keys]
+        # Trigram postings bucketed by key length: a match within k edits is within k characters
+        # of the name's length, so only 2k + 1 buckets are scanned instead of every alias sharing a gram.
+        postings: Dict[Tuple[int, str], List[int]] = {}
+        self._key_grams = [frozenset(_trigrams(key)) for key in self._keys]
+        for idx, key in enumerate(self._keys):
+            for gram in self._key_grams[idx]:
+                postings.setdefault((len(key), gram), []).append(idx)
+        self._postings = postings
+        self._embedder: Optional["_AliasEmbeddings"] = None
+        # Per-instance caches: reports repeat the same few hundred names.
+        self._local = functools.lru_cache(maxsize=65536)(self._lookup_local)
+        self.lookup = functools.lru_cache(maxsize=65536)(self._lookup)
+
+    @property
+    def alias_count(self) -> int:
+        return len(self._aliases)
+
+    def _match(self, test_id: str, method: str, score: float = 1.0) -> TestMatch:
+        test = self.tests[test_id]
+        return TestMatch(test_id, test["name"], test["loinc"], method, round(score, 3))
+
+    def _lookup(self, name: Optional[str]) -> Optional[TestMatch]:
+        """
+        Canonical test for one printed name, or None. Cached per distinct name.
+        """
+        match = self._local(name)
+        if match is None and settings.TEST_NAME_EMBEDDING_FALLBACK:
+            match = self._lookup_embedding([name or ""])[0]
+        return match
+
+    def _lookup_local(self, name: Optional[str]) -> Optional[TestMatch]:
+        text = str(name or "").strip()
+        if not text:
+            return None
+        stripped = _SPECIMEN.sub("", normalize_name(text))
+        keys = [squash(text), squash(stripped)]
+        for key, method in zip(keys, ("exact", "normalized")):
+            test_id = self._exact.get(key)
+            if test_id is not None:
+                return self._match(test_id, method)
+        for key in keys:
+            test_id = self._folded.get(_fold(key))
+            if test_id is not None:
+                return self._match(test_id, "folded")
+        for key, variant in {keys[0]: text, keys[1]: stripped}.items():
+            match = self._fuzzy(_fold(key), _tokens(variant)) if key else None
+            if match is not None:
+                return match
+        return None
+
+    def _same_words(self, tokens: Tuple[str, ...], candidate: Tuple[str, ...]) -> bool:
+        """
+        True if the name's words are the candidate's words, each at most misspelled:
+        no word added or dropped ("Glucose PP" is not "Glucose"), no vocabulary word
+        exchanged for another and no prefix or suffix added ("Indirect" is not "Direct").
+        """
+        if len(tokens) != len(candidate):
+            return False
+        unmatched = list(candidate)
+        for token in tokens:
+            if token in unmatched:
+                unmatched.remove(token)
+                continue
+            if token in self._words:
+                return False
+            close = [word for word in unmatched if _misspelled(token, word)]
+            if not close:
+                return False
+            unmatched.remove(close[0])
+        return True
+
+    def _fuzzy(self, key: str, tokens: Tuple[str, ...]) -> Optional[TestMatch]:
+        limit = max_edits(len(key))
+        if limit == 0:
+            return None
+        grams = set(_trigrams(key))
+        # Each edit destroys at most 3 trigrams, so a match within `limit` edits shares at least
+        # `needed` of them, and so at least one of any len(grams) - needed + 1 of them: candidates
+        # come from the postings of that many rarest grams, then are ranked by full overlap.
+        needed = max(1, len(grams) - 3 * limit)
+        lengths = range(len(key) - limit, len(key) + limit + 1)
+        postings = {gram: [self._postings.get((length, gram), ()) for length in lengths] for gram in grams}
+        rarest = sorted(grams, key=lambda gram: sum(map(len, postings[gram])))[:len(grams) - needed + 1]
+        candidates = set(chain.from_iterable(chain.from_iterable(postings[gram] for gram in rarest)))
+        ranked = sorted(((len(grams & self._key_grams[idx]), idx) for idx in candidates), reverse=True)
+        digits = _DIGITS.findall(key)
+        best: Optional[Tuple[int, str]] = None
+        tied = False
+        for count, idx in ranked[:self.FUZZY_CANDIDATES]:
+            if count < needed:
+                break
+            candidate = self._keys[idx]
+            if self._key_digits[idx] != digits:
+                continue  # T3 vs T4, B12 vs B6: a different number is a different test
+            distance = edit_distance(key, candidate, limit)
+            if distance > limit or not self._same_words(tokens, self._key_tokens[candidate]):
+                continue
+            test_id = self._folded[candidate]
+            if best is None or distance < best[0]:
+                best, tied = (distance, test_id), False
+            elif distance == best[0] and test_id != best[1]:
+                tied = True
+        if best is None or tied:
+            return None
+        return self._match(best[1], "fuzzy", 1 - best[0] / max(len(key), 1))
+
+    def _lookup_embedding(self, names: Sequence[str]) -> List[Optional[TestMatch]]:
+        if self._embedder is None:
+            self._embedder = _AliasEmbeddings(self._aliases)
+        return [
+            self._match(test_id, "embedding", similarity) if test_id is not None else None
+            for test_id, similarity in self._embedder.nearest(names)
+        ]
+
+    def lookup_many(self, names: Iterable[Optional[str]]) -> List[Optional[TestMatch]]:
+        """
+        Batch lookup for a whole report: each distinct name is resolved once, and
+        names no local tier matches share one embedding call.
+        """
+        names = list(names)
+        distinct = list(dict.fromkeys(str(name or "") for name in names))
+        resolved = {name: self._local(name) for name in distinct}
+        unresolved = [name for name, match in resolved.items() if match is None and name.strip()]
+        if unresolved and settings.TEST_NAME_EMBEDDING_FALLBACK:
+            resolved.update(zip(unresolved, self._lookup_embedding(unresolved)))
+        return [resolved[str(name or "")] for name in names]
+
+
+class _AliasEmbeddings:
+    """
+    Alias vectors for the embedding tier, computed once per vocabulary and
+    model and cached on disk (TEST_NAME_EMBEDDING_CACHE); query names go
+    through the retriever's embedding cache.
+    """
+
+    def __init__(self, aliases: Sequence[Tuple[str, str]]):
+        self.ids = [test_id for _, test_id in aliases]
+        self._texts = [alias for alias, _ in aliases]
+        self._vectors: Optional[np.ndarray] = None
+        self._failed = False
+        self._lock = threading.Lock()
+
+    def _retriever(self):
+        from backend.rag.retrieval import KnowledgeRetriever, get_retriever
+        return get_retriever() or KnowledgeRetriever()
+
+    def _load(self) -> np.ndarray:
+        key = hashlib.sha256(json.dumps([settings.EMBEDDING_MODEL, self._texts]).encode("utf-8")).hexdigest()
+        path = settings.TEST_NAME_EMBEDDING_CACHE
+        if path and os.path.exists(path):
+            with np.load(path) as cached:
+                if str(cached["key"]) == key:
+                    return cached["vectors"]
+        vectors = self._retriever().embed(self._texts)
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(path, "wb") as f:
+                np.savez(f, key=key, vectors=vectors)
+        return vectors
+
+    def nearest(self, names: Sequence[str]) -> List[Tuple[Optional[str], float]]:
+        with self._lock:
+            if self._vectors is None and not self._failed:
+                try:
+                    self._vectors = self._load()
+                except Exception as e:
+                    print(f"Warning: test-name embedding fallback disabled: {e!r}")
+                    self._failed = True
+        if self._vectors is None:
+            return [(None, 0.0)] * len(names)
+        queries = self._retriever().embed(list(names))
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        similarities = queries @ self._vectors.T
+        best = similarities.argmax(axis=1)
+        results = []
+        for row, idx in enumerate(best):
+            similarity = float(similarities[row, idx])
+            if similarity >= settings.TEST_NAME_EMBEDDING_MIN_SIMILARITY:
+                results.append((self.ids[idx], similarity))
+            else:
+                results.append((None, similarity))
+        return results
+
+
+def load_vocabulary(path: Optional[str] = None) -> List[Dict]:
+    with open(path or VOCABULARY_PATH, "r") as f:
+        return json.load(f)["tests"]
+
+
+def vocabulary_version(path: Optional[str] = None) -> str:
+    """
+    The vocabulary file's "version", part of the cache key of anything carrying canonical IDs.
+    """
+    with open(path or VOCABULARY_PATH, "r") as f:
+        return str(json.load(f).get("version", ""))
+
+
+_index: Optional[TestNameIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_test_index() -> TestNameIndex:
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = TestNameIndex(load_vocabulary(settings.TEST_VOCABULARY_PATH or None))
+    return _index
+
+
+def canonical_test_id(name: Optional[str]) -> str:
+    """
+    Canonical ID for a printed test name; unknown names fall back to their
+    normalized form, so they still group consistently.
+    """
+    match = get_test_index().lookup(name)
+    return match.test_id if match is not None else normalize_name(name)
+
+
+def canonicalize_entities(entities: List[Dict]) -> List[Dict]:
+    """
+    Copies of `entities` with "canonical_id" set (None if the vocabulary has no match).
+    """
+    if not entities:
+        return entities
+    matches = get_test_index().lookup_many(entity.get("test_name") for entity in entities)
+    return [{**entity, "canonical_id": match.test_id if match else None} for entity, match in zip(entities, matches)]
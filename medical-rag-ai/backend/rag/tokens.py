@@ -0,0 +1,37 @@
+import functools
+
+
+@functools.lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # tiktoken downloads its BPE tables on first use; offline hosts fall back to an estimate.
+        print(f"Warning: tiktoken unavailable, estimating token counts: {e!r}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Approximate prompt size in tokens (cl100k_base; ~4 chars/token if tiktoken is unavailable).
+    """
+    encoding = _encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Cuts `text` to at most `max_tokens` tokens.
+    """
+    if max_tokens <= 0:
+        return ""
+    encoding = _encoding()
+    if encoding is None:
+        return text[: max_tokens * 4]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
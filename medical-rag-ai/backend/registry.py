@@ -0,0 +1,121 @@
+import asyncio
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+
+class _Component:
+    def __init__(self, name: str, factory: Callable[[], Any], required: bool):
+        self.name = name
+        self.factory = factory
+        self.required = required
+        self.lock = threading.Lock()
+        self.instance: Any = None
+        self.status = "pending"  # pending -> initializing -> ready | failed
+        self.error: Optional[str] = None
+        self.init_seconds: Optional[float] = None
+
+
+class ComponentRegistry:
+    """
+    Process-wide home for expensive clients (LLM chain, OCR engine, retriever).
+    Each component is built at most once, under its own lock, either on first
+    use or by warm_up() at startup. get() returns None if the init fails; the
+    next get() tries again.
+    """
+
+    def __init__(self):
+        self._components: Dict[str, _Component] = {}
+
+    def register(self, name: str, factory: Callable[[], Any], required: bool = True) -> None:
+        self._components[name] = _Component(name, factory, required)
+
+    def get(self, name: str) -> Any:
+        component = self._components[name]
+        if component.status == "ready":
+            return component.instance
+        with component.lock:
+            if component.status == "ready":
+                return component.instance
+            component.status = "initializing"
+            print(f"Initializing {name}...")
+            started = time.perf_counter()
+            try:
+                component.instance = component.factory()
+                component.status = "ready"
+                component.error = None
+            except Exception as e:
+                print(f"Warning: {name} failed to initialize: {e!r}")
+                component.error = repr(e)
+                component.status = "failed"
+            component.init_seconds = round(time.perf_counter() - started, 3)
+            return component.instance
+
+    def require(self, name: str) -> Any:
+        """
+        Like get(), but raises RuntimeError if the component cannot be built.
+        """
+        instance = self.get(name)
+        if instance is None:
+            raise RuntimeError(f"{name} unavailable: {self._components[name].error}")
+        return instance
+
+    def override(self, name: str, instance: Any) -> None:
+        """
+        Installs a ready-made instance (benchmarks, local stand-ins).
+        """
+        component = self._components[name]
+        with component.lock:
+            component.instance = instance
+            component.status = "ready"
+            component.error = None
+            component.init_seconds = 0.0
+
+    async def warm_up(self, names: Iterable[str]) -> None:
+        """
+        Builds the named components concurrently in worker threads.
+        """
+        names = [name for name in names if name in self._components]
+        await asyncio.gather(*(asyncio.to_thread(self.get, name) for name in names))
+
+    def readiness(self) -> Dict[str, Any]:
+        components = {
+            name: {
+                "status": c.status,
+                "required": c.required,
+                "init_seconds": c.init_seconds,
+                "error": c.error,
+            }
+            for name, c in self._components.items()
+        }
+        ready = all(c.status == "ready" for c in self._components.values() if c.required)
+        return {"ready": ready, "components": components}
+
+
+def _medical_agent():
+    from backend.rag.clinical_chain import ClinicalChain
+    return ClinicalChain()
+
+
+def _ocr_engine():
+    from backend.ocr.ocr_engine import OCREngine
+    engine = OCREngine()
+    if getattr(engine, "model", None) is None:
+        raise RuntimeError("GOOGLE_API_KEY missing for OCR")
+    return engine
+
+
+def _retriever():
+    from backend.rag.retrieval import get_retriever
+    retriever = get_retriever()
+    if retriever is None:
+        raise RuntimeError("knowledge retrieval disabled or index missing")
+    retriever._ensure_loaded()
+    retriever.embeddings  # loads the embedding model
+    return retriever
+
+
+registry = ComponentRegistry()
+registry.register("medical_agent", _medical_agent)
+registry.register("ocr_engine", _ocr_engine, required=False)
+registry.register("retriever", _retriever, required=False)
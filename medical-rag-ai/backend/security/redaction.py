@@ -1,18 +1,124 @@
 import re
+from typing import Iterable, Iterator
+
+from backend.config import settings
+
+# Every pattern stays within one line ([ \t] rather than \s), so redacting
+# line-aligned pieces of a document gives the same result as redacting it whole.
+_SEP = r"[ \t]*[:#-]?[ \t]*"
+_NAME_WORD = r"[A-Z][A-Za-z'.-]*"
+# Between name words: a single space, or a comma ("SMITH, JOHN") unless the
+# next field's label follows it ("Kumar, Age: 54").
+_NAME_JOIN = r"(?: |,[ \t]*(?!(?i:Age|Sex|Gender|DOB|D\.O\.B|MRN|UHID|ID|Date|Ref|Phone|Tel)\b))"
+
+# Labeled patterns keep their label ("DOB: [REDACTED_DATE]"). Patterns are
+# grouped behind a cheap lookahead on their first characters, and matching is
+# only attempted at word starts, so most positions are rejected after one or
+# two character tests instead of trying every alternative.
+_BRANCHES = [
+    (r"[A-Za-z]", [
+        ("DOB", r"(?P<DOB_label>(?i:DOB|D\.O\.B\.?|Date[ \t]+of[ \t]+Birth)" + _SEP + r")"
+                r"(?:\d{1,2}[/.-]\d{1,2}[/.-]\d{2,4}|\d{4}-\d{2}-\d{2}|[A-Z][a-z]{2,8}\.?[ \t]+\d{1,2},?[ \t]+\d{4})"),
+        ("MRN", r"(?P<MRN_label>(?i:MRN|Medical[ \t]+Record(?:[ \t]+(?:Number|No\.?))?|UHID|Patient[ \t]+ID|Reg(?:istration)?\.?[ \t]*No\.?)" + _SEP + r")"
+                r"[A-Za-z0-9]*\d[A-Za-z0-9-]*"),
+        ("NAME", r"(?P<NAME_label>(?i:Patient(?:[ \t]+Name)?|Pt\.?[ \t]+Name|(?<![A-Za-z][ \t])Name|Referred[ \t]+By|Ref\.?[ \t]+(?:By|Dr\.?)|Physician|Doctor)[ \t]*:[ \t]*)"
+                 r"(?:(?i:Mr|Mrs|Ms|Miss|Dr)\.?[ \t]+)?" + _NAME_WORD + r"(?:" + _NAME_JOIN + _NAME_WORD + r"){0,3}"),
+        ("ADDRESS", r"(?P<ADDRESS_label>(?i:Address|Addr\.?)[ \t]*:[ \t]*)[^\n]*[^\s]"),
+    ]),
+    (r"[A-Za-z0-9._%+-]*@", [
+        ("EMAIL", r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b"),
+    ]),
+    (r"[\d(+]", [
+        ("SSN", r"\d{3}-\d{2}-\d{4}\b"),
+        ("PHONE", r"(?<![(+])(?:\+?1[-. ]?)?(?:\(\d{3}\)|\d{3})[-. ]?\d{3}[-. ]?\d{4}\b"),
+        ("ADDRESS", r"\d{1,5}(?:[ \t]+[A-Z][a-z]+){1,4}[ \t]+(?:Street|St|Avenue|Ave|Road|Rd|Boulevard|Blvd|Lane|Ln|Drive|Court|Ct|Way|Place|Pl)\b"),
+    ]),
+]
+
+_REPLACEMENTS = {
+    "DOB": "[REDACTED_DATE]",
+    "MRN": "[REDACTED_MRN]",
+    "NAME": "[REDACTED_NAME]",
+    "ADDRESS": "[REDACTED_ADDRESS]",
+    "EMAIL": "[REDACTED_EMAIL]",
+    "SSN": "[REDACTED_SSN]",
+    "PHONE": "[REDACTED_PHONE]",
+}
+
+
+def _compile():
+    branches = []
+    idx = 0
+    for guard, patterns in _BRANCHES:
+        alternatives = []
+        for kind, pattern in patterns:
+            # Group names must be unique; the kind is recovered from the prefix.
+            pattern = pattern.replace(f"(?P<{kind}_label>", f"(?P<{kind}_{idx}_label>")
+            alternatives.append(f"(?P<{kind}_{idx}>{pattern})")
+            idx += 1
+        branches.append(f"(?={guard})(?:{'|'.join(alternatives)})")
+    return re.compile(r"(?<![A-Za-z0-9])(?:" + "|".join(branches) + ")")
+
+
+PHI_PATTERN = _compile()
+
+
+def _replace(match: "re.Match") -> str:
+    group = match.lastgroup
+    kind = group.rsplit("_", 1)[0]
+    label_group = group + "_label"
+    label = match.group(label_group) if label_group in PHI_PATTERN.groupindex else ""
+    return label + _REPLACEMENTS[kind]
+
 
 def redact_phi(text: str) -> str:
     """
-    Redact potential PHI (Personal Health Information) from text using Regex.
-    Targeting: SSNs, Phone Numbers, Dates (simple heuristic).
-    """
-    # SSN (XXX-XX-XXXX)
-    text = re.sub(r'\b\d{3}-\d{2}-\d{4}\b', '[REDACTED_SSN]', text)
-    
-    # Phone (simple 10 digit or variants)
-    text = re.sub(r'\b(?:\+?1[-. ]?)?\(?\d{3}\)?[-. ]?\d{3}[-. ]?\d{4}\b', '[REDACTED_PHONE]', text)
-    
-    # Dates (MM/DD/YYYY or YYYY-MM-DD) - Aggressive redaction might hide test dates, so be careful.
-    # For now, let's just redact obvious DOB patterns if labeled
-    text = re.sub(r'(?i)DOB:?\s*\d{1,2}[/-]\d{1,2}[/-]\d{2,4}', 'DOB: [REDACTED_DATE]', text)
-    
-    return text
+    Redact potential PHI (Personal Health Information) from text in a single pass.
+    Targeting: SSNs, phone numbers, emails, street addresses, and DOB, MRN,
+    name and address values that follow a label.
+    """
+    if not text:
+        return text
+    return PHI_PATTERN.sub(_replace, text)
+
+
+def redact_if_enabled(text: str) -> str:
+    """
+    Applied to every text on its way to a remote model (PHI_REDACTION_ENABLED).
+    """
+    return redact_phi(text) if settings.PHI_REDACTION_ENABLED else text
+
+
+def redact_pages(pages: Iterable[str]) -> Iterator[str]:
+    """
+    Redacts page texts one at a time (pages are line-aligned, so this matches
+    redacting the joined document).
+    """
+    for page in pages:
+        yield redact_phi(page)
+
+
+class StreamRedactor:
+    """
+    Incremental redaction of text arriving in arbitrary chunks: complete lines
+    are redacted and returned by feed(); a trailing partial line is held until
+    the next chunk or close().
+    """
+
+    MAX_PENDING = 64 * 1024
+
+    def __init__(self):
+        self._pending = ""
+
+    def feed(self, chunk: str) -> str:
+        text = self._pending + chunk
+        cut = text.rfind("\n") + 1
+        if cut == 0 and len(text) > self.MAX_PENDING:
+            # No line break in sight; split on whitespace rather than buffer forever.
+            cut = max(text.rfind(" ", 0, len(text) - 256), 0) + 1
+        self._pending = text[cut:]
+        return redact_phi(text[:cut])
+
+    def close(self) -> str:
+        text, self._pending = self._pending, ""
+        return redact_phi(text)
@@ -0,0 +1,146 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from backend.config import settings
+from backend.rag.tokens import count_tokens
+
+
+@dataclass
+class ChatSession:
+    session_id: str
+    context: str
+    turns: List[Dict[str, str]] = field(default_factory=list)
+    # Rolling summary of turns[:summarized_upto]; those turns are no longer sent verbatim.
+    summary: str = ""
+    summarized_upto: int = 0
+    last_active: float = field(default_factory=time.time)
+
+    def window(self, token_budget: int) -> Tuple[List[Dict[str, str]], List[Dict[str, str]]]:
+        """
+        Splits the unsummarized turns into (older, recent): `recent` is the longest
+        suffix of turns that fits in `token_budget` tokens and is sent verbatim;
+        `older` still has to be folded into the summary.
+        """
+        pending = self.turns[self.summarized_upto:]
+        used = 0
+        start = len(pending)
+        while start > 0:
+            tokens = count_tokens(pending[start - 1]["content"]) + 4
+            if used + tokens > token_budget:
+                break
+            used += tokens
+            start -= 1
+        return pending[:start], pending[start:]
+
+
+def report_context(result: Dict) -> str:
+    """
+    Chat context for an analysis result (what the Streamlit app used to rebuild client-side).
+    """
+    findings = ", ".join(f"{e['test_name']}: {e['value']}" for e in result.get("entities", []))
+    return f"Summary: {result.get('summary', '')}\nExplanation: {result.get('explanation', '')}\nFindings: {findings}"
+
+
+class ChatSessionStore:
+    """
+    Chat sessions kept in memory, or in SQLite when `db_path` is set so that any
+    worker can pick up a session. With SQLite every get() reads the stored row:
+    another worker may have saved turns since, and a cached copy written back
+    would overwrite them. Sessions idle for longer than `idle_seconds` are evicted.
+    """
+
+    def __init__(self, idle_seconds: float, max_sessions: int, db_path: Optional[str] = None):
+        self.idle_seconds = idle_seconds
+        self.max_sessions = max_sessions
+        self._sessions: Dict[str, ChatSession] = {}
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            try:
+                directory = os.path.dirname(db_path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self._db = sqlite3.connect(db_path, timeout=5, check_same_thread=False)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS chat_sessions ("
+                    " session_id TEXT PRIMARY KEY, data TEXT NOT NULL, last_active REAL NOT NULL)"
+                )
+                self._db.execute("CREATE INDEX IF NOT EXISTS idx_chat_sessions_last_active ON chat_sessions (last_active)")
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"Warning: chat session persistence disabled ({db_path}): {e}")
+                self._db = None
+
+    def create(self, context: str) -> ChatSession:
+        session = ChatSession(session_id=uuid.uuid4().hex, context=context)
+        self.save(session)
+        return session
+
+    def get(self, session_id: str) -> Optional[ChatSession]:
+        now = time.time()
+        with self._lock:
+            self._evict_idle(now)
+            if self._db is None:
+                session = self._sessions.get(session_id)
+            else:
+                row = self._db.execute(
+                    "SELECT data FROM chat_sessions WHERE session_id = ? AND last_active > ?",
+                    (session_id, now - self.idle_seconds),
+                ).fetchone()
+                session = ChatSession(**json.loads(row[0])) if row is not None else None
+            if session is not None:
+                session.last_active = now
+            return session
+
+    def save(self, session: ChatSession) -> None:
+        session.last_active = time.time()
+        with self._lock:
+            if self._db is None:
+                self._sessions[session.session_id] = session
+                if len(self._sessions) > self.max_sessions:
+                    oldest = min(self._sessions.values(), key=lambda s: s.last_active)
+                    del self._sessions[oldest.session_id]
+            else:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO chat_sessions (session_id, data, last_active) VALUES (?, ?, ?)",
+                        (session.session_id, json.dumps(asdict(session)), session.last_active),
+                    )
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    print(f"Warning: chat session write failed: {e}")
+
+    def _evict_idle(self, now: float) -> None:
+        # Caller holds self._lock.
+        cutoff = now - self.idle_seconds
+        for session_id in [sid for sid, s in self._sessions.items() if s.last_active <= cutoff]:
+            del self._sessions[session_id]
+        if self._db is not None:
+            try:
+                self._db.execute("DELETE FROM chat_sessions WHERE last_active <= ?", (cutoff,))
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"Warning: chat session eviction failed: {e}")
+
+
+_store: Optional[ChatSessionStore] = None
+_store_lock = threading.Lock()
+
+
+def get_session_store() -> ChatSessionStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ChatSessionStore(
+                idle_seconds=settings.CHAT_SESSION_IDLE_SECONDS,
+                max_sessions=settings.CHAT_SESSION_MAX,
+                db_path=settings.CHAT_SESSION_DB_PATH or None,
+            )
+        return _store
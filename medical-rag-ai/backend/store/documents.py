@@ -0,0 +1,155 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from backend.config import settings
+
+
+def document_id(text: str) -> str:
+    """
+    Content-hash handle for a report's text: identical uploads share one document.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+
+class DocumentStore:
+    """
+    Extracted (already redacted) report text kept server-side under a content-hash
+    ID, so clients pass the ID to /analyze and /chat instead of the text.
+    Bounded to `max_documents` and `max_bytes` of text, least recently used
+    evicted first, and documents idle for `idle_seconds` expire. Written through
+    to SQLite when `db_path` is set so that any worker can resolve an ID.
+    """
+
+    def __init__(self, max_documents: int, max_bytes: int, idle_seconds: float, db_path: Optional[str] = None):
+        self.max_documents = max_documents
+        self.max_bytes = max_bytes
+        self.idle_seconds = idle_seconds
+        # document_id -> (text, size in bytes, last_active), least recently used first
+        self._docs: "OrderedDict[str, Tuple[str, int, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"puts": 0, "hits": 0, "misses": 0, "evictions": 0}
+        self._db = None
+        if db_path:
+            try:
+                directory = os.path.dirname(db_path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self._db = sqlite3.connect(db_path, timeout=5, check_same_thread=False)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS documents ("
+                    " document_id TEXT PRIMARY KEY, text TEXT NOT NULL, size INTEGER NOT NULL, last_active REAL NOT NULL)"
+                )
+                self._db.execute("CREATE INDEX IF NOT EXISTS idx_documents_last_active ON documents (last_active)")
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"Warning: document persistence disabled ({db_path}): {e}")
+                self._db = None
+
+    def put(self, text: str) -> str:
+        doc_id = document_id(text)
+        size = len(text.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            self._stats["puts"] += 1
+            self._insert(doc_id, text, size, now)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO documents (document_id, text, size, last_active) VALUES (?, ?, ?, ?)",
+                        (doc_id, text, size, now),
+                    )
+                    self._trim_db(now)
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    print(f"Warning: document write failed: {e}")
+        return doc_id
+
+    def get(self, doc_id: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._docs.get(doc_id)
+            if entry is not None and entry[2] <= now - self.idle_seconds:
+                self._remove(doc_id)
+                entry = None
+            if entry is None and self._db is not None:
+                row = self._db.execute(
+                    "SELECT text, size FROM documents WHERE document_id = ? AND last_active > ?",
+                    (doc_id, now - self.idle_seconds),
+                ).fetchone()
+                if row is not None:
+                    entry = (row[0], row[1], now)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["hits"] += 1
+            self._insert(doc_id, entry[0], entry[1], now)
+            if self._db is not None:
+                try:
+                    self._db.execute("UPDATE documents SET last_active = ? WHERE document_id = ?", (now, doc_id))
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    print(f"Warning: document touch failed: {e}")
+            return entry[0]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._stats, "documents": len(self._docs), "bytes": self._bytes}
+
+    def _insert(self, doc_id: str, text: str, size: int, now: float) -> None:
+        # Caller holds self._lock.
+        self._remove(doc_id)
+        self._docs[doc_id] = (text, size, now)
+        self._bytes += size
+        cutoff = now - self.idle_seconds
+        while self._docs and (
+            len(self._docs) > self.max_documents
+            or self._bytes > self.max_bytes
+            or next(iter(self._docs.values()))[2] <= cutoff
+        ):
+            oldest = next(iter(self._docs))
+            if oldest == doc_id:
+                break  # a single document over max_bytes is still kept until something replaces it
+            self._remove(oldest)
+            self._stats["evictions"] += 1
+
+    def _remove(self, doc_id: str) -> None:
+        entry = self._docs.pop(doc_id, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def _trim_db(self, now: float) -> None:
+        # Caller holds self._lock; same bounds as memory, newest documents kept.
+        self._db.execute("DELETE FROM documents WHERE last_active <= ?", (now - self.idle_seconds,))
+        total = 0
+        stale = []
+        rows = self._db.execute("SELECT document_id, size FROM documents ORDER BY last_active DESC").fetchall()
+        for count, (doc_id, size) in enumerate(rows, start=1):
+            total += size
+            if count > self.max_documents or (total > self.max_bytes and count > 1):
+                stale.append((doc_id,))
+        if stale:
+            self._db.executemany("DELETE FROM documents WHERE document_id = ?", stale)
+
+
+_store: Optional[DocumentStore] = None
+_store_lock = threading.Lock()
+
+
+def get_document_store() -> DocumentStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = DocumentStore(
+                max_documents=settings.DOCUMENT_MAX,
+                max_bytes=settings.DOCUMENT_MAX_BYTES,
+                idle_seconds=settings.DOCUMENT_IDLE_SECONDS,
+                db_path=settings.DOCUMENT_DB_PATH or None,
+            )
+        return _store
@@ -0,0 +1,159 @@
+import datetime
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from backend.config import settings
+from backend.rag.flagging import canonical_analyte, parse_value
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    report_id INTEGER PRIMARY KEY,
+    patient_key TEXT NOT NULL,
+    report_date TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    UNIQUE (patient_key, content_hash, report_date)
+);
+CREATE TABLE IF NOT EXISTS lab_results (
+    result_id INTEGER PRIMARY KEY,
+    report_id INTEGER NOT NULL REFERENCES reports (report_id),
+    patient_key TEXT NOT NULL,
+    canonical_test TEXT NOT NULL,
+    result_date TEXT NOT NULL,
+    test_name TEXT NOT NULL,
+    value TEXT NOT NULL,
+    value_numeric REAL,
+    unit TEXT,
+    reference_range TEXT,
+    flag TEXT
+);
+-- Trend queries are answered from this index alone (covering), in date order.
+CREATE INDEX IF NOT EXISTS idx_lab_results_trend
+    ON lab_results (patient_key, canonical_test, result_date, value_numeric, unit, flag);
+CREATE INDEX IF NOT EXISTS idx_lab_results_report ON lab_results (report_id);
+"""
+
+# (patient_key, report_date, content_hash, entities)
+ReportRows = Tuple[str, str, str, Sequence[Dict]]
+
+
+class ResultsStore:
+    """
+    Longitudinal store of validated LabEntity rows in SQLite, indexed for
+    per-patient, per-test time series.
+    """
+
+    def __init__(self, db_path: str):
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(db_path, timeout=10, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._db.commit()
+        self._lock = threading.Lock()
+
+    def add_reports(self, reports: Iterable[ReportRows]) -> int:
+        """
+        Bulk-inserts reports and their results in one transaction.
+        A report already stored for the same patient, content and date is skipped.
+        Returns the number of result rows inserted.
+        """
+        now = time.time()
+        inserted = 0
+        with self._lock:
+            with self._db:
+                for patient_key, report_date, content_hash, entities in reports:
+                    cursor = self._db.execute(
+                        "INSERT OR IGNORE INTO reports (patient_key, report_date, content_hash, created_at) VALUES (?, ?, ?, ?)",
+                        (patient_key, report_date, content_hash, now),
+                    )
+                    if cursor.rowcount == 0:
+                        continue
+                    report_id = cursor.lastrowid
+                    rows = [
+                        (
+                            report_id,
+                            patient_key,
+                            entity.get("canonical_id") or canonical_analyte(entity.get("test_name")),
+                            report_date,
+                            entity.get("test_name") or "",
+                            str(entity.get("value") or ""),
+                            _numeric(entity.get("value")),
+                            entity.get("unit"),
+                            entity.get("reference_range"),
+                            entity.get("flag"),
+                        )
+                        for entity in entities
+                    ]
+                    self._db.executemany(
+                        "INSERT INTO lab_results (report_id, patient_key, canonical_test, result_date, test_name,"
+                        " value, value_numeric, unit, reference_range, flag) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        rows,
+                    )
+                    inserted += len(rows)
+        return inserted
+
+    def add_report(self, patient_key: str, entities: Sequence[Dict], content_hash: str, report_date: Optional[str] = None) -> int:
+        return self.add_reports([(patient_key, report_date or today(), content_hash, entities)])
+
+    def trend(self, patient_key: str, test: str, start: Optional[str] = None, end: Optional[str] = None, limit: int = 1000) -> List[Dict]:
+        """
+        Time series for one patient and test, oldest first. With more than `limit`
+        points, the most recent `limit` are returned. Served by a backward range
+        scan of the trend index.
+        """
+        query = (
+            "SELECT result_date, value_numeric, unit, flag FROM lab_results"
+            " WHERE patient_key = ? AND canonical_test = ?"
+        )
+        params: List = [patient_key, canonical_analyte(test)]
+        if start:
+            query += " AND result_date >= ?"
+            params.append(start)
+        if end:
+            query += " AND result_date <= ?"
+            params.append(end)
+        query += " ORDER BY result_date DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._db.execute(query, params).fetchall()
+        return [{"date": date, "value": value, "unit": unit, "flag": flag} for date, value, unit, flag in reversed(rows)]
+
+    def tests_for(self, patient_key: str) -> List[Dict]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT canonical_test, COUNT(*) FROM lab_results WHERE patient_key = ? GROUP BY canonical_test",
+                (patient_key,),
+            ).fetchall()
+        return [{"test": test, "count": count} for test, count in rows]
+
+
+def _numeric(value) -> Optional[float]:
+    number = parse_value(value)
+    return None if number != number else number  # NaN -> NULL
+
+
+def today() -> str:
+    return datetime.date.today().isoformat()
+
+
+_store: Optional[ResultsStore] = None
+_store_lock = threading.Lock()
+
+
+def get_results_store() -> Optional[ResultsStore]:
+    """
+    Process-wide results store, or None if persistence is disabled.
+    """
+    global _store
+    if not settings.RESULTS_STORE_ENABLED:
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = ResultsStore(settings.RESULTS_DB_PATH)
+        return _store
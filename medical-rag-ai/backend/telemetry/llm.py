@@ -0,0 +1,64 @@
+import threading
+from typing import Any, Dict, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from backend.rag.tokens import count_tokens
+from backend.telemetry.metrics import LLM_CALLS, LLM_TOKENS
+
+
+OPERATION_TAG = "op:"
+
+
+def _operation(tags) -> str:
+    # ClinicalChain tags every chain with "op:<name>" (extraction, explanation, ...).
+    for tag in tags or ():
+        if tag.startswith(OPERATION_TAG):
+            return tag[len(OPERATION_TAG):]
+    return "other"
+
+
+class LLMUsageCallback(BaseCallbackHandler):
+    """
+    Records per-call prompt/completion tokens and outcomes by operation.
+    Uses the provider's usage metadata when present, otherwise a local estimate.
+    """
+
+    run_inline = True
+
+    def __init__(self):
+        self._runs: Dict[UUID, Tuple[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, tags=None, **kwargs: Any) -> None:
+        prompt = sum(count_tokens(str(message.content)) for batch in messages for message in batch)
+        with self._lock:
+            self._runs[run_id] = (_operation(tags), prompt)
+
+    def on_llm_start(self, serialized, prompts, *, run_id: UUID, tags=None, **kwargs: Any) -> None:
+        with self._lock:
+            self._runs[run_id] = (_operation(tags), sum(count_tokens(p) for p in prompts))
+
+    def on_llm_end(self, response, *, run_id: UUID, tags=None, **kwargs: Any) -> None:
+        with self._lock:
+            operation, prompt_estimate = self._runs.pop(run_id, (_operation(tags), 0))
+        usage: Optional[dict] = None
+        completion_text = ""
+        for generations in response.generations:
+            for generation in generations:
+                completion_text += generation.text or ""
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None) or usage
+        if usage:
+            prompt_tokens, completion_tokens = usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+        else:
+            prompt_tokens, completion_tokens = prompt_estimate, count_tokens(completion_text)
+        LLM_TOKENS.observe(prompt_tokens, operation=operation, kind="prompt")
+        LLM_TOKENS.observe(completion_tokens, operation=operation, kind="completion")
+        LLM_CALLS.inc(operation=operation, outcome="ok")
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, tags=None, **kwargs: Any) -> None:
+        with self._lock:
+            operation, _ = self._runs.pop(run_id, (_operation(tags), 0))
+        LLM_CALLS.inc(operation=operation, outcome="error")
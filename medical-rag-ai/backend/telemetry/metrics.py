@@ -0,0 +1,139 @@
+import bisect
+import threading
+from typing import Dict, List, Sequence, Tuple
+
+# Prometheus text exposition (version 0.0.4) without the client library.
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+BYTES_BUCKETS = (1e3, 1e4, 1e5, 1e6, 5e6, 1e7, 5e7, 1e8)
+TOKEN_BUCKETS = (50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+
+_metrics: List["_Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, key)} {value:g}")
+        return lines
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, key)} {value:g}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (+Inf last), sum]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][idx] += 1
+            series[1] += value
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, (counts, total) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    le = 'le="%g"' % bound
+                    lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+                cumulative += counts[-1]
+                le = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {total:g}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+def render_metrics() -> str:
+    lines: List[str] = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+REQUEST_SECONDS = Histogram("medrag_request_duration_seconds", "HTTP request latency by route.", ["method", "route", "status"])
+STAGE_SECONDS = Histogram("medrag_stage_duration_seconds", "Latency of pipeline stages (pdf_parse, ocr, extraction, explanation, chat, ...).", ["stage"])
+PAYLOAD_BYTES = Histogram("medrag_payload_bytes", "Size of payloads entering a stage.", ["stage"], buckets=BYTES_BUCKETS)
+LLM_TOKENS = Histogram("medrag_llm_tokens", "Prompt/completion tokens per LLM call.", ["operation", "kind"], buckets=TOKEN_BUCKETS)
+COMPACTION_TOKENS = Histogram("medrag_compaction_tokens", "Report text tokens before and after prompt compaction.", ["kind"], buckets=TOKEN_BUCKETS)
+LLM_CALLS = Counter("medrag_llm_calls_total", "LLM calls by operation and outcome.", ["operation", "outcome"])
+LLM_RETRIES = Counter("medrag_llm_retries_total", "LLM calls repeated after a failed or unusable response.", ["operation"])
+LLM_THROTTLED = Counter("medrag_llm_throttled_total", "LLM calls rejected by the provider's rate limit or quota.", ["operation"])
+LLM_COALESCED = Counter("medrag_llm_coalesced_total", "LLM calls served by an identical call already in flight.", ["operation"])
+LLM_CONCURRENCY_LIMIT = Gauge("medrag_llm_concurrency_limit", "Current adaptive cap on in-flight LLM calls.")
+JOB_QUEUE_DEPTH = Gauge("medrag_job_queue_depth", "Analysis jobs waiting in the queue, by priority lane.", ["priority"])
+JOB_RUNNING = Gauge("medrag_jobs_running", "Analysis jobs running in this process.")
+JOBS_FINISHED = Counter("medrag_jobs_finished_total", "Analysis jobs by final status.", ["status"])
+JOBS_REJECTED = Counter("medrag_jobs_rejected_total", "Job submissions refused with 429 because the queue was full.", ["priority"])
@@ -0,0 +1,142 @@
+import heapq
+import itertools
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+# Leaf frames in these modules are idle threads (event loop select, pool workers waiting).
+_IDLE_MODULES = ("selectors.py", "threading.py", "queue.py")
+_IDLE_FUNCTIONS = {("thread.py", "_worker")}  # concurrent.futures worker blocked on its queue
+
+
+def _is_idle(frame) -> bool:
+    code = frame.f_code
+    filename = os.path.basename(code.co_filename)
+    return filename.endswith(_IDLE_MODULES) or (filename, code.co_name) in _IDLE_FUNCTIONS
+
+
+class _Profile:
+    def __init__(self, profile_id: int, method: str, path: str):
+        self.id = profile_id
+        self.method = method
+        self.path = path
+        self.started = time.time()
+        self.samples: Counter = Counter()
+        self.seconds = 0.0
+        self.stages: List = []
+
+
+class SamplingProfiler:
+    """
+    Opt-in sampling profiler for slow requests. While any request is in flight,
+    a background thread samples every thread's stack each `interval` seconds and
+    adds it to each active request's profile (concurrent requests share samples).
+    Profiles of requests slower than `min_seconds` are kept, `keep` slowest
+    first, as collapsed stacks ("frame;frame;frame count") that flamegraph.pl
+    and speedscope read. They are also written to `directory` if set.
+    """
+
+    def __init__(self, interval: float, keep: int, min_seconds: float, directory: Optional[str] = None):
+        self.interval = interval
+        self.keep = keep
+        self.min_seconds = min_seconds
+        self.directory = directory
+        self._active: Dict[int, _Profile] = {}
+        self._slowest: List = []  # min-heap of (seconds, id, profile)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, scope) -> _Profile:
+        profile = _Profile(next(self._ids), scope.get("method", ""), scope.get("path", ""))
+        with self._lock:
+            self._active[profile.id] = profile
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+        return profile
+
+    def finish(self, profile: _Profile, seconds: float, stages) -> None:
+        profile.seconds = seconds
+        profile.stages = list(stages)
+        with self._lock:
+            self._active.pop(profile.id, None)
+            if seconds < self.min_seconds or not profile.samples:
+                return
+            entry = (seconds, profile.id, profile)
+            if len(self._slowest) < self.keep:
+                heapq.heappush(self._slowest, entry)
+            elif seconds > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, entry)
+            else:
+                return
+        if self.directory:
+            self._write(profile)
+
+    def profiles(self) -> List[Dict]:
+        with self._lock:
+            slowest = sorted(self._slowest, reverse=True)
+        return [
+            {
+                "id": p.id,
+                "method": p.method,
+                "path": p.path,
+                "started": p.started,
+                "seconds": round(p.seconds, 3),
+                "samples": sum(p.samples.values()),
+                "stages": [{"stage": name, "seconds": round(s, 4)} for name, s in p.stages],
+            }
+            for _, _, p in slowest
+        ]
+
+    def collapsed(self, profile_id: int) -> Optional[str]:
+        with self._lock:
+            for _, _, profile in self._slowest:
+                if profile.id == profile_id:
+                    return _render(profile)
+        return None
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while True:
+            with self._lock:
+                active = list(self._active.values())
+            if not active:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+            stacks = []
+            for ident, frame in sys._current_frames().items():
+                if ident == own or _is_idle(frame):
+                    continue
+                stacks.append(_collapse(frame))
+            for profile in active:
+                profile.samples.update(stacks)
+            time.sleep(self.interval)
+
+    def _write(self, profile: _Profile) -> None:
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            name = f"{int(profile.started)}-{profile.id}-{profile.path.strip('/').replace('/', '_') or 'root'}-{int(profile.seconds * 1000)}ms.folded"
+            with open(os.path.join(self.directory, name), "w") as f:
+                f.write(_render(profile))
+        except OSError as e:
+            print(f"Warning: could not write profile: {e}")
+
+
+def _collapse(frame) -> str:
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        frames.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(frames))
+
+
+def _render(profile: _Profile) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in profile.samples.most_common())
@@ -0,0 +1,109 @@
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import List, Optional, Tuple
+
+from backend.telemetry.metrics import PAYLOAD_BYTES, REQUEST_SECONDS, STAGE_SECONDS
+
+# (stage, seconds) for the current request; None outside a request.
+_request_stages: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar(
+    "request_stages", default=None
+)
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Times a pipeline stage into medrag_stage_duration_seconds and the current
+    request's Server-Timing header. Safe to hold across awaits and yields:
+    it only reads context, never sets it.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - started)
+
+
+@contextmanager
+def collect_stages(stages: List[Tuple[str, float]]):
+    """
+    Records the stages completed inside the block into `stages`, as the
+    middleware does for a request; for work run outside one (queued jobs).
+    """
+    token = _request_stages.set(stages)
+    try:
+        yield
+    finally:
+        _request_stages.reset(token)
+
+
+def record_stage(name: str, seconds: float) -> None:
+    STAGE_SECONDS.observe(seconds, stage=name)
+    stages = _request_stages.get()
+    if stages is not None:
+        stages.append((name, seconds))
+
+
+def record_payload(name: str, size: int) -> None:
+    PAYLOAD_BYTES.observe(size, stage=name)
+
+
+def server_timing(stages: List[Tuple[str, float]], total: float) -> str:
+    # Repeated stages (parallel chunks, OCR pages) are summed under one entry.
+    totals = {}
+    counts = {}
+    for name, seconds in stages:
+        totals[name] = totals.get(name, 0.0) + seconds
+        counts[name] = counts.get(name, 0) + 1
+    parts = [
+        f'{name};dur={seconds * 1000:.1f}' + (f';desc="x{counts[name]}"' if counts[name] > 1 else "")
+        for name, seconds in totals.items()
+    ]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+class TimingMiddleware:
+    """
+    ASGI middleware: per-route latency histogram, a Server-Timing header with the
+    stages completed before the response starts (for streamed responses, the
+    stages that run before the first chunk), and the optional slow-request profiler.
+    """
+
+    def __init__(self, app, profiler=None):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stages: List[Tuple[str, float]] = []
+        token = _request_stages.set(stages)
+        started = time.perf_counter()
+        status = {"code": 500}
+        profile = self.profiler.start(scope) if self.profiler is not None else None
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                header = server_timing(stages, time.perf_counter() - started)
+                message = {**message, "headers": list(message.get("headers", [])) + [(b"server-timing", header.encode("latin-1"))]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            elapsed = time.perf_counter() - started
+            _request_stages.reset(token)
+            route = scope.get("route")
+            REQUEST_SECONDS.observe(
+                elapsed,
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=status["code"],
+            )
+            if profile is not None:
+                self.profiler.finish(profile, elapsed, stages)
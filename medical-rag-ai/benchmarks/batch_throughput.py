@@ -0,0 +1,105 @@
+"""
+Reports/minute for /api/analyze/batch versus one /api/analyze call per report.
+
+Runs fully offline against a stand-in chat model with a fixed per-call latency,
+so the numbers reflect how many remote round trips each path makes.
+
+    python -m benchmarks.batch_throughput --reports 60 --latency 0.8
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import time
+
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+os.environ["CACHE_ENABLED"] = "false"
+# Force every report through the LLM so the comparison is about call packing.
+os.environ["FAST_EXTRACTION_ENABLED"] = "false"
+
+import httpx
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from backend.main import app
+from backend.registry import registry
+from backend.rag.clinical_chain import ClinicalChain
+
+REPORT_ID = re.compile(r"^=== REPORT (.+?) ===$", re.MULTILINE)
+ENTITY = {"test_name": "Hemoglobin", "value": "11.2", "unit": "g/dL", "reference_range": "13.5-17.5", "flag": "Low"}
+EXPLANATION = {"explanation": "Hemoglobin is slightly low.", "medication_suggestions": [], "follow_up_suggestions": ["Retest in 3 months"]}
+
+
+class FixedLatencyChatModel(BaseChatModel):
+    latency: float = 0.8
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fixed-latency-benchmark"
+
+    def _reply(self, prompt: str) -> str:
+        ids = REPORT_ID.findall(prompt)
+        if ids:
+            return json.dumps({report_id: [ENTITY] for report_id in ids})
+        if "Entities:" in prompt:
+            return json.dumps(EXPLANATION)
+        return json.dumps([ENTITY])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        return self._result(messages)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        return self._result(messages)
+
+    def _result(self, messages):
+        self.calls += 1
+        prompt = "\n".join(str(m.content) for m in messages)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._reply(prompt)))])
+
+
+def make_reports(n):
+    return [f"Patient {i}\nHemoglobin {10 + i % 5}.{i % 10} g/dL 13.5-17.5\nGlucose {80 + i} mg/dL 70-99" for i in range(n)]
+
+
+async def one_by_one(client, reports):
+    for text in reports:
+        response = await client.post("/api/analyze", json={"text": text})
+        response.raise_for_status()
+
+
+async def batched(client, reports):
+    response = await client.post("/api/analyze/batch", json={"reports": [{"text": t} for t in reports]})
+    response.raise_for_status()
+    body = response.json()
+    assert body["failed"] == 0, body
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reports", type=int, default=60)
+    parser.add_argument("--latency", type=float, default=0.8, help="seconds per stand-in LLM call")
+    args = parser.parse_args()
+
+    agent = ClinicalChain()
+    agent.llm = FixedLatencyChatModel(latency=args.latency)
+    registry.override("medical_agent", agent)
+    reports = make_reports(args.reports)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for name, run in (("one-by-one", one_by_one), ("batch", batched)):
+            agent.llm.calls = 0
+            started = time.perf_counter()
+            await run(client, reports)
+            elapsed = time.perf_counter() - started
+            print(f"{name:>10}: {args.reports} reports in {elapsed:6.2f}s  "
+                  f"{args.reports / elapsed * 60:8.1f} reports/min  {agent.llm.calls} LLM calls")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
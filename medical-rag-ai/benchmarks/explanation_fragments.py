@@ -0,0 +1,71 @@
+"""
+Explanation latency, LLM calls and LLM output tokens with and without the
+explanation fragment library.
+
+Explains the entities of synthetic reports (common panel tests, some out of
+range, plus tests the library does not cover) on the fake chat model with a
+fixed latency per call and a per-token generation time, so longer LLM answers
+cost more, as they do on a real model.
+
+    python -m benchmarks.explanation_fragments --reports 30 --latency-ms 400 --ms-per-token 8
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+os.environ["LLM_BACKEND"] = "fake"
+os.environ["FAKE_LLM_LATENCY_DIST"] = "fixed"
+os.environ["CACHE_ENABLED"] = "false"
+
+from backend.config import settings
+from backend.llm.fake import FakeChatModel, extract_rows, synthetic_report
+from backend.rag.clinical_chain import ClinicalChain
+from backend.rag.flagging import flag_entities
+from backend.rag.tokens import count_tokens
+
+
+class MeteredFakeChatModel(FakeChatModel):
+    ms_per_token: float = 0.0
+    calls: int = 0
+    output_tokens: int = 0
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        result = await super()._agenerate(messages, stop, run_manager, **kwargs)
+        tokens = count_tokens(result.generations[0].message.content)
+        self.calls += 1
+        self.output_tokens += tokens
+        await asyncio.sleep(tokens * self.ms_per_token / 1000)
+        return result
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reports", type=int, default=30)
+    parser.add_argument("--tests", type=int, default=8, help="results per report")
+    parser.add_argument("--latency-ms", type=float, default=400, help="time to first token per call")
+    parser.add_argument("--ms-per-token", type=float, default=8, help="generation time per output token")
+    args = parser.parse_args()
+
+    settings.FAKE_LLM_LATENCY_MS = args.latency_ms
+    reports = [flag_entities(extract_rows(synthetic_report(seed, tests=args.tests, header=False))) for seed in range(args.reports)]
+
+    for enabled in (False, True):
+        settings.EXPLANATION_FRAGMENTS_ENABLED = enabled
+        agent = ClinicalChain()
+        agent.llm = MeteredFakeChatModel(ms_per_token=args.ms_per_token)
+        latencies, lengths = [], []
+        for entities in reports:
+            started = time.perf_counter()
+            response = await agent.agenerate_explanation(entities)
+            latencies.append(time.perf_counter() - started)
+            lengths.append(count_tokens(response["explanation"]))
+        name = "fragments" if enabled else "llm only"
+        print(f"{name:>10}: p50 {statistics.median(latencies) * 1000:6.0f}ms  mean {statistics.mean(latencies) * 1000:6.0f}ms  "
+              f"{agent.llm.calls / len(reports):4.2f} LLM calls  {agent.llm.output_tokens / len(reports):6.1f} LLM output tokens  "
+              f"{statistics.mean(lengths):6.1f} explanation tokens per report")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,80 @@
+"""
+Latency and bytes per image report: OCR text round trip versus fused extraction.
+
+  ocr:   POST /api/upload-report (vision -> text), then POST /api/analyze with the
+         text (text -> entities, then explanation)
+  fused: POST /api/analyze-image (vision -> entities, then explanation)
+
+Runs in-process on the fake vision/chat backend with a fixed per-call latency.
+The rule-based fast path is off by default so the text path pays its LLM
+extraction call, as it does for reports the parser can't read (--fast-extraction
+to turn it on).
+
+    python -m benchmarks.fused_image --reports 20 --latency-ms 800
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+os.environ["LLM_BACKEND"] = "fake"
+os.environ["FAKE_LLM_LATENCY_DIST"] = "fixed"
+os.environ["CACHE_ENABLED"] = "false"
+os.environ["RESULTS_STORE_ENABLED"] = "false"
+if "--fast-extraction" not in sys.argv:
+    os.environ["FAST_EXTRACTION_ENABLED"] = "false"
+
+import httpx
+
+from backend.config import settings
+from backend.main import app
+from benchmarks.synthetic_reports import report_image, report_text
+
+
+async def ocr_path(client, image):
+    upload = await client.post("/api/upload-report", files={"file": ("report.png", image, "image/png")})
+    upload.raise_for_status()
+    analysis = await client.post("/api/analyze", json={"text": upload.json()["text"]})
+    analysis.raise_for_status()
+    sent = len(image) + len(analysis.request.content)
+    received = len(upload.content) + len(analysis.content)
+    return len(analysis.json()["entities"]), sent, received
+
+
+async def fused_path(client, image):
+    analysis = await client.post("/api/analyze-image", files={"file": ("report.png", image, "image/png")})
+    analysis.raise_for_status()
+    assert analysis.json()["extraction"] == "fused", analysis.json()
+    return len(analysis.json()["entities"]), len(image), len(analysis.content)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reports", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=800, help="per remote model call")
+    parser.add_argument("--fast-extraction", action="store_true", help="keep the rule-based fast path on")
+    args = parser.parse_args()
+
+    settings.FAKE_LLM_LATENCY_MS = args.latency_ms
+    images = [report_image(report_text(seed)) for seed in range(args.reports)]
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for name, run in (("ocr", ocr_path), ("fused", fused_path)):
+            latencies, entities, received, sent = [], 0, 0, 0
+            for image in images:
+                started = time.perf_counter()
+                found, up, down = await run(client, image)
+                latencies.append(time.perf_counter() - started)
+                entities += found
+                sent += up
+                received += down
+            print(f"{name:>6}: p50 {statistics.median(latencies) * 1000:7.0f}ms  mean {statistics.mean(latencies) * 1000:7.0f}ms  "
+                  f"{sent / len(images) / 1024:6.1f} KiB up  {received / len(images) / 1024:5.1f} KiB down per report  "
+                  f"{entities / len(images):.1f} entities/report")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,154 @@
+"""
+Job queue behaviour under overload, on the fake backend with a fixed per-call latency.
+
+  burst:   submits --jobs normal jobs and a few urgent ones at once to a queue
+           of --queue-max slots; reports 429s (and their Retry-After), and queue
+           wait for urgent versus normal jobs.
+  cancel:  cancels one queued and one running job.
+  timeout: a job with a run-time limit below the model latency.
+  restart: jobs queued with no workers are run by a fresh queue on the same database.
+
+Exits non-zero if any scenario misbehaves.
+
+    python -m benchmarks.job_queue --jobs 60 --workers 4 --queue-max 40 --urgent-reserve 10 --latency-ms 300
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ["LLM_BACKEND"] = "fake"
+os.environ["FAKE_LLM_LATENCY_DIST"] = "fixed"
+os.environ["FAST_EXTRACTION_ENABLED"] = "false"
+os.environ["EXPLANATION_FRAGMENTS_ENABLED"] = "false"
+os.environ["CACHE_ENABLED"] = "false"
+os.environ["RESULTS_STORE_ENABLED"] = "false"
+os.environ["JOB_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="jobs-"), "jobs.sqlite3")
+
+import httpx
+
+from backend.api.jobs import run_job
+from backend.config import settings
+from backend.jobs import queue as job_queue
+from backend.llm.fake import synthetic_report
+
+failures = []
+
+
+def check(condition, message):
+    print(("  ok    " if condition else "  FAIL  ") + message)
+    if not condition:
+        failures.append(message)
+
+
+async def wait_all(client, job_ids):
+    jobs = {}
+    for job_id in job_ids:
+        while True:
+            job = (await client.get(f"/api/jobs/{job_id}", params={"wait": 30})).json()
+            if job["status"] not in ("queued", "running"):
+                jobs[job_id] = job
+                break
+    return jobs
+
+
+async def burst(client, args):
+    print(f"burst: {args.jobs} normal + {args.urgent} urgent jobs, {args.queue_max} slots ({settings.JOB_URGENT_RESERVE} urgent-only)")
+    accepted, retry_after = {}, []
+    for n in range(args.jobs):
+        response = await client.post("/api/jobs", json={"text": synthetic_report(n, header=False)})
+        if response.status_code == 429:
+            retry_after.append(int(response.headers["retry-after"]))
+        else:
+            accepted[response.json()["job_id"]] = "normal"
+    for n in range(args.urgent):
+        response = await client.post("/api/jobs", json={"text": synthetic_report(10_000 + n, header=False), "priority": "urgent"})
+        check(response.status_code == 202, f"urgent job accepted into the reserve (status {response.status_code})")
+        if response.status_code == 202:
+            accepted[response.json()["job_id"]] = "urgent"
+
+    check(len(retry_after) > 0, f"{len(retry_after)} normal jobs refused with 429, Retry-After {min(retry_after, default=0)}-{max(retry_after, default=0)}s")
+    jobs = await wait_all(client, accepted)
+    waits = {"urgent": [], "normal": []}
+    for job_id, job in jobs.items():
+        waits[accepted[job_id]].append(job["stages"]["queue_wait"])
+    check(all(job["status"] == "succeeded" and job["result"]["entities"] for job in jobs.values()),
+          f"all {len(jobs)} accepted jobs succeeded")
+    for lane, values in waits.items():
+        if values:
+            print(f"        {lane:>6} queue wait: p50 {statistics.median(values) * 1000:6.0f}ms  max {max(values) * 1000:6.0f}ms")
+    check(max(waits["urgent"], default=0) < statistics.median(waits["normal"] or [0]),
+          "urgent jobs waited less than the median normal job")
+    sample = next(iter(jobs.values()))
+    print(f"        stages of one job: {sample['stages']}")
+
+
+async def cancel(client):
+    print("cancel:")
+    job_ids = [(await client.post("/api/jobs", json={"text": synthetic_report(20_000 + n, header=False)})).json()["job_id"]
+               for n in range(settings.JOB_WORKERS + 1)]
+    await asyncio.sleep(0.1)
+    running, queued = job_ids[0], job_ids[-1]
+    check((await client.get(f"/api/jobs/{queued}")).json()["status"] == "queued", "last job still queued")
+    response = (await client.delete(f"/api/jobs/{queued}")).json()
+    check(response["status"] == "cancelled", f"queued job cancelled at once ({response['status']})")
+    await client.delete(f"/api/jobs/{running}")
+    job = (await client.get(f"/api/jobs/{running}", params={"wait": 10})).json()
+    check(job["status"] == "cancelled", f"running job cancelled ({job['status']}, after {job['stages'].get('run', 0) * 1000:.0f}ms)")
+    await wait_all(client, job_ids)
+
+
+async def timeout(client, args):
+    print("timeout:")
+    limit = args.latency_ms / 1000 / 2
+    response = await client.post("/api/jobs", json={"text": synthetic_report(30_000, header=False), "timeout_seconds": limit})
+    job = (await client.get(f"/api/jobs/{response.json()['job_id']}", params={"wait": 10})).json()
+    check(job["status"] == "timeout", f"job with a {limit:g}s limit timed out ({job['status']}: {job['error']})")
+
+
+async def restart():
+    print("restart:")
+    # No workers: jobs stay queued in the database, as if the process died.
+    stopped = job_queue.JobQueue(0, 10, 0, 30, 3600, 2, os.environ["JOB_DB_PATH"])
+    job_ids = [stopped.submit({"text": synthetic_report(40_000 + n, header=False)})["job_id"] for n in range(3)]
+    fresh = job_queue.JobQueue(2, 10, 0, 30, 3600, 2, os.environ["JOB_DB_PATH"])
+    fresh.start(run_job)
+    jobs = [await fresh.wait(job_id, 30) for job_id in job_ids]
+    await fresh.stop()
+    check(all(job["status"] == "succeeded" for job in jobs), f"{len(jobs)} persisted jobs run after restart")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=60, help="normal jobs in the burst")
+    parser.add_argument("--urgent", type=int, default=4, help="urgent jobs submitted after the burst")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--queue-max", type=int, default=40)
+    parser.add_argument("--urgent-reserve", type=int, default=10, help="queue slots only urgent jobs may take")
+    parser.add_argument("--latency-ms", type=float, default=300, help="per remote model call")
+    args = parser.parse_args()
+
+    settings.FAKE_LLM_LATENCY_MS = args.latency_ms
+    settings.JOB_WORKERS = args.workers
+    settings.JOB_QUEUE_MAX = args.queue_max
+    settings.JOB_URGENT_RESERVE = args.urgent_reserve
+
+    from backend.main import app
+    started = time.perf_counter()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        await burst(client, args)
+        await cancel(client)
+        await timeout(client, args)
+    await job_queue.get_job_queue().stop()
+    await restart()
+    print(f"\n{time.perf_counter() - started:.1f}s, {len(failures)} failures")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,81 @@
+"""
+Model calls under quota pressure: direct calls versus the model gateway.
+
+Fires a burst of extraction requests (a share of them duplicates of each other)
+at the fake chat model with a provider-side quota (FAKE_LLM_QUOTA_RPM). Direct
+calls are only capped by a fixed semaphore, as before the gateway; gateway calls
+are coalesced, paced, adaptively limited and retried.
+
+    python -m benchmarks.llm_gateway --requests 120 --duplicates 0.3 --quota-rpm 600 --latency-ms 300
+"""
+import argparse
+import asyncio
+import os
+import time
+
+os.environ["LLM_BACKEND"] = "fake"
+os.environ["FAKE_LLM_LATENCY_DIST"] = "fixed"
+
+from backend.config import settings
+from backend.llm.fake import FakeChatModel, synthetic_report
+from backend.rag.clinical_chain import ClinicalChain
+
+
+class CountingFakeChatModel(FakeChatModel):
+    calls: int = 0
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        return await super()._agenerate(messages, stop, run_manager, **kwargs)
+
+
+def make_texts(n, duplicates):
+    distinct = max(1, round(n * (1 - duplicates)))
+    # Headerless reports: rows only, so every request needs the LLM.
+    return [synthetic_report(i % distinct, header=False) for i in range(n)]
+
+
+async def direct(agent, chain, texts):
+    semaphore = asyncio.Semaphore(settings.LLM_MAX_CONCURRENCY)
+
+    async def one(text):
+        async with semaphore:
+            return await chain.ainvoke({"text": text})
+
+    return await asyncio.gather(*(one(t) for t in texts), return_exceptions=True)
+
+
+async def through_gateway(agent, chain, texts):
+    return await asyncio.gather(*(agent._ainvoke(chain, {"text": t}, "extraction") for t in texts), return_exceptions=True)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=120)
+    parser.add_argument("--duplicates", type=float, default=0.3, help="share of requests repeating another one")
+    parser.add_argument("--quota-rpm", type=float, default=600, help="provider-side quota of the fake model")
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--rate-limit-rpm", type=float, default=0, help="gateway pacing (LLM_RATE_LIMIT_RPM); 0 = off")
+    args = parser.parse_args()
+
+    settings.FAKE_LLM_QUOTA_RPM = args.quota_rpm
+    settings.FAKE_LLM_LATENCY_MS = args.latency_ms
+    settings.LLM_RATE_LIMIT_RPM = args.rate_limit_rpm
+    texts = make_texts(args.requests, args.duplicates)
+
+    print(f"{args.requests} requests, {args.duplicates:.0%} duplicates, quota {args.quota_rpm:g}/min, "
+          f"{args.latency_ms:g}ms per call, max concurrency {settings.LLM_MAX_CONCURRENCY}")
+    for name, run in (("direct", direct), ("gateway", through_gateway)):
+        agent = ClinicalChain()
+        agent.llm = CountingFakeChatModel()
+        chain = agent._chain(agent.entity_prompt, agent.json_parser, "extraction")
+        started = time.perf_counter()
+        results = await run(agent, chain, texts)
+        elapsed = time.perf_counter() - started
+        failed = sum(isinstance(r, Exception) for r in results)
+        print(f"{name:>8}: {len(results) - failed:4d} ok {failed:4d} failed  {agent.llm.calls:4d} model calls  "
+              f"{elapsed:6.2f}s  {(len(results) - failed) / elapsed:6.1f} ok/s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
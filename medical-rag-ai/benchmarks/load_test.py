@@ -0,0 +1,160 @@
+"""
+Concurrent load driver for /api/upload-report, /api/analyze and /api/chat.
+
+Each virtual user loops: upload a synthetic report (searchable PDF or image),
+analyze it by its document_id, then ask one follow-up question in the returned
+chat session. Reports throughput, errors and p50/p95/p99 latency per endpoint.
+
+By default the app runs in-process on the deterministic fake LLM/vision backend
+(LLM_BACKEND=fake), so no API key or network is needed; latency and error rate
+of the stand-in come from the FAKE_LLM_* settings. Use --url to drive a running
+server instead (whatever backend it was started with).
+
+    python -m benchmarks.load_test --users 16 --duration 30 --llm-latency-ms 800
+    python -m benchmarks.load_test --url http://localhost:8000 --users 8 --json results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+
+import httpx
+
+from benchmarks.synthetic_reports import report_image, report_text, searchable_pdf
+
+QUESTION = "Which of my results are out of range, and what should I ask my doctor?"
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    async def call(self, endpoint, request):
+        started = time.perf_counter()
+        try:
+            response = await request
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            response, ok = None, False
+        if ok:
+            self.latencies[endpoint].append(time.perf_counter() - started)
+        else:
+            self.errors[endpoint] += 1
+        return response if ok else None
+
+    def summary(self, elapsed):
+        rows = {}
+        for endpoint in sorted(set(self.latencies) | set(self.errors)):
+            values = self.latencies[endpoint]
+            rows[endpoint] = {
+                "ok": len(values),
+                "errors": self.errors[endpoint],
+                "rps": round(len(values) / elapsed, 2),
+                "p50_ms": round(percentile(values, 50) * 1000, 1),
+                "p95_ms": round(percentile(values, 95) * 1000, 1),
+                "p99_ms": round(percentile(values, 99) * 1000, 1),
+            }
+        return rows
+
+
+async def virtual_user(client, recorder, user, deadline, image_share):
+    iteration = 0
+    while time.perf_counter() < deadline:
+        seed = user * 100_000 + iteration
+        text = report_text(seed)
+        # Alternate formats so both the text-layer and the OCR path get load.
+        if (seed % 100) < image_share * 100:
+            upload = ("report.png", report_image(text), "image/png")
+        else:
+            upload = ("report.pdf", searchable_pdf([text]), "application/pdf")
+        iteration += 1
+
+        response = await recorder.call(
+            "upload-report", client.post("/api/upload-report", files={"file": upload}, params={"include_text": "false"})
+        )
+        if response is None or not response.json().get("document_id"):
+            continue
+        response = await recorder.call("analyze", client.post("/api/analyze", json={"document_id": response.json()["document_id"]}))
+        if response is None:
+            continue
+        session_id = response.json().get("session_id")
+        payload = {"message": QUESTION, "history": [], "context": ""}
+        if session_id:
+            payload["session_id"] = session_id
+        await recorder.call("chat", client.post("/api/chat", json=payload))
+
+
+def print_table(rows, elapsed):
+    print(f"\n{'endpoint':<14}{'ok':>7}{'errors':>8}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for endpoint, row in rows.items():
+        print(f"{endpoint:<14}{row['ok']:>7}{row['errors']:>8}{row['rps']:>9}"
+              f"{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}")
+    print(f"\n{elapsed:.1f}s wall clock")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="drive a running server instead of the in-process app")
+    parser.add_argument("--users", type=int, default=8, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=20, help="seconds to keep starting new iterations")
+    parser.add_argument("--image-share", type=float, default=0.5, help="fraction of uploads sent as images")
+    parser.add_argument("--llm-latency-ms", type=float, help="median fake LLM latency (in-process only)")
+    parser.add_argument("--llm-error-rate", type=float, help="fake LLM error rate (in-process only)")
+    parser.add_argument("--json", dest="json_path", help="also write the results here")
+    parser.add_argument("--max-p95-ms", type=float, help="exit non-zero if any endpoint's p95 exceeds this")
+    args = parser.parse_args()
+
+    if args.url:
+        transport, base_url = None, args.url.rstrip("/")
+    else:
+        # Settings are read per draw, so overriding them here applies to the stand-in.
+        from backend.config import settings
+        from backend.main import app
+        if args.llm_latency_ms is not None:
+            settings.FAKE_LLM_LATENCY_MS = args.llm_latency_ms
+        if args.llm_error_rate is not None:
+            settings.FAKE_LLM_ERROR_RATE = args.llm_error_rate
+        print(f"In-process app, LLM backend: {settings.LLM_BACKEND} "
+              f"({settings.FAKE_LLM_LATENCY_DIST} {settings.FAKE_LLM_LATENCY_MS:g}ms, error rate {settings.FAKE_LLM_ERROR_RATE:g})")
+        transport, base_url = httpx.ASGITransport(app=app), "http://load-test"
+
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=args.users * 2)
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=None, limits=limits) as client:
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(*(
+            virtual_user(client, recorder, user, deadline, args.image_share) for user in range(args.users)
+        ))
+        elapsed = time.perf_counter() - started
+
+    rows = recorder.summary(elapsed)
+    print_table(rows, elapsed)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"users": args.users, "seconds": round(elapsed, 2), "endpoints": rows}, f, indent=2)
+
+    if args.max_p95_ms is not None:
+        slow = [e for e, row in rows.items() if row["p95_ms"] > args.max_p95_ms]
+        if slow:
+            print(f"p95 above {args.max_p95_ms:g}ms: {', '.join(slow)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,113 @@
+"""
+Extraction prompt tokens, latency and entities with and without prompt compaction.
+
+Runs LLM extraction (the rule-based fast path is off, as for layouts it can't
+read) over redacted multi-page synthetic reports with repeated letterheads,
+footers and boilerplate, on the fake chat model with a fixed latency per call
+plus a per-prompt-token cost. Doubles as the regression check: exits non-zero
+if the compacted prompt loses any result row the report contains, or any
+name/value pair of the same reports laid out with values on their own line.
+
+    python -m benchmarks.prompt_compaction --reports 30 --pages 3 --latency-ms 300 --ms-per-token 0.5
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+os.environ["LLM_BACKEND"] = "fake"
+os.environ["FAKE_LLM_LATENCY_DIST"] = "fixed"
+os.environ["FAST_EXTRACTION_ENABLED"] = "false"
+os.environ["CACHE_ENABLED"] = "false"
+
+from backend.config import settings
+from backend.llm.fake import FakeChatModel, extract_rows
+from backend.rag.clinical_chain import ClinicalChain
+from backend.rag.compaction import compact_report
+from backend.rag.tokens import count_tokens
+from backend.security.redaction import redact_if_enabled
+from benchmarks.synthetic_reports import paged_report
+
+
+class MeteredFakeChatModel(FakeChatModel):
+    ms_per_token: float = 0.0
+    prompt_tokens: int = 0
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        tokens = sum(count_tokens(str(message.content)) for message in messages)
+        self.prompt_tokens += tokens
+        await asyncio.sleep(tokens * self.ms_per_token / 1000)
+        return await super()._agenerate(messages, stop, run_manager, **kwargs)
+
+
+def entity_keys(entities):
+    return {(str(e.get("test_name")).lower(), str(e.get("value"))) for e in entities}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reports", type=int, default=30)
+    parser.add_argument("--pages", type=int, default=3)
+    parser.add_argument("--tests", type=int, default=8, help="results per page")
+    parser.add_argument("--latency-ms", type=float, default=300, help="fixed time per call")
+    parser.add_argument("--ms-per-token", type=float, default=0.5, help="prompt processing time per input token")
+    args = parser.parse_args()
+
+    settings.FAKE_LLM_LATENCY_MS = args.latency_ms
+    corpus = []
+    for seed in range(args.reports):
+        pages, rows = paged_report(seed, pages=args.pages, tests=args.tests)
+        corpus.append((redact_if_enabled("\n".join(pages)), entity_keys(extract_rows("\n".join(rows)))))
+
+    reductions, lost = [], 0
+    for text, expected in corpus:
+        compacted, stats = compact_report(text, settings.PROMPT_COMPACTION_MIN_REPEATS)
+        reductions.append(1 - stats["tokens_after"] / stats["tokens_before"])
+        missing = expected - entity_keys(extract_rows(compacted))
+        lost += len(missing)
+        if missing:
+            print(f"  lost rows: {sorted(missing)}")
+    print(f"report text: {statistics.mean(reductions):.0%} fewer tokens on average "
+          f"(min {min(reductions):.0%}, max {max(reductions):.0%}), {lost} result rows lost")
+
+    split_lost, split_total = 0, 0
+    for seed in range(args.reports):
+        pages, pairs = paged_report(seed, pages=args.pages, tests=args.tests, layout="split")
+        compacted, _ = compact_report(redact_if_enabled("\n".join(pages)), settings.PROMPT_COMPACTION_MIN_REPEATS)
+        missing = [pair for pair in pairs if pair not in compacted]
+        split_total += len(pairs)
+        split_lost += len(missing)
+        if missing:
+            print(f"  lost pairs: {[pair.replace(chr(10), ' / ') for pair in missing[:5]]}")
+    print(f"split name/value layout: {split_lost} of {split_total} pairs lost")
+    lost += split_lost
+
+    found = {}
+    for enabled in (False, True):
+        settings.PROMPT_COMPACTION_ENABLED = enabled
+        agent = ClinicalChain()
+        agent.llm = MeteredFakeChatModel(ms_per_token=args.ms_per_token)
+        latencies, found[enabled] = [], []
+        for text, _ in corpus:
+            started = time.perf_counter()
+            entities = await agent.aextract_entities(text)
+            latencies.append(time.perf_counter() - started)
+            found[enabled].append(entity_keys(entities))
+        name = "compacted" if enabled else "raw"
+        print(f"{name:>10}: p50 {statistics.median(latencies) * 1000:6.0f}ms  mean {statistics.mean(latencies) * 1000:6.0f}ms  "
+              f"{agent.llm.prompt_tokens / len(corpus):7.1f} prompt tokens per report")
+
+    # Raw text also yields junk "entities" (page markers); only real result rows count as losses.
+    expected = [keys for _, keys in corpus]
+    regressions = sum(len((raw & rows) - compacted) for raw, compacted, rows in zip(found[False], found[True], expected))
+    junk = [len(entities - rows) for enabled in (False, True) for entities, rows in zip(found[enabled], expected)]
+    print(f"result rows found only without compaction: {regressions}; non-result entities per report: "
+          f"raw {statistics.mean(junk[:len(corpus)]):.1f}, compacted {statistics.mean(junk[len(corpus):]):.1f}")
+    if lost or regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,118 @@
+"""
+Latency of the single-pass PHI redaction engine against the previous
+three-pass re.sub version, on multi-megabyte synthetic reports.
+
+The single pass covers more PHI types (MRN, email, address, names) than the
+three-pass baseline (SSN, phone, labeled DOB) and should still cost about the same.
+Doubles as the regression check for name formats: exits non-zero if any of
+CASES is not redacted as expected.
+
+    python -m benchmarks.redaction --megabytes 1 4 16 --repeat 3
+"""
+import argparse
+import random
+import re
+import sys
+import time
+
+from backend.security.redaction import StreamRedactor, redact_phi
+
+HEADER = [
+    "Patient Name: Mr. Ravi Kumar    Age: 54    Sex: M",
+    "DOB: 03/14/1970   MRN: HX4471920   Patient ID: 558213",
+    "Address: 42 Elm Tree Road, Springfield",
+    "Phone: (555) 123-4567   Email: ravi.kumar@example.com   SSN: 123-45-6789",
+    "Referred By: Dr. Jane Doe",
+]
+ROWS = [
+    "Hemoglobin 11.2 g/dL 13.5-17.5 L",
+    "WBC 12.1 10^3/uL 4.0-11.0 H",
+    "Platelets 250 10^3/uL 150-450",
+    "Glucose, Fasting 126 mg/dL 70-99 H",
+    "Creatinine 1.1 mg/dL 0.59-1.35",
+    "Sodium 139 mmol/L 135-145",
+    "Comments: Sample collected at 08:40, fasting 10 hours. Call 555-987-6543 for queries.",
+]
+
+# (input, expected redaction): lab headers print names "LAST, FIRST [M]" as often as "First Last".
+CASES = [
+    ("Patient: SMITH, JOHN  Age: 45", "Patient: [REDACTED_NAME]  Age: 45"),
+    ("Patient Name: SMITH, JOHN M", "Patient Name: [REDACTED_NAME]"),
+    ("Name: Smith,John", "Name: [REDACTED_NAME]"),
+    ("Patient Name: Mr. Ravi Kumar    Age: 54", "Patient Name: [REDACTED_NAME]    Age: 54"),
+    ("Name: Ravi Kumar, Age: 54", "Name: [REDACTED_NAME], Age: 54"),
+    ("Referred By: Dr. Jane Doe", "Referred By: [REDACTED_NAME]"),
+]
+
+
+def check_cases() -> int:
+    failures = 0
+    for text, expected in CASES:
+        redacted = redact_phi(text)
+        if redacted != expected:
+            failures += 1
+            print(f"FAIL  {text!r} -> {redacted!r} (expected {expected!r})")
+    print(f"name formats: {len(CASES) - failures}/{len(CASES)} redacted as expected")
+    return failures
+
+
+def redact_phi_three_pass(text: str) -> str:
+    # The redaction before the single-pass engine, kept here as the baseline.
+    text = re.sub(r'\b\d{3}-\d{2}-\d{4}\b', '[REDACTED_SSN]', text)
+    text = re.sub(r'\b(?:\+?1[-. ]?)?\(?\d{3}\)?[-. ]?\d{3}[-. ]?\d{4}\b', '[REDACTED_PHONE]', text)
+    text = re.sub(r'(?i)DOB:?\s*\d{1,2}[/-]\d{1,2}[/-]\d{2,4}', 'DOB: [REDACTED_DATE]', text)
+    return text
+
+
+def make_text(size: int, rng: random.Random) -> str:
+    lines = []
+    total = 0
+    while total < size:
+        block = HEADER if rng.random() < 0.1 else rng.sample(ROWS, 4)
+        for line in block:
+            lines.append(line)
+            total += len(line) + 1
+    return "\n".join(lines)
+
+
+def best_of(func, text, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(text)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def stream(text: str) -> str:
+    redactor = StreamRedactor()
+    pieces = [redactor.feed(text[start:start + 65536]) for start in range(0, len(text), 65536)]
+    pieces.append(redactor.close())
+    return "".join(pieces)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--megabytes", type=float, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    failures = check_cases()
+    rng = random.Random(0)
+    print(f"{'size':>8}  {'3-pass':>10}  {'1-pass':>10}  {'stream':>10}  {'ratio':>6}")
+    for megabytes in args.megabytes:
+        text = make_text(int(megabytes * 1024 * 1024), rng)
+        assert stream(text) == redact_phi(text)
+        baseline = best_of(redact_phi_three_pass, text, args.repeat)
+        single = best_of(redact_phi, text, args.repeat)
+        streamed = best_of(stream, text, args.repeat)
+        print(
+            f"{megabytes:>6.1f}MB  {baseline * 1000:>8.1f}ms  {single * 1000:>8.1f}ms  "
+            f"{streamed * 1000:>8.1f}ms  {single / baseline:>5.2f}x"
+        )
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
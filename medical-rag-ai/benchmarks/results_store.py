@@ -0,0 +1,110 @@
+"""
+Insert throughput and trend-query latency of the longitudinal results store
+at millions of result rows.
+
+Fills a fresh SQLite file with synthetic reports (bulk inserts, one transaction
+per batch), then times random per-patient/per-test trend queries and prints
+the query plan to confirm they are served by the trend index.
+
+    python -m benchmarks.results_store --rows 2000000 --queries 2000
+"""
+import argparse
+import datetime
+import os
+import random
+import tempfile
+import time
+
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+
+from backend.store.results_store import ResultsStore
+
+PANEL = [
+    ("Hemoglobin", "g/dL", "13.5-17.5", 11.0, 17.0),
+    ("WBC", "10^3/uL", "4.0-11.0", 3.0, 14.0),
+    ("Platelets", "10^3/uL", "150-450", 120, 480),
+    ("Glucose, Fasting", "mg/dL", "70-99", 65, 180),
+    ("HbA1c", "%", "4.0-5.6", 4.5, 9.5),
+    ("Creatinine", "mg/dL", "0.59-1.35", 0.5, 2.5),
+    ("Sodium", "mmol/L", "135-145", 130, 150),
+    ("Potassium", "mmol/L", "3.5-5.0", 3.2, 5.6),
+    ("TSH", "mIU/L", "0.4-4.0", 0.2, 6.0),
+    ("LDL Cholesterol", "mg/dL", "<100", 60, 190),
+]
+
+
+def make_reports(count: int, patients: int, rng: random.Random):
+    start = datetime.date(2015, 1, 1)
+    for number in range(count):
+        entities = [
+            {"test_name": name, "value": f"{rng.uniform(lo, hi):.1f}", "unit": unit, "reference_range": ref, "flag": None}
+            for name, unit, ref, lo, hi in PANEL
+        ]
+        report_date = (start + datetime.timedelta(days=rng.randrange(3650))).isoformat()
+        yield f"patient-{rng.randrange(patients)}", report_date, f"report-{number}", entities
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2_000_000, help="result rows to insert")
+    parser.add_argument("--patients", type=int, default=20_000)
+    parser.add_argument("--batch", type=int, default=1000, help="reports per insert transaction")
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--db", default=None, help="SQLite file (defaults to a temporary file)")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    fd, path = tempfile.mkstemp(suffix=".sqlite3") if args.db is None else (None, args.db)
+    if fd is not None:
+        os.close(fd)
+        os.remove(path)
+    try:
+        store = ResultsStore(path)
+        reports = args.rows // len(PANEL)
+        started = time.perf_counter()
+        inserted = 0
+        batch = []
+        for report in make_reports(reports, args.patients, rng):
+            batch.append(report)
+            if len(batch) == args.batch:
+                inserted += store.add_reports(batch)
+                batch = []
+        if batch:
+            inserted += store.add_reports(batch)
+        elapsed = time.perf_counter() - started
+        print(f"inserted {inserted:,} rows ({reports:,} reports) in {elapsed:.1f}s: {inserted / elapsed:,.0f} rows/s")
+
+        plan = store._db.execute(
+            "EXPLAIN QUERY PLAN SELECT result_date, value_numeric, unit, flag FROM lab_results"
+            " WHERE patient_key = ? AND canonical_test = ? ORDER BY result_date DESC LIMIT 1000",
+            ("patient-0", "hba1c"),
+        ).fetchall()
+        print("plan:", "; ".join(row[-1] for row in plan))
+
+        latencies = []
+        points = 0
+        for _ in range(args.queries):
+            test = rng.choice(PANEL)[0]
+            started = time.perf_counter()
+            points += len(store.trend(f"patient-{rng.randrange(args.patients)}", test))
+            latencies.append((time.perf_counter() - started) * 1000)
+        print(
+            f"trend queries: {args.queries} (avg {points / args.queries:.1f} points)  "
+            f"p50 {percentile(latencies, 50):.3f} ms  p95 {percentile(latencies, 95):.3f} ms  "
+            f"p99 {percentile(latencies, 99):.3f} ms"
+        )
+        print(f"database size: {os.path.getsize(path) / 1e6:.0f} MB")
+    finally:
+        if args.db is None:
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+
+
+if __name__ == "__main__":
+    main()
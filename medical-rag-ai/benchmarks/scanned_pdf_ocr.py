@@ -0,0 +1,71 @@
+"""
+Wall-clock time to OCR a scanned PDF as the OCR worker pool grows.
+
+Builds an image-only PDF with Pillow and runs it through the upload path's page
+pipeline (streamed parsing, per-page OCR and redaction) against a local stand-in
+OCR backend with a fixed per-page latency (no remote calls).
+
+    python -m benchmarks.scanned_pdf_ocr --pages 24 --latency 0.5 --workers 1 2 4 8
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+
+from PIL import Image, ImageDraw
+
+from backend.api import upload
+from backend.config import settings
+
+
+class FixedLatencyOCR:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    async def aprocess_image(self, image) -> str:
+        await asyncio.sleep(self.latency)
+        return "Hemoglobin 11.2 g/dL 13.5-17.5 L"
+
+
+def make_scanned_pdf(path: str, pages: int) -> None:
+    images = []
+    for number in range(pages):
+        image = Image.new("RGB", (1275, 1650), "white")
+        ImageDraw.Draw(image).text((100, 100), f"Page {number + 1}: Hemoglobin 11.2 g/dL 13.5-17.5 L", fill="black")
+        images.append(image)
+    images[0].save(path, "PDF", save_all=True, append_images=images[1:], resolution=150)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=24)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds per stand-in OCR call")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    # The global LLM cap would otherwise bound the larger pools.
+    settings.LLM_MAX_CONCURRENCY = max(args.workers)
+    engine = FixedLatencyOCR(args.latency)
+    upload.get_ocr_engine = lambda: engine
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    os.close(fd)
+    try:
+        make_scanned_pdf(path, args.pages)
+        baseline = None
+        for workers in args.workers:
+            settings.OCR_MAX_WORKERS = workers
+            started = time.perf_counter()
+            pages, ocr_pages = await upload._extract_pdf_pages(path)
+            elapsed = time.perf_counter() - started
+            baseline = baseline or elapsed
+            assert ocr_pages == args.pages and all(text.strip() for text in pages)
+            print(f"workers={workers:>3}: {args.pages} pages in {elapsed:6.2f}s  speedup x{baseline / elapsed:4.1f}")
+    finally:
+        os.unlink(path)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,150 @@
+"""
+Synthetic lab reports for load tests: plain text, multi-page reports with
+letterheads, footers and boilerplate, searchable (text-layer) PDFs and rendered
+images, all deterministic in the seed.
+
+    python -m benchmarks.synthetic_reports --count 5 --out synthetic/
+"""
+import argparse
+import io
+import os
+import random
+from typing import List, Tuple
+
+from backend.llm.fake import synthetic_report
+
+LINE_HEIGHT = 16
+
+
+def report_text(seed: int, tests: int = 10) -> str:
+    return synthetic_report(seed, tests=tests)
+
+
+def paged_report(seed: int, pages: int = 3, tests: int = 8, layout: str = "table") -> Tuple[List[str], List[str]]:
+    """
+    (page texts, result rows) of a multi-page report laid out like a real lab's:
+    every page repeats the letterhead, patient block and footer, and carries
+    column padding, an interpretive note, a signature block and legal text.
+    With layout="split", each test name and its value are on separate lines (as
+    OCR reads some layouts) and every page adds a urinalysis block whose
+    qualitative values repeat; rows are then the "name\nvalue" pairs.
+    """
+    rng = random.Random(seed)
+    lab = rng.choice(["CITY DIAGNOSTICS", "LIFECARE PATHOLOGY LABS", "METRO CLINICAL LABORATORY"])
+    letterhead = [
+        f"{lab}",
+        f"{100 + seed % 800} Lake View Road, Sector {seed % 40}, Springfield 40{seed % 1000:03d}",
+        f"Tel: (555) 010-{seed % 10000:04d}  |  Email: reports@{lab.split()[0].lower()}.example  |  www.{lab.split()[0].lower()}.example",
+        "NABL Accredited Laboratory  (ISO 15189:2012)       CAP # 7190{0}".format(seed % 10),
+        "",
+        f"Patient Name :   Test Patient{seed % 1000}                 Age / Sex :  {20 + seed % 60} Y / {'M' if seed % 2 else 'F'}",
+        f"Ref. By      :   Dr. Referring Physician        Sample ID :  SYN{seed:07d}",
+        f"Collected    :   2024-{1 + seed % 12:02d}-{1 + seed % 28:02d} 08:{seed % 60:02d}     Reported  :  2024-{1 + seed % 12:02d}-{1 + seed % 28:02d} 17:45",
+        "",
+        "TEST NAME                      RESULT       UNIT          REFERENCE RANGE",
+        "",
+    ]
+    footer = [
+        "",
+        "Interpretation: Results should be interpreted in the context of the clinical history and other investigations;",
+        "a single abnormal value is not diagnostic and repeat testing may be advised by the treating physician.",
+        "",
+        "Electronically verified by:   Dr. A. Consultant, MD (Pathology)         Reg. No. 4417",
+        "This report is not valid for medico-legal purposes. Results relate only to the sample as received.",
+    ]
+    texts, rows = [], []
+    for page in range(pages):
+        page_rows = []
+        for line in synthetic_report(seed * 100 + page, tests=tests, header=False).splitlines():
+            name, _, rest = line.partition("  ")
+            if layout == "split":
+                page_rows.append(f"{name}\n{rest.split('  ')[0]}")
+            else:
+                page_rows.append(f"{name:<30} {'      '.join(rest.split('  '))}")
+        if layout == "split":
+            for name in ["Urine Glucose", "Ketones", "Blood", "Nitrite", "Bilirubin"]:
+                page_rows.append(f"{name}\n{rng.choice(['Negative', 'Negative', 'Nil', 'Trace'])}")
+        rows += page_rows
+        texts.append("\n".join(
+            letterhead + [rng.choice(["COMPLETE BLOOD COUNT", "BIOCHEMISTRY", "CLINICAL CHEMISTRY PANEL"]), ""]
+            + page_rows + footer + ["", f"Page {page + 1} of {pages}", "*** End of Report ***" if page == pages - 1 else ""]
+        ))
+    return texts, rows
+
+
+def _pdf_escape(line: str) -> str:
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def searchable_pdf(pages: List[str]) -> bytes:
+    """
+    A PDF with a real text layer (Helvetica), one page per text. Written by hand
+    so load tests don't need a PDF authoring library; pypdf extracts it as-is.
+    """
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", b"", b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in pages:
+        body = ["BT", "/F1 11 Tf", f"{LINE_HEIGHT} TL", "50 760 Td"]
+        body += [f"({_pdf_escape(line)}) '" for line in text.splitlines()]
+        body.append("ET")
+        stream = "\n".join(body).encode("latin-1", "replace")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % len(objects)
+        )
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>".encode()
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n%s\nendobj\n" % (number, obj))
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    return out.getvalue()
+
+
+def report_image(text: str, fmt: str = "PNG") -> bytes:
+    """
+    The report rendered black-on-white at roughly letter size, 100 dpi.
+    """
+    from PIL import Image, ImageDraw
+
+    image = Image.new("RGB", (850, 1100), "white")
+    draw = ImageDraw.Draw(image)
+    for number, line in enumerate(text.splitlines()):
+        draw.text((60, 60 + number * LINE_HEIGHT * 1.5), line, fill="black")
+    out = io.BytesIO()
+    image.save(out, fmt)
+    return out.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=5)
+    parser.add_argument("--tests", type=int, default=10, help="result rows per report")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="synthetic")
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    for seed in range(args.seed, args.seed + args.count):
+        text = report_text(seed, args.tests)
+        stem = os.path.join(args.out, f"report-{seed:05d}")
+        with open(stem + ".txt", "w") as f:
+            f.write(text)
+        with open(stem + ".pdf", "wb") as f:
+            f.write(searchable_pdf([text]))
+        with open(stem + ".png", "wb") as f:
+            f.write(report_image(text))
+    print(f"Wrote {args.count} reports (.txt, .pdf, .png) to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Test-name canonicalization at scale: index build time, per-lookup latency by
+tier, batch lookup per report, and accuracy on misspelled and OCR-mangled names.
+
+The bundled vocabulary is padded with synthetic tests (each with the kinds of
+aliases real labs print) up to --aliases aliases. Lookups bypass the per-name
+cache unless stated, so the times are for first sightings of a name.
+
+Doubles as the regression check for qualified names: exits non-zero if a
+qualifier ("Glucose PP", "Bilirubin Indirect") or a specimen ("Protein (Urine)")
+maps to the unqualified or the opposite test, on the bundled vocabulary and on
+one without those entries, or if a name matched only after removing a
+parenthetical is reported as an exact match.
+
+    python -m benchmarks.test_name_index --aliases 20000 --queries 20000
+"""
+import argparse
+import random
+import statistics
+import string
+import sys
+import time
+
+from backend.rag.test_names import TestNameIndex, load_vocabulary
+
+SYLLABLES = ["ra", "mo", "ti", "vex", "lan", "dor", "qui", "sen", "pha", "tro", "zy", "mel", "cor", "bin", "ul", "ase", "ine", "ol"]
+
+# (printed name, expected canonical ID); None means it must stay unmatched.
+QUALIFIED = [
+    ("Glucose PP", "postprandial glucose"),
+    ("Glucose, Post Prandial", "postprandial glucose"),
+    ("Post Prandial Glucose", "postprandial glucose"),
+    ("Glucose Fasting", "glucose"),
+    ("Glucose Random", None),
+    ("Bilirubin Indirect", "indirect bilirubin"),
+    ("Indirect Bilirubin", "indirect bilirubin"),
+    ("Indirect Bilirubn", "indirect bilirubin"),
+    ("Bilirubin Direct", "direct bilirubin"),
+    ("Direct Bilirubn", "direct bilirubin"),
+    ("Bilirubin Total", "total bilirubin"),
+    ("Protein (Urine)", "urine protein"),
+    ("Glucose (Urine)", "urine glucose"),
+    ("Urine Glucose", "urine glucose"),
+    ("Glucose, Urine", "urine glucose"),
+    ("Glucose (CSF)", "csf glucose"),
+    ("Glucose (Fasting)", "glucose"),
+    ("Free T8", None),
+    ("HDI", None),
+]
+# Without their own entries, qualified names must not fall back to a neighbour.
+UNKNOWN_QUALIFIED = ["Glucose PP", "Bilirubin Indirect", "Indirect Bilirubin", "Cholesterol Remnant", "Potassium Urine",
+                     "Potassium (Urine)", "Glucose (Urine)", "Urine Glucose", "Protein (Pleural Fluid)"]
+UNQUALIFIED_OUT = ("postprandial glucose", "indirect bilirubin", "urine glucose", "urine protein")
+# (printed name, expected method): a name that only matches once a parenthetical is removed is not exact.
+METHODS = [("Hemoglobin", "exact"), ("Glucose, Fasting", "exact"), ("Creatinine (Enzymatic)", "normalized"), ("Serum Sodium", "exact")]
+
+
+def check_qualified():
+    failures = 0
+    index = TestNameIndex(load_vocabulary())
+    for name, expected in QUALIFIED:
+        match = index._lookup_local(name)
+        found = match.test_id if match else None
+        failures += found != expected
+        print(f"  {'ok  ' if found == expected else 'FAIL'}  {name!r} -> {found} (expected {expected})")
+    for name, expected in METHODS:
+        match = index._lookup_local(name)
+        found = match.method if match else None
+        failures += found != expected
+        print(f"  {'ok  ' if found == expected else 'FAIL'}  {name!r} matched by {found} (expected {expected})")
+    reduced = TestNameIndex([test for test in load_vocabulary() if test["id"] not in UNQUALIFIED_OUT])
+    for name in UNKNOWN_QUALIFIED:
+        match = reduced._lookup_local(name)
+        found = match.test_id if match else None
+        failures += found is not None
+        print(f"  {'ok  ' if found is None else 'FAIL'}  {name!r} -> {found} (vocabulary without it: expected None)")
+    return failures
+
+
+def synthetic_vocabulary(rng, aliases):
+    tests = load_vocabulary()
+    count = sum(2 + len(test["aliases"]) for test in tests)
+    used = set()
+    number = 0
+    while count < aliases:
+        name = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(3, 5))).capitalize()
+        if rng.random() < 0.3:
+            name += " " + rng.choice(["Antibody", "Antigen", "Ratio", "Index", "Activity", "Level"])
+        abbreviation = "".join(rng.choice(string.ascii_uppercase) for _ in range(rng.randint(3, 5))) + str(number % 10)
+        # Distinct tests need distinct names, or "wrong" matches are just vocabulary collisions.
+        if name.lower() in used or abbreviation in used:
+            continue
+        used.update((name.lower(), abbreviation))
+        test_aliases = [abbreviation, f"Serum {name}", f"{name}, Total", f"{name} ({abbreviation})", f"Plasma {name} Level"]
+        tests.append({"id": f"syn-{number}", "name": name, "loinc": None, "aliases": test_aliases})
+        count += 2 + len(test_aliases)
+        number += 1
+    return tests, count
+
+
+def ocr_mangle(rng, name):
+    swaps = [(i, c) for i, c in enumerate(name) if c in "lois"]
+    if not swaps:
+        return None
+    i, c = rng.choice(swaps)
+    return name[:i] + {"l": "1", "o": "0", "i": "1", "s": "5"}[c] + name[i + 1:]
+
+
+def typo(rng, name):
+    letters = [i for i, c in enumerate(name) if c.isalpha()]
+    if len(letters) < 9:
+        return None
+    i = rng.choice(letters[1:-1])
+    kind = rng.choice(["drop", "swap", "replace"])
+    if kind == "drop":
+        return name[:i] + name[i + 1:]
+    if kind == "swap":
+        return name[:i] + name[i + 1] + name[i] + name[i + 2:]
+    return name[:i] + rng.choice(string.ascii_lowercase) + name[i + 1:]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--aliases", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=20000)
+    parser.add_argument("--report-size", type=int, default=25, help="names per batch lookup")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print("qualified names:")
+    failures = check_qualified()
+
+    rng = random.Random(args.seed)
+    tests, aliases = synthetic_vocabulary(rng, args.aliases)
+    started = time.perf_counter()
+    index = TestNameIndex(tests)
+    print(f"\n{len(tests)} tests, {aliases} aliases: index built in {(time.perf_counter() - started) * 1000:.0f}ms")
+
+    printed = [(alias, test["id"]) for test in tests for alias in [test["name"]] + test["aliases"]]
+    kinds = {
+        "exact": lambda name: name,
+        "variant": lambda name: rng.choice([name.upper(), name.lower(), f" {name}: ", name.replace(" ", "  ")]),
+        "ocr": lambda name: ocr_mangle(rng, name),
+        "typo": lambda name: typo(rng, name),
+        "unknown": lambda name: "".join(rng.choice(string.ascii_lowercase) for _ in range(len(name))),
+    }
+    queries = []
+    while len(queries) < args.queries:
+        name, test_id = rng.choice(printed)
+        kind = rng.choice(list(kinds))
+        query = kinds[kind](name)
+        if query:
+            queries.append((kind, query, None if kind == "unknown" else test_id))
+
+    per_kind = {kind: [] for kind in kinds}
+    outcomes = {kind: {"correct": 0, "wrong": 0, "unmatched": 0} for kind in kinds}
+    for kind, query, expected in queries:
+        started = time.perf_counter()
+        match = index._lookup_local(query)
+        per_kind[kind].append(time.perf_counter() - started)
+        if match is None:
+            outcomes[kind]["unmatched"] += 1
+        else:
+            outcomes[kind]["correct" if match.test_id == expected else "wrong"] += 1
+
+    print(f"\n{'queries':<10}{'n':>7}{'p50 us':>9}{'p99 us':>9}{'correct':>9}{'wrong':>7}{'unmatched':>11}")
+    for kind, times in per_kind.items():
+        ordered = sorted(times)
+        row = outcomes[kind]
+        print(f"{kind:<10}{len(times):>7}{statistics.median(times) * 1e6:>9.1f}{ordered[int(len(ordered) * 0.99)] * 1e6:>9.1f}"
+              f"{row['correct']:>9}{row['wrong']:>7}{row['unmatched']:>11}")
+
+    names = [query for _, query, _ in queries]
+    for name in names:
+        index.lookup(name)
+    started = time.perf_counter()
+    for name in names:
+        index.lookup(name)
+    print(f"\ncached lookup: {(time.perf_counter() - started) / len(names) * 1e6:.2f}us per name")
+
+    reports = [names[i:i + args.report_size] for i in range(0, len(names), args.report_size)]
+    fresh = TestNameIndex(tests)
+    started = time.perf_counter()
+    for report in reports:
+        fresh.lookup_many(report)
+    elapsed = time.perf_counter() - started
+    print(f"batch lookup: {elapsed / len(reports) * 1000:.2f}ms per {args.report_size}-name report (uncached), "
+          f"{len(names) / elapsed:,.0f} names/s")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
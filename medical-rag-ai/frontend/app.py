@@ -1,5 +1,6 @@
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
 from PIL import Image
 import json
 import os
@@ -91,6 +92,16 @@ st.markdown("""
 
 API_URL = os.getenv("API_URL", "http://localhost:8000/api")
 
+@st.cache_resource
+def get_http():
+    """
+    One pooled HTTP session for the app, reused across reruns (keep-alive connections).
+    """
+    http = requests.Session()
+    http.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+    http.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+    return http
+
 def main():
     # Session State Initialization
     if "analysis_results" not in st.session_state:
@@ -99,6 +110,8 @@ def main():
         st.session_state.chat_history = []
     if "report_context" not in st.session_state:
         st.session_state.report_context = ""
+    if "document_id" not in st.session_state:
+        st.session_state.document_id = None
 
     # Sidebar
     with st.sidebar:
@@ -117,6 +130,7 @@ def main():
             st.session_state.analysis_results = None
             st.session_state.chat_history = []
             st.session_state.report_context = ""
+            st.session_state.document_id = None
             st.rerun()
 
     # Main Content
@@ -135,57 +149,106 @@ def main():
             else:
                 st.success("PDF Uploaded")
             
-            if st.button("🔍 Analyze Report"):
-                with st.spinner("Processing with OCR & AI Agent..."):
-                    # 1. Upload & Extract
-                    try:
-                        files = {"file": (uploaded_file.name, uploaded_file.getvalue(), uploaded_file.type)}
-                        response = requests.post(f"{API_URL}/upload-report", files=files)
-                        
-                        if response.status_code == 200:
-                            data = response.json()
-                            extracted_text = data.get("text", "")
-                            
-                            if not extracted_text:
-                                st.error("No text extracted. Try a clearer image.")
-                            else:
-                                # 2. Analyze
-                                analyze_payload = {"text": extracted_text}
-                                analysis_res = requests.post(f"{API_URL}/analyze", json=analyze_payload)
-                                
-                                if analysis_res.status_code == 200:
-                                    results = analysis_res.json()
-                                    # Store in Session State
-                                    st.session_state.analysis_results = results
-                                    # Construct context for chat specific to this report
-                                    st.session_state.report_context = f"Summary: {results['summary']}\nExplanation: {results['explanation']}\nFindings: " + ", ".join([f"{e['test_name']}: {e['value']}" for e in results['entities']])
-                                    st.success("Analysis Complete!")
-                                else:
-                                    st.error(f"Analysis Failed: {analysis_res.text}")
-                        else:
-                            st.error(f"Upload Failed: {response.text}")
-                    except Exception as e:
-                        st.error(f"Connection Error: {e}. Is the backend running?")
+            analyze_clicked = st.button("🔍 Analyze Report")
+
+        if analyze_clicked and uploaded_file.type.startswith('image'):
+            # Images: one request, the vision model reads the lab values directly
+            try:
+                with st.spinner("Reading lab values from the image..."):
+                    files = {"file": (uploaded_file.name, uploaded_file.getvalue(), uploaded_file.type)}
+                    response = get_http().post(f"{API_URL}/analyze-image", files=files)
+                if response.status_code == 200:
+                    results = response.json()
+                    st.session_state.analysis_results = results
+                    st.session_state.report_context = f"Summary: {results['summary']}\nExplanation: {results['explanation']}\nFindings: " + ", ".join([f"{e['test_name']}: {e['value']}" for e in results['entities']])
+                    st.success("Analysis Complete!")
+                else:
+                    st.error(f"Analysis Failed: {response.text}")
+            except Exception as e:
+                st.error(f"Connection Error: {e}. Is the backend running?")
+        elif analyze_clicked:
+            # 1. Upload & Extract
+            try:
+                with st.spinner("Extracting text from report..."):
+                    files = {"file": (uploaded_file.name, uploaded_file.getvalue(), uploaded_file.type)}
+                    # The text stays on the server; we only get its document_id back.
+                    response = get_http().post(f"{API_URL}/upload-report", files=files, params={"include_text": "false"})
+
+                if response.status_code == 200:
+                    data = response.json()
+                    document_id = data.get("document_id")
+
+                    if not document_id:
+                        st.error(data.get("note") or "No text extracted. Try a clearer image.")
+                    else:
+                        st.session_state.document_id = document_id
+                        # 2. Analyze (streamed, so results render as each stage lands)
+                        results = stream_analysis(document_id)
+                        if results:
+                            # Store in Session State
+                            st.session_state.analysis_results = results
+                            # Construct context for chat specific to this report
+                            st.session_state.report_context = f"Summary: {results['summary']}\nExplanation: {results['explanation']}\nFindings: " + ", ".join([f"{e['test_name']}: {e['value']}" for e in results['entities']])
+                            st.success("Analysis Complete!")
+                else:
+                    st.error(f"Upload Failed: {response.text}")
+            except Exception as e:
+                st.error(f"Connection Error: {e}. Is the backend running?")
     
     # Display Results if available
     if st.session_state.analysis_results:
         display_results(st.session_state.analysis_results)
         display_chat_interface()
 
-def display_results(data):
-    st.markdown("---")
-    st.header("📋 Analysis Results")
-    
-    # Summary
-    st.markdown(f"**Summary**: {data['summary']}")
-    
-    # Entities Table
+def stream_analysis(document_id):
+    """
+    Consumes /analyze/stream and renders each stage as soon as it arrives.
+    The live view is cleared once the final result is in, since
+    display_results() redraws it from session state.
+    """
+    live_area = st.empty()
+    result = None
+    explanation = ""
+    with get_http().post(f"{API_URL}/analyze/stream", json={"document_id": document_id}, stream=True) as res:
+        if res.status_code != 200:
+            st.error(f"Analysis Failed: {res.text}")
+            return None
+
+        with live_area.container():
+            st.markdown("---")
+            st.header("📋 Analysis Results")
+            entities_slot = st.empty()
+            entities_slot.info("Reading lab values...")
+            st.subheader("💡 Clinical Explanation")
+            explanation_slot = st.empty()
+
+            for line in res.iter_lines(decode_unicode=True):
+                if not line:
+                    continue
+                event = json.loads(line)
+                kind = event["event"]
+                if kind == "entities":
+                    with entities_slot.container():
+                        display_entities(event["entities"])
+                    explanation_slot.info("Writing explanation...")
+                elif kind == "explanation_token":
+                    explanation += event["text"]
+                    explanation_slot.info(explanation)
+                elif kind == "done":
+                    result = event["result"]
+                elif kind == "error":
+                    st.error(f"Analysis Failed: {event['detail']}")
+
+    live_area.empty()
+    return result
+
+def display_entities(entities):
     st.subheader("🧬 Extracted Vitals & Labs")
     
     # Custom Grid for beautiful display
-    if data['entities']:
+    if entities:
         cols = st.columns(3)
-        for idx, entity in enumerate(data['entities']):
+        for idx, entity in enumerate(entities):
             col = cols[idx % 3]
             flag_class = "flag-normal"
             if "Low" in str(entity.get('flag', '')): flag_class = "flag-low"
@@ -195,13 +258,23 @@ def display_results(data):
                 st.markdown(f"""
                 <div class="metric-card">
                     <h4>{entity['test_name']}</h4>
-                    <p class="metric-value">{entity['value']} <span class="metric-unit">{entity['unit']}</span></p>
-                    <p><strong>Range:</strong> {entity.get('reference_range', 'N/A')}</p>
-                    <p class="{flag_class}">Status: {entity.get('flag', 'Unknown')}</p>
+                    <p class="metric-value">{entity['value']} <span class="metric-unit">{entity.get('unit') or ''}</span></p>
+                    <p><strong>Range:</strong> {entity.get('reference_range') or 'N/A'}</p>
+                    <p class="{flag_class}">Status: {entity.get('flag') or 'Unknown'}</p>
                 </div>
                 """, unsafe_allow_html=True)
     else:
         st.info("No specific entities detected.")
+
+def display_results(data):
+    st.markdown("---")
+    st.header("📋 Analysis Results")
+    
+    # Summary
+    st.markdown(f"**Summary**: {data['summary']}")
+    
+    # Entities Table
+    display_entities(data['entities'])
             
     # Explanation
     st.markdown("---")
@@ -247,12 +320,24 @@ def display_chat_interface():
         # Get AI response
         with st.chat_message("assistant"):
             try:
-                payload = {
-                    "context": st.session_state.report_context,
-                    "history": st.session_state.chat_history,
-                    "message": prompt
-                }
-                response = requests.post(f"{API_URL}/chat", json=payload)
+                # The backend keeps the report context and history for this session.
+                session_id = st.session_state.analysis_results.get("session_id")
+                response = get_http().post(f"{API_URL}/chat", json={"session_id": session_id, "message": prompt}) if session_id else None
+                if response is None or response.status_code == 404:
+                    # No (or expired) server-side session: resend the history, and the report by handle if we have one.
+                    payload = {
+                        "history": st.session_state.chat_history[:-1],
+                        "message": prompt
+                    }
+                    if st.session_state.document_id:
+                        payload["document_id"] = st.session_state.document_id
+                    else:
+                        payload["context"] = st.session_state.report_context
+                    response = get_http().post(f"{API_URL}/chat", json=payload)
+                    if response.status_code == 404 and "document_id" in payload:
+                        del payload["document_id"]
+                        payload["context"] = st.session_state.report_context
+                        response = get_http().post(f"{API_URL}/chat", json=payload)
                 if response.status_code == 200:
                     ai_msg = response.json()["response"]
                     st.markdown(ai_msg)